@@ -0,0 +1,192 @@
+"""
+Decode + normalize micro-benchmark.
+
+Compares the original path (stdlib json.loads + eager dict normalization)
+with Decoding.loads + lazy records, on recorded frames when a JSON-lines
+file is given, otherwise on synthetic frames shaped like Binance's.
+
+    python Benchmarks/DecodeBenchmark.py [frames.jsonl]
+"""
+
+import json
+import random
+import sys
+import time
+import datetime as dt
+
+from common import setup_path, report
+
+setup_path()
+
+import Decoding                                    # noqa: E402
+from AllCoinTicker import normalize as ticker_record, as_row as ticker_row   # noqa: E402
+from aggTrade import normalize_aggtrade, as_row as trade_row                 # noqa: E402
+
+
+# ============================
+# Original (eager) normalizers
+# ============================
+
+def to_ist(ms):
+    return dt.datetime.utcfromtimestamp(ms / 1000) + dt.timedelta(hours=5, minutes=30)
+
+
+def eager_ticker(d):
+    return {
+        "Symbol": d["s"],
+        "EventTimeIST": to_ist(d["E"]),
+        "LastPrice": float(d["c"]),
+        "PriceChange": float(d["p"]),
+        "PriceChangePercent": float(d["P"]),
+        "HighPrice": float(d["h"]),
+        "LowPrice": float(d["l"]),
+        "BaseVolume": float(d["v"]),
+        "QuoteVolume": float(d["q"]),
+        "NumberOfTrades": int(d["n"])
+    }
+
+
+def eager_ticker_row(d):
+    return [d[k] for k in (
+        "Symbol", "EventTimeIST", "LastPrice", "PriceChange",
+        "PriceChangePercent", "HighPrice", "LowPrice", "BaseVolume",
+        "QuoteVolume", "NumberOfTrades"
+    )]
+
+
+def eager_trade(t):
+    return {
+        "TradeTimeIST": to_ist(int(t["T"])),
+        "Price": float(t["p"]),
+        "Quantity": float(t["q"]),
+        "AggTradeID": int(t["a"]),
+        "FirstTradeID": int(t["f"]),
+        "LastTradeID": int(t["l"]),
+        "IsBuyerMaker": t["m"],
+        "IsBestMatch": t["M"]
+    }
+
+
+def eager_trade_row(d):
+    return [d[k] for k in (
+        "TradeTimeIST", "Price", "Quantity", "AggTradeID",
+        "FirstTradeID", "LastTradeID", "IsBuyerMaker", "IsBestMatch"
+    )]
+
+
+# ============================
+# Frames
+# ============================
+
+def synthetic_ticker_frame(n_symbols=2000):
+    now = int(time.time() * 1000)
+    return json.dumps([
+        {
+            "e": "24hrTicker", "E": now, "s": f"SYM{i}USDT",
+            "p": f"{random.uniform(-5, 5):.8f}", "P": f"{random.uniform(-9, 9):.3f}",
+            "w": "1.0", "x": "1.0", "c": f"{random.uniform(1, 100):.8f}", "Q": "1.0",
+            "b": "1.0", "B": "1.0", "a": "1.0", "A": "1.0",
+            "o": "1.0", "h": "2.0", "l": "0.5",
+            "v": f"{random.uniform(1, 1e6):.8f}", "q": f"{random.uniform(1, 1e8):.8f}",
+            "O": now - 86400000, "C": now, "F": 1, "L": 1000, "n": random.randint(1, 10 ** 6)
+        }
+        for i in range(n_symbols)
+    ]).encode()
+
+
+def synthetic_trade_frames(n=20000):
+    now = int(time.time() * 1000)
+    return [
+        json.dumps({
+            "e": "aggTrade", "E": now + i, "s": "BTCUSDT", "a": i,
+            "p": f"{60000 + random.uniform(-50, 50):.2f}", "q": f"{random.uniform(0, 2):.5f}",
+            "f": i, "l": i, "T": now + i, "m": bool(i % 2), "M": True
+        }).encode()
+        for i in range(n)
+    ]
+
+
+def load_frames(path):
+    ticker, trades = [], []
+    with open(path, "rb") as f:
+        for line in f:
+            msg = json.loads(line)
+            data = msg.get("data", msg)
+            if isinstance(data, list):
+                ticker.append(line)
+            elif data.get("e") == "aggTrade":
+                trades.append(line)
+    return ticker, trades
+
+
+# ============================
+# Runs
+# ============================
+
+def timed(fn, repeat=5):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def main():
+    if len(sys.argv) > 1:
+        ticker_frames, trade_frames = load_frames(sys.argv[1])
+    else:
+        ticker_frames = [synthetic_ticker_frame() for _ in range(5)]
+        trade_frames = synthetic_trade_frames()
+
+    def unwrap(msg):
+        return msg["data"] if isinstance(msg, dict) and "data" in msg else msg
+
+    # ---------- !ticker@arr ----------
+    def ticker_eager_rows():
+        for raw in ticker_frames:
+            for item in unwrap(json.loads(raw)):
+                eager_ticker_row(eager_ticker(item))
+
+    def ticker_lazy_rows():
+        for raw in ticker_frames:
+            for item in unwrap(Decoding.loads(raw)):
+                ticker_row(ticker_record(item))
+
+    def ticker_eager_rank():
+        for raw in ticker_frames:
+            for item in unwrap(json.loads(raw)):
+                eager_ticker(item)["QuoteVolume"]
+
+    def ticker_lazy_rank():
+        for raw in ticker_frames:
+            for item in unwrap(Decoding.loads(raw)):
+                ticker_record(item)["QuoteVolume"]
+
+    # ---------- @aggTrade ----------
+    def trade_eager_rows():
+        for raw in trade_frames:
+            eager_trade_row(eager_trade(json.loads(raw)))
+
+    def trade_lazy_rows():
+        for raw in trade_frames:
+            trade_row(normalize_aggtrade(unwrap(Decoding.loads(raw))))
+
+    n_items = sum(len(unwrap(json.loads(f))) for f in ticker_frames)
+    rows = []
+    for name, fn, count in [
+        ("ticker  json + eager, full row", ticker_eager_rows, n_items),
+        ("ticker  fast + lazy,  full row", ticker_lazy_rows, n_items),
+        ("ticker  json + eager, rank col", ticker_eager_rank, n_items),
+        ("ticker  fast + lazy,  rank col", ticker_lazy_rank, n_items),
+        ("aggTrade json + eager, full row", trade_eager_rows, len(trade_frames)),
+        ("aggTrade fast + lazy,  full row", trade_lazy_rows, len(trade_frames)),
+    ]:
+        if count:
+            rows.append((name, timed(fn) / count * 1e6, "us/item"))
+
+    report(f"Decode + normalize (JSON backend: {Decoding.JSON_BACKEND})", rows)
+
+
+if __name__ == "__main__":
+    main()
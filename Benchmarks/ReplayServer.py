@@ -0,0 +1,560 @@
+"""
+Local stand-in for Binance: combined-stream WebSocket + stub REST.
+
+Serves synthetic (or recorded) @kline_<i>, @aggTrade, @ticker,
+@depth@100ms and !ticker@arr frames on /stream?streams=a/b with
+SUBSCRIBE / UNSUBSCRIBE, and /api/v3/klines, /api/v3/aggTrades and
+/api/v3/depth consistent with the live frames (same price path,
+contiguous AggTradeIDs, depth update IDs continuing the snapshot).
+
+    python Benchmarks/ReplayServer.py [--rate 200] [--frames rec.jsonl]
+                                      [--symbols 2000] [--arr-rate 10]
+                                      [--ws-port 0] [--rest-port 0]
+
+Prints "READY <ws_url> <rest_url>" once both are listening.
+
+Recorded frames are JSON lines in combined-stream shape
+({"stream": ..., "data": ...}); they are replayed per stream in a loop,
+shifted to the current time and to AggTradeIDs that continue the REST
+history. Every frame carries an extra top-level "ts" (send time,
+time.time()) that StreamBenchmark uses for yield latency; the hub
+ignores it.
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import random
+import time
+import zlib
+from collections import defaultdict
+
+import websockets
+from aiohttp import web
+
+from common import setup_path
+
+setup_path()
+
+from KlineStream import interval_ms                 # noqa: E402
+
+try:
+    import orjson
+
+    def dumps(obj) -> str:
+        return orjson.dumps(obj).decode()
+except ImportError:
+    def dumps(obj) -> str:
+        return json.dumps(obj, separators=(",", ":"))
+
+
+DAY_MS = 24 * 60 * 60 * 1000
+FIRST_AGG_ID = 10_000_000
+
+
+def now_ms() -> int:
+    return int(time.time() * 1000)
+
+
+# ============================
+# Synthetic Market
+# ============================
+
+class SyntheticMarket:
+    """
+    Deterministic prices and trades, so REST history and live frames agree.
+
+    price(symbol, t) is a smooth function of time; trade i happens at
+    t0 + (i - FIRST_AGG_ID) * trade_step_ms.
+    """
+
+    def __init__(self, trade_rate: float, n_symbols: int):
+        self.t0 = now_ms()
+        self.trade_step_ms = 1000.0 / max(trade_rate, 1e-3)
+        self.symbols = ["BTCUSDT", "ETHUSDT", "BNBUSDT"] + [
+            f"SYM{i:04d}{'USDT' if i % 3 else 'BTC'}" for i in range(max(0, n_symbols - 3))
+        ]
+
+    # ---------- prices ----------
+
+    def price(self, symbol: str, t: int) -> float:
+        base = 10 + zlib.crc32(symbol.encode()) % 50000
+        return base * (
+            1
+            + 0.05 * math.sin(t / (30 * DAY_MS) * 2 * math.pi)
+            + 0.003 * math.sin(t / 60000)
+            + 0.0005 * math.sin(t / 700)
+        )
+
+    def kline(self, symbol: str, interval: str, open_time: int, now: int) -> list:
+        step = interval_ms(interval)
+        close_time = open_time + step - 1
+        o = self.price(symbol, open_time)
+        c = self.price(symbol, min(close_time, now))
+        vol = 1 + (open_time // step) % 97
+        return [
+            open_time, f"{o:.8f}", f"{max(o, c) * 1.001:.8f}", f"{min(o, c) * 0.999:.8f}",
+            f"{c:.8f}", f"{vol:.8f}", close_time, f"{vol * c:.8f}", int(vol * 13),
+            f"{vol / 2:.8f}", f"{vol * c / 2:.8f}"
+        ]
+
+    def klines(self, symbol, interval, limit, start=None, end=None) -> list:
+        now = now_ms()
+        step = interval_ms(interval)
+        live = now // step * step
+        last = live if end is None else min(live, end // step * step)
+
+        if start is not None:
+            first = -(-start // step) * step
+            last = min(last, first + (limit - 1) * step)
+        else:
+            first = last - (limit - 1) * step
+
+        return [self.kline(symbol, interval, t, now) for t in range(first, last + 1, step)]
+
+    def ws_kline(self, symbol: str, interval: str, open_time: int, now: int, closed: bool) -> dict:
+        k = self.kline(symbol, interval, open_time, now)
+        return {
+            "e": "kline", "E": now, "s": symbol,
+            "k": {
+                "t": k[0], "T": k[6], "s": symbol, "i": interval,
+                "o": k[1], "h": k[2], "l": k[3], "c": k[4], "v": k[5],
+                "n": k[8], "x": closed, "q": k[7], "V": k[9], "Q": k[10],
+            }
+        }
+
+    # ---------- trades ----------
+
+    def trade_id_at(self, t: int) -> int:
+        """Newest AggTradeID with TradeTime <= t"""
+        return FIRST_AGG_ID + math.floor((t - self.t0) / self.trade_step_ms)
+
+    def trade(self, symbol: str, i: int) -> dict:
+        t = int(self.t0 + (i - FIRST_AGG_ID) * self.trade_step_ms)
+        return {
+            "a": i, "p": f"{self.price(symbol, t):.8f}",
+            "q": f"{0.001 + (i * 7919 % 1000) / 1000:.5f}",
+            "f": 2 * i, "l": 2 * i + 1, "T": t,
+            "m": i % 3 == 0, "M": True,
+        }
+
+    def aggtrades(self, symbol, limit, from_id=None, start=None, end=None) -> list:
+        latest = self.trade_id_at(now_ms())
+        if from_id is not None:
+            first = from_id
+        elif start is not None:
+            first = self.trade_id_at(start - 1) + 1
+            if end is not None:
+                latest = min(latest, self.trade_id_at(end))
+        else:
+            first = latest - limit + 1
+
+        last = min(latest, first + limit - 1)
+        return [self.trade(symbol, i) for i in range(first, last + 1)]
+
+    # ---------- tickers ----------
+
+    def ticker(self, symbol: str, now: int) -> dict:
+        c = self.price(symbol, now)
+        o = self.price(symbol, now - DAY_MS)
+        vol = 1000 + zlib.crc32(symbol.encode()) % 100000 + (now // 1000) % 1000
+        return {
+            "e": "24hrTicker", "E": now, "s": symbol,
+            "p": f"{c - o:.8f}", "P": f"{(c / o - 1) * 100:.3f}", "w": f"{(c + o) / 2:.8f}",
+            "x": f"{o:.8f}", "c": f"{c:.8f}", "Q": "0.01000000",
+            "b": f"{c * 0.9999:.8f}", "B": "1.00000000", "a": f"{c * 1.0001:.8f}", "A": "1.00000000",
+            "o": f"{o:.8f}", "h": f"{max(c, o) * 1.01:.8f}", "l": f"{min(c, o) * 0.99:.8f}",
+            "v": f"{vol:.8f}", "q": f"{vol * c:.8f}",
+            "O": now - DAY_MS, "C": now, "F": 1, "L": 1 + vol, "n": vol,
+        }
+
+
+# ============================
+# Synthetic Order Book
+# ============================
+
+class SyntheticBook:
+    """
+    One symbol's order book around a fixed mid. diff() mutates it and
+    returns the depthUpdate event, snapshot() the REST view; both share
+    the update IDs, so a client can sequence one against the other.
+    """
+
+    def __init__(self, symbol: str, mid: float, levels: int = 2000, seed: int = 3):
+        self.symbol = symbol
+        self.tick = mid * 1e-5
+        self.mid_tick = int(mid / self.tick)
+        self.rng = random.Random(seed)
+        self.update_id = 1_000_000
+        self.bids = {self.mid_tick - i: self._qty() for i in range(1, levels + 1)}
+        self.asks = {self.mid_tick + i: self._qty() for i in range(1, levels + 1)}
+
+    def _qty(self) -> float:
+        return round(self.rng.uniform(0.001, 5.0), 5)
+
+    def _level(self, t: int, q: float) -> list:
+        return [f"{t * self.tick:.8f}", f"{q:.8f}"]
+
+    def diff(self, now: int, n_levels: int) -> dict:
+        rng = self.rng
+        changes = {"b": [], "a": []}
+        for _ in range(n_levels):
+            side, book, sign = rng.choice((("b", self.bids, -1), ("a", self.asks, 1)))
+            # most activity near the top, a few far levels
+            t = self.mid_tick + sign * (1 + int(rng.expovariate(1 / 20)))
+            q = 0.0 if t in book and rng.random() < 0.3 else self._qty()
+            if q:
+                book[t] = q
+            else:
+                book.pop(t, None)
+            changes[side].append(self._level(t, q))
+
+        first = self.update_id + 1
+        self.update_id += rng.randint(1, 3)
+        return {
+            "e": "depthUpdate", "E": now, "s": self.symbol,
+            "U": first, "u": self.update_id,
+            "b": changes["b"], "a": changes["a"],
+        }
+
+    def snapshot(self, limit: int) -> dict:
+        return {
+            "lastUpdateId": self.update_id,
+            "bids": [self._level(t, self.bids[t]) for t in sorted(self.bids, reverse=True)[:limit]],
+            "asks": [self._level(t, self.asks[t]) for t in sorted(self.asks)[:limit]],
+        }
+
+
+# ============================
+# Recorded Frames
+# ============================
+
+TIME_KEYS = ("E", "T", "O", "C")
+
+
+def load_recording(path: str) -> dict:
+    """stream name -> list of data payloads, in file order"""
+    frames = defaultdict(list)
+    with open(path, "rb") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            msg = json.loads(line)
+            if "stream" in msg:
+                frames[msg["stream"]].append(msg["data"])
+    return dict(frames)
+
+
+def _shift_item(d: dict, dt_ms: int, d_id: int) -> dict:
+    d = dict(d)
+    for key in TIME_KEYS:
+        if isinstance(d.get(key), int):
+            d[key] += dt_ms
+    if "k" in d:
+        k = d["k"] = dict(d["k"])
+        k["t"] += dt_ms
+        k["T"] += dt_ms
+    if d.get("e") == "aggTrade":
+        d["a"] += d_id
+    return d
+
+
+def shift(data, dt_ms: int, d_id: int):
+    if isinstance(data, list):
+        return [_shift_item(d, dt_ms, d_id) for d in data]
+    return _shift_item(data, dt_ms, d_id)
+
+
+# ============================
+# Server
+# ============================
+
+class ReplayServer:
+
+    def __init__(self, rate: float = 200.0, n_symbols: int = 2000, arr_rate: float = 10.0,
+                 arr_fraction: float = 0.25, recording: dict | None = None,
+                 depth_levels: int = 20):
+        self.rate = rate
+        self.depth_levels = depth_levels
+        self.arr_rate = arr_rate
+        self.arr_fraction = arr_fraction
+        self.recording = recording or {}
+        self.market = SyntheticMarket(rate, n_symbols)
+        self.books = {}
+        self.rest_calls = defaultdict(int)
+        self._weight_minute = None
+        self._weight_used = 0
+        self.frames_sent = 0
+        self.control = []          # (monotonic time, method, params) received
+        self._connections = set()
+        self._rng = random.Random(7)
+
+    # ---------- REST ----------
+
+    @staticmethod
+    def _int(q, key):
+        v = q.get(key)
+        return None if v is None else int(v)
+
+    def _json(self, data, weight: int):
+        """Response with Binance's per-minute used-weight header"""
+        minute = int(time.time()) // 60
+        if minute != self._weight_minute:
+            self._weight_minute = minute
+            self._weight_used = 0
+        self._weight_used += weight
+        return web.Response(
+            text=dumps(data), content_type="application/json",
+            headers={"X-MBX-USED-WEIGHT-1M": str(self._weight_used)}
+        )
+
+    async def rest_klines(self, request):
+        q = request.query
+        self.rest_calls["klines"] += 1
+        data = self.market.klines(
+            q["symbol"], q["interval"], min(int(q.get("limit", 500)), 1000),
+            start=self._int(q, "startTime"), end=self._int(q, "endTime")
+        )
+        return self._json(data, 2)
+
+    async def rest_aggtrades(self, request):
+        q = request.query
+        self.rest_calls["aggTrades"] += 1
+        data = self.market.aggtrades(
+            q["symbol"], min(int(q.get("limit", 500)), 1000),
+            from_id=self._int(q, "fromId"),
+            start=self._int(q, "startTime"), end=self._int(q, "endTime")
+        )
+        return self._json(data, 2)
+
+    def book(self, symbol: str) -> SyntheticBook:
+        b = self.books.get(symbol)
+        if b is None:
+            b = self.books[symbol] = SyntheticBook(symbol, self.market.price(symbol, now_ms()))
+        return b
+
+    async def rest_depth(self, request):
+        q = request.query
+        self.rest_calls["depth"] += 1
+        limit = min(int(q.get("limit", 100)), 5000)
+        data = self.book(q["symbol"].upper()).snapshot(limit)
+        return self._json(data, 50 if limit <= 1000 else 250)
+
+    async def rest_stats(self, request):
+        return web.json_response({
+            "rest_calls": dict(self.rest_calls),
+            "frames_sent": self.frames_sent,
+            "used_weight": self._weight_used,
+        })
+
+    # ---------- frame sources ----------
+
+    def _synthetic_source(self, stream: str):
+        """Callable(now) -> list of data payloads due for this stream"""
+        m = self.market
+        name, _, kind = stream.partition("@")
+
+        if stream == "!ticker@arr":
+            state = {"due": 0}
+
+            def arr(now):
+                # Binance pushes the array once a second; default here is 10/s
+                if now < state["due"]:
+                    return []
+                state["due"] = now + 1000.0 / self.arr_rate
+                k = max(1, int(len(m.symbols) * self.arr_fraction))
+                return [[m.ticker(s, now) for s in self._rng.sample(m.symbols, k)]]
+            return arr
+
+        symbol = name.upper()
+
+        if kind == "ticker":
+            return lambda now: [m.ticker(symbol, now)]
+
+        if kind.startswith("depth"):
+            book = self.book(symbol)
+            return lambda now: [book.diff(now, self.depth_levels)]
+
+        if kind == "aggTrade":
+            state = {"next": m.trade_id_at(now_ms()) + 1}
+
+            def trades(now):
+                last = m.trade_id_at(now)
+                out = []
+                for i in range(state["next"], last + 1):
+                    t = m.trade(symbol, i)
+                    t.update(e="aggTrade", E=now, s=symbol)
+                    out.append(t)
+                state["next"] = last + 1
+                return out
+            return trades
+
+        if kind.startswith("kline_"):
+            interval = kind[len("kline_"):]
+            step = interval_ms(interval)
+            state = {"open": now_ms() // step * step}
+
+            def kline(now):
+                out = []
+                live = now // step * step
+                if live > state["open"]:
+                    out.append(m.ws_kline(symbol, interval, state["open"], now, True))
+                    state["open"] = live
+                out.append(m.ws_kline(symbol, interval, live, now, False))
+                return out
+            return kline
+
+        return lambda now: []
+
+    def _recorded_source(self, stream: str):
+        frames = self.recording[stream]
+        items = [d for data in frames for d in (data if isinstance(data, list) else [data])]
+
+        # kline frames are shifted by whole candles, everything else by ms
+        _, _, kind = stream.partition("@")
+        align = interval_ms(kind[len("kline_"):]) if kind.startswith("kline_") else 1
+
+        first_e = next((d["E"] for d in items if "E" in d), None)
+        ids = [d["a"] for d in items if d.get("e") == "aggTrade"]
+        span_ids = max(ids) - min(ids) + 1 if ids else 0
+
+        state = {"i": 0, "dt_ms": 0, "d_id": 0}
+
+        def new_lap():
+            if first_e is not None:
+                state["dt_ms"] = (now_ms() - first_e) // align * align
+            if ids:
+                # continue the REST history's AggTradeIDs
+                state["d_id"] = max(
+                    state["d_id"] + span_ids,
+                    self.market.trade_id_at(now_ms()) + 1 - min(ids)
+                )
+
+        new_lap()
+
+        def replay(now):
+            i = state["i"]
+            data = shift(frames[i], state["dt_ms"], state["d_id"])
+            state["i"] = (i + 1) % len(frames)
+            if state["i"] == 0:
+                new_lap()
+            return [data]
+        return replay
+
+    def source(self, stream: str):
+        if stream in self.recording:
+            return self._recorded_source(stream)
+        return self._synthetic_source(stream)
+
+    # ---------- WebSocket ----------
+
+    async def ws_handler(self, ws):
+        path = ws.request.path if hasattr(ws, "request") else ws.path
+        _, _, query = path.partition("?streams=")
+        sources = {s: self.source(s) for s in query.split("/") if s}
+        self._connections.add(ws)
+
+        async def sender():
+            period = 1.0 / min(self.rate, 1000.0)
+            next_at = time.monotonic()
+            while True:
+                now = now_ms()
+                ts = time.time()
+                for stream, source in list(sources.items()):
+                    for data in source(now):
+                        await ws.send(dumps({"stream": stream, "data": data, "ts": ts}))
+                        self.frames_sent += 1
+                # fixed cadence, but never burst to catch up after a stall
+                next_at = max(next_at + period, time.monotonic())
+                await asyncio.sleep(next_at - time.monotonic())
+
+        task = asyncio.ensure_future(sender())
+        try:
+            async for raw in ws:
+                msg = json.loads(raw)
+                method = msg.get("method")
+                self.control.append((time.monotonic(), method, msg.get("params", [])))
+                if method == "SUBSCRIBE":
+                    for s in msg.get("params", []):
+                        sources.setdefault(s, self.source(s))
+                elif method == "UNSUBSCRIBE":
+                    for s in msg.get("params", []):
+                        sources.pop(s, None)
+                await ws.send(dumps({"result": None, "id": msg.get("id")}))
+        except websockets.ConnectionClosed:
+            pass
+        finally:
+            task.cancel()
+            self._connections.discard(ws)
+
+    @property
+    def connections(self) -> int:
+        """Open WebSocket connections"""
+        return len(self._connections)
+
+    async def drop(self):
+        """Close every open WebSocket connection, as a network drop would"""
+        for ws in list(self._connections):
+            await ws.close(1011, "dropped")
+
+    # ---------- lifecycle ----------
+
+    async def start(self, host: str = "127.0.0.1", ws_port: int = 0, rest_port: int = 0):
+        app = web.Application()
+        app.router.add_get("/api/v3/klines", self.rest_klines)
+        app.router.add_get("/api/v3/aggTrades", self.rest_aggtrades)
+        app.router.add_get("/api/v3/depth", self.rest_depth)
+        app.router.add_get("/bench/stats", self.rest_stats)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, host, rest_port).start()
+        rest_port = self._runner.addresses[0][1]
+
+        self._ws_server = await websockets.serve(self.ws_handler, host, ws_port)
+        ws_port = next(iter(self._ws_server.sockets)).getsockname()[1]
+
+        return f"ws://{host}:{ws_port}", f"http://{host}:{rest_port}"
+
+    async def stop(self):
+        self._ws_server.close()
+        await self._ws_server.wait_closed()
+        await self._runner.cleanup()
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rate", type=float, default=200.0, help="frames / trades per second per stream")
+    parser.add_argument("--symbols", type=int, default=2000, help="symbols in !ticker@arr")
+    parser.add_argument("--arr-rate", type=float, default=10.0, help="!ticker@arr frames per second")
+    parser.add_argument("--arr-fraction", type=float, default=0.25, help="share of symbols per !ticker@arr frame")
+    parser.add_argument("--depth-levels", type=int, default=20, help="price levels per @depth frame")
+    parser.add_argument("--frames", help="recorded combined-stream frames (JSON lines)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--ws-port", type=int, default=0)
+    parser.add_argument("--rest-port", type=int, default=0)
+    args = parser.parse_args()
+
+    server = ReplayServer(
+        rate=args.rate,
+        n_symbols=args.symbols,
+        arr_rate=args.arr_rate,
+        arr_fraction=args.arr_fraction,
+        recording=load_recording(args.frames) if args.frames else None,
+        depth_levels=args.depth_levels,
+    )
+    ws_url, rest_url = await server.start(args.host, args.ws_port, args.rest_port)
+    print(f"READY {ws_url} {rest_url}", flush=True)
+
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await server.stop()
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
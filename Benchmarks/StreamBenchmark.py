@@ -0,0 +1,303 @@
+"""
+End-to-end throughput benchmark for the stream functions.
+
+Starts ReplayServer in a child process, points the hub and the REST
+modules at it, then drives each xlOil function (xloil stubbed out) for
+a fixed time and reports:
+
+  msgs/sec       frames decoded by the hub for the function's streams
+  yields/sec     tables / values handed to Excel
+  latency        frame send -> yield, p50 / p95 / p99 (ms)
+  CPU            process_time / wall time of this process
+  peak memory    tracemalloc peak while the function ran
+
+    python Benchmarks/StreamBenchmark.py [--seconds 10] [--rate 200] [--max-hz 0]
+                                         [--arr-rate 10] [--depth-levels 20]
+                                         [--only KlineStream,TickerStream]
+                                         [--frames rec.jsonl] [--no-memory]
+
+max_hz defaults to 0 (yield on every frame) so the hot path is measured,
+not the throttle. tracemalloc slows Python down; use --no-memory for
+clean msgs/sec numbers.
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from common import setup_path, report
+
+# keep benchmark data out of the real store
+os.environ["BITWISE_DATA_DIR"] = tempfile.mkdtemp(prefix="bitwise-bench-")
+
+setup_path()
+
+import aiohttp                                          # noqa: E402
+import StreamHub                                        # noqa: E402
+from RestClient import rest                             # noqa: E402
+from KlineStream import KlineStream as kline_stream     # noqa: E402
+from aggTrade import AggTradeStreamWindow               # noqa: E402
+from AllCoinTicker import AllCoinsTickerStream          # noqa: E402
+from TickerStream import TickerStream                   # noqa: E402
+from OrderBook import OrderBookStream                   # noqa: E402
+from TradeBars import TradeBars                         # noqa: E402
+from OrderFlow import OrderFlow                         # noqa: E402
+from CryptoPriceOnDate import CryptoPriceOnDate         # noqa: E402
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+DAY_MS = 24 * 60 * 60 * 1000
+
+
+# ============================
+# Replay Server Process
+# ============================
+
+def start_server(args):
+    cmd = [
+        sys.executable, os.path.join(HERE, "ReplayServer.py"),
+        "--rate", str(args.rate),
+        "--symbols", str(args.symbols),
+        "--arr-rate", str(args.arr_rate),
+        "--depth-levels", str(args.depth_levels),
+    ]
+    if args.frames:
+        cmd += ["--frames", args.frames]
+
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, text=True)
+    line = proc.stdout.readline().split()
+    if not line or line[0] != "READY":
+        proc.kill()
+        raise RuntimeError("replay server did not start")
+    return proc, line[1], line[2]
+
+
+def point_at(ws_url: str, rest_url: str):
+    StreamHub.hub.base_url = ws_url
+    rest.base_url = rest_url
+
+
+# ============================
+# Hub Instrumentation
+# ============================
+
+class FrameTap:
+    """
+    Wraps StreamHub.loads: counts decoded frames per stream and keeps the
+    replay server's send time of the newest one.
+    """
+
+    def __init__(self):
+        self.count = {}
+        self.sent = {}
+        self._loads = StreamHub.loads
+
+    def install(self):
+        def loads(raw):
+            msg = self._loads(raw)
+            stream = msg.get("stream") if isinstance(msg, dict) else None
+            if stream is not None:
+                self.count[stream] = self.count.get(stream, 0) + 1
+                self.sent[stream] = msg.get("ts")
+            return msg
+        StreamHub.loads = loads
+
+    def frames(self, streams) -> int:
+        return sum(self.count.get(s, 0) for s in streams)
+
+    def newest_sent(self, streams):
+        sent = [self.sent[s] for s in streams if self.sent.get(s) is not None]
+        return max(sent) if sent else None
+
+
+def percentile(values: list, q: float) -> float:
+    if not values:
+        return float("nan")
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q / 100 * len(values)))]
+
+
+# ============================
+# Runs
+# ============================
+
+async def drive_stream(tap: FrameTap, agen, streams: list, seconds: float, memory: bool) -> list:
+    frames0 = tap.frames(streams)
+    latencies = []
+    yields = 0
+
+    if memory:
+        tracemalloc.start()
+    cpu0 = time.process_time()
+    t0 = time.perf_counter()
+    deadline = t0 + seconds
+
+    try:
+        while True:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                await asyncio.wait_for(agen.__anext__(), remaining)
+            except asyncio.TimeoutError:
+                break
+            now = time.time()
+            yields += 1
+            sent = tap.newest_sent(streams)
+            if sent is not None:
+                latencies.append((now - sent) * 1000)
+    finally:
+        wall = time.perf_counter() - t0
+        cpu = time.process_time() - cpu0
+        peak = tracemalloc.get_traced_memory()[1] if memory else None
+        if memory:
+            tracemalloc.stop()
+        await agen.aclose()
+
+    rows = [
+        ("msgs/sec", (tap.frames(streams) - frames0) / wall, "msg/s"),
+        ("yields/sec", yields / wall, "yield/s"),
+        ("latency p50", percentile(latencies, 50), "ms"),
+        ("latency p95", percentile(latencies, 95), "ms"),
+        ("latency p99", percentile(latencies, 99), "ms"),
+        ("CPU", cpu / wall * 100, "%"),
+    ]
+    if peak is not None:
+        rows.append(("peak memory", peak / 2 ** 20, "MB"))
+    return rows
+
+
+async def drive_price_lookups(rest_url: str, n: int, memory: bool) -> list:
+    """n concurrent CryptoPriceOnDate calls, cold store then warm"""
+    rng = random.Random(11)
+    today = int(time.time() * 1000) // DAY_MS * DAY_MS
+    symbols = ["BTCUSDT", "ETHUSDT", "BNBUSDT"]
+    calls = [
+        (rng.choice(symbols), (today - rng.randint(1, 3 * 365) * DAY_MS) / DAY_MS + 25569)
+        for _ in range(n)
+    ]
+
+    async def rest_count():
+        async with aiohttp.ClientSession() as session:
+            async with session.get(f"{rest_url}/bench/stats") as r:
+                stats = await r.json()
+        return stats["rest_calls"].get("klines", 0)
+
+    rows = []
+    for label in ("cold", "warm"):
+        latencies = []
+
+        async def one(symbol, serial):
+            t = time.perf_counter()
+            await CryptoPriceOnDate(symbol, serial)
+            latencies.append((time.perf_counter() - t) * 1000)
+
+        rest0 = await rest_count()
+        if memory:
+            tracemalloc.start()
+        cpu0 = time.process_time()
+        t0 = time.perf_counter()
+        await asyncio.gather(*[one(s, d) for s, d in calls])
+        wall = time.perf_counter() - t0
+        cpu = time.process_time() - cpu0
+        peak = tracemalloc.get_traced_memory()[1] if memory else None
+        if memory:
+            tracemalloc.stop()
+
+        rows += [
+            (f"{label} lookups/sec", n / wall, "lookup/s"),
+            (f"{label} latency p50", percentile(latencies, 50), "ms"),
+            (f"{label} latency p99", percentile(latencies, 99), "ms"),
+            (f"{label} REST calls", await rest_count() - rest0, "calls"),
+            (f"{label} CPU", cpu / wall * 100, "%"),
+        ]
+        if peak is not None:
+            rows.append((f"{label} peak memory", peak / 2 ** 20, "MB"))
+    return rows
+
+
+CASES = {
+    "KlineStream": (
+        lambda a: kline_stream("BTCUSDT", a.interval, 500, a.max_hz),
+        ["btcusdt@kline_{interval}"],
+    ),
+    "AggTradeStreamWindow": (
+        lambda a: AggTradeStreamWindow("BTCUSDT", 1.0, None, a.max_hz),
+        ["btcusdt@aggTrade"],
+    ),
+    "AllCoinsTickerStream": (
+        lambda a: AllCoinsTickerStream("USDT", None, 0, "QuoteVolume", a.max_hz),
+        ["!ticker@arr"],
+    ),
+    "TickerStream": (
+        lambda a: TickerStream("BTCUSDT", "Last price", a.max_hz),
+        ["btcusdt@ticker"],
+    ),
+    "TradeBars": (
+        lambda a: TradeBars("BTCUSDT", "time", 0.25, 200, 1.0, a.max_hz),
+        ["btcusdt@aggTrade"],
+    ),
+    "OrderFlow": (
+        lambda a: OrderFlow("BTCUSDT", 1.0, None, 100000, 20, a.max_hz),
+        ["btcusdt@aggTrade"],
+    ),
+    "OrderBookStream": (
+        lambda a: OrderBookStream("BTCUSDT", 20, 10, a.max_hz),
+        ["btcusdt@depth@100ms"],
+    ),
+}
+
+
+async def run(args, rest_url: str):
+    tap = FrameTap()
+    tap.install()
+
+    only = set(args.only.split(",")) if args.only else None
+    memory = not args.no_memory
+
+    try:
+        for name, (make, streams) in CASES.items():
+            if only and name not in only:
+                continue
+            streams = [s.format(interval=args.interval) for s in streams]
+            rows = await drive_stream(tap, make(args), streams, args.seconds, memory)
+            report(f"{name} ({args.seconds:g}s, rate {args.rate:g}/s, max_hz {args.max_hz:g})", rows)
+
+        if not only or "CryptoPriceOnDate" in only:
+            rows = await drive_price_lookups(rest_url, args.lookups, memory)
+            report(f"CryptoPriceOnDate ({args.lookups} concurrent lookups)", rows)
+    finally:
+        await rest.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument("--rate", type=float, default=200.0, help="frames / trades per second per stream")
+    parser.add_argument("--symbols", type=int, default=2000, help="symbols in !ticker@arr")
+    parser.add_argument("--arr-rate", type=float, default=10.0, help="!ticker@arr frames per second")
+    parser.add_argument("--depth-levels", type=int, default=20, help="price levels per @depth frame")
+    parser.add_argument("--max-hz", type=float, default=0.0)
+    parser.add_argument("--interval", default="1m", help="KlineStream interval (1s exercises candle closes)")
+    parser.add_argument("--lookups", type=int, default=2000, help="CryptoPriceOnDate calls")
+    parser.add_argument("--only", help="comma separated function names")
+    parser.add_argument("--frames", help="recorded combined-stream frames (JSON lines)")
+    parser.add_argument("--no-memory", action="store_true", help="skip tracemalloc")
+    args = parser.parse_args()
+
+    proc, ws_url, rest_url = start_server(args)
+    try:
+        point_at(ws_url, rest_url)
+        asyncio.run(run(args, rest_url))
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+if __name__ == "__main__":
+    main()
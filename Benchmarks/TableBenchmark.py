@@ -0,0 +1,249 @@
+"""
+Table snapshot benchmark: list rows vs NumPy columns.
+
+Compares the original path (one Python list per row, built once per
+record, and a fresh [HEADER, *rows, status] per yield) with the
+ColumnBuffer path (typed columns, int64 ms times, cells converted per
+changed row, the table a view of one 2-D object array) for kline,
+aggTrade and all-coins tables of 1k / 10k / 100k rows.
+
+Per table and path:
+    ingest    us per record written into the buffer
+    yield     ms to rewrite the live row and build the table
+    held      KB the buffer keeps for its rows, Excel cells included
+    allocs    Python blocks allocated by one yield
+
+The conversion xlOil does when the table reaches Excel cannot run
+outside Excel: for the list path it walks one list per row plus every
+cell, for the array path one contiguous array of cells.
+
+    python Benchmarks/TableBenchmark.py [--sizes 1000,10000,100000]
+"""
+
+import argparse
+import random
+import time
+import tracemalloc
+from collections import deque
+
+from common import setup_path, report
+
+setup_path()
+
+import KlineStream                      # noqa: E402
+import aggTrade                         # noqa: E402
+import AllCoinTicker                    # noqa: E402
+
+
+# ============================
+# Records
+# ============================
+
+def kline_records(n):
+    step = 60 * 1000
+    start = KlineStream.now_ms() - n * step
+    return [
+        KlineStream.normalize_rest_kline([
+            start + i * step,
+            f"{60000 + random.uniform(-50, 50):.2f}", "60100.00", "59900.00",
+            f"{60000 + random.uniform(-50, 50):.2f}", f"{random.uniform(1, 100):.5f}",
+            start + (i + 1) * step - 1, f"{random.uniform(1e5, 1e7):.2f}",
+            random.randint(1, 5000), "12.5", "750000.0"
+        ])
+        for i in range(n)
+    ]
+
+
+def trade_records(n):
+    start = int(time.time() * 1000) - n
+    return [
+        aggTrade.normalize_aggtrade({
+            "T": start + i, "p": f"{60000 + random.uniform(-50, 50):.2f}",
+            "q": f"{random.uniform(0, 2):.5f}", "a": i, "f": i, "l": i,
+            "m": bool(i % 2), "M": True
+        })
+        for i in range(n)
+    ]
+
+
+def ticker_frame(n):
+    now = int(time.time() * 1000)
+    return [
+        {
+            "s": f"SYM{i:06d}USDT", "E": now,
+            "c": f"{random.uniform(1, 100):.8f}", "p": f"{random.uniform(-5, 5):.8f}",
+            "P": f"{random.uniform(-9, 9):.3f}", "h": "2.0", "l": "0.5",
+            "v": f"{random.uniform(1, 1e6):.8f}", "q": f"{random.uniform(1, 1e8):.8f}",
+            "n": random.randint(1, 10 ** 6)
+        }
+        for i in range(n)
+    ]
+
+
+# ============================
+# Buffers under test
+# ============================
+
+class ListBuffer:
+    """The original layout: records + one Excel row list per record"""
+
+    def __init__(self, header, limit=None):
+        self.header = header
+        self.records = deque(maxlen=limit)
+        self.rows = deque(maxlen=limit)
+
+    def extend(self, records):
+        for d in records:
+            self.records.append(d)
+            self.rows.append(d.row())
+
+    def table(self, status_row):
+        return [self.header, *self.rows, status_row]
+
+
+def list_ticker(frame):
+    buf = ListBuffer(AllCoinTicker.HEADER)
+    buf.extend(AllCoinTicker.normalize(item) for item in frame)
+    return buf
+
+
+def columnar_ticker(frame):
+    board = AllCoinTicker.TickerBoard()
+    board.apply(frame)
+    return board
+
+
+def cases(n):
+    """(table, path, build buffer, status row, shared records, live record)"""
+    klines = kline_records(n)
+    trades = trade_records(n)
+    frame = ticker_frame(n)
+
+    kline_status = KlineStream.status_row("LIVE")
+    trade_status = ["STREAM_STATUS", "LIVE"] + [""] * (len(aggTrade.HEADER) - 2)
+    ticker_status = AllCoinTicker.STATUS_ROW_LIVE
+
+    def list_klines():
+        buf = ListBuffer(KlineStream.HEADER, n)
+        buf.extend(klines)
+        return buf
+
+    def columnar_klines():
+        buf = KlineStream.KlineBuffer(n)
+        buf.extend(klines)
+        return buf
+
+    def list_trades():
+        buf = ListBuffer(aggTrade.HEADER)
+        buf.extend(trades)
+        return buf
+
+    def columnar_trades():
+        # window wide enough to keep every trade
+        buf = aggTrade.TradeWindow(minutes=n)
+        buf.extend(trades)
+        return buf
+
+    live_ticker = AllCoinTicker.normalize(frame[-1])
+
+    return [
+        ("klines", "list", list_klines, kline_status, klines, klines[-1]),
+        ("klines", "columns", columnar_klines, kline_status, klines, klines[-1]),
+        ("aggTrade", "list", list_trades, trade_status, trades, trades[-1]),
+        ("aggTrade", "columns", columnar_trades, trade_status, trades, trades[-1]),
+        ("all-coins", "list", lambda: list_ticker(frame), ticker_status, (), live_ticker),
+        ("all-coins", "columns", lambda: columnar_ticker(frame), ticker_status, (), live_ticker),
+    ]
+
+
+def touch(buf, d):
+    """A live update: the last row is rewritten from record d"""
+    if isinstance(buf, ListBuffer):
+        buf.rows[-1] = d.row()
+    else:
+        buf.columns.set(-1, d.pick(buf.columns.fields))
+
+
+def fresh(build, records):
+    # records cache converted columns; start each build from raw payloads
+    for d in records:
+        d._cache.clear()
+    return build()
+
+
+# ============================
+# Measurements
+# ============================
+
+def best_of(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def held_bytes(build, records, status_row):
+    """Bytes the buffer keeps once shown (beyond records that already existed)"""
+    for d in records:
+        d._cache.clear()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    buf = build()
+    buf.table(status_row)
+    held = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    del buf
+    return held
+
+
+def yield_allocs(buf, d, status_row):
+    """(blocks, bytes) allocated by one update + table() that stay alive with it"""
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    touch(buf, d)
+    table = buf.table(status_row)
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    diff = after.compare_to(before, "filename")
+    del table
+    return (
+        sum(max(0, s.count_diff) for s in diff),
+        sum(max(0, s.size_diff) for s in diff),
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", default="1000,10000,100000")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    random.seed(7)
+    for n in [int(s) for s in args.sizes.split(",") if s.strip()]:
+        rows = []
+        for table, path, build, status_row, records, live in cases(n):
+            name = f"{table:<9} {path:<7}"
+            ingest = best_of(lambda: fresh(build, records), 1)
+            buf = fresh(build, records)
+            buf.table(status_row)
+
+            def one_yield():
+                touch(buf, live)
+                buf.table(status_row)
+
+            build_time = best_of(one_yield, args.repeat)
+            blocks, size = yield_allocs(buf, live, status_row)
+
+            rows += [
+                (f"{name} ingest", ingest / n * 1e6, "us/row"),
+                (f"{name} yield", build_time * 1e3, "ms"),
+                (f"{name} held", held_bytes(build, records, status_row) / 1024, "KB"),
+                (f"{name} allocs", blocks, f"blocks/yield ({size / 1024:,.0f} KB)"),
+            ]
+        report(f"{n:,}-row tables", rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+import os
+import sys
+import types
+
+# ============================
+# Shared benchmark setup
+# ============================
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Data")
+
+
+def setup_path():
+    """
+    Make the Data/ modules importable outside Excel.
+
+    xlOil only exists inside an Excel process; when it is missing a
+    no-op stand-in is installed so @xlo.func functions stay plain
+    coroutines / async generators.
+    """
+    if DATA_DIR not in sys.path:
+        sys.path.insert(0, DATA_DIR)
+
+    try:
+        import xloil  # noqa: F401
+    except ImportError:
+        xlo = types.ModuleType("xloil")
+
+        def func(fn=None, **kwargs):
+            return fn if fn is not None else (lambda f: f)
+
+        class Array:
+            def __init__(self, *args, **kwargs):
+                pass
+
+        xlo.func = func
+        xlo.Array = Array
+        sys.modules["xloil"] = xlo
+
+
+def report(title: str, rows: list):
+    """Print [(name, value, unit), ...] as an aligned table"""
+    print(f"\n{title}")
+    print("-" * len(title))
+    width = max(len(r[0]) for r in rows)
+    for name, value, unit in rows:
+        print(f"  {name:<{width}}  {value:>12,.2f} {unit}")
@@ -1,32 +1,19 @@
 import xloil as xlo
 import asyncio
-import websockets
-import json
-import datetime as dt
+import bisect
+import time
+import numpy as np
+from StreamHub import hub
+from Metrics import metrics
+from Decoding import LazyRecord
+from Throttle import Throttle, DEFAULT_MAX_HZ
+from Columnar import ColumnBuffer, excel_array
+from ExcelTime import excel_time
 
-BINANCE_WS = "wss://stream.binance.com:9443/ws/!ticker@arr"
-
-# ---------------- Time Helper ----------------
-
-def to_ist(ms):
-    return dt.datetime.utcfromtimestamp(ms / 1000) + dt.timedelta(hours=5, minutes=30)
+STREAM = "!ticker@arr"
 
 # ---------------- Normalize ------------------
 
-def normalize(d):
-    return {
-        "Symbol": d["s"],
-        "EventTimeIST": to_ist(d["E"]),
-        "LastPrice": float(d["c"]),
-        "PriceChange": float(d["p"]),
-        "PriceChangePercent": float(d["P"]),
-        "HighPrice": float(d["h"]),
-        "LowPrice": float(d["l"]),
-        "BaseVolume": float(d["v"]),
-        "QuoteVolume": float(d["q"]),
-        "NumberOfTrades": int(d["n"])
-    }
-
 HEADER = [
     "Symbol",
     "EventTimeIST",
@@ -40,61 +27,433 @@ HEADER = [
     "NumberOfTrades"
 ]
 
+
+class TickerRecord(LazyRecord):
+    __slots__ = ()
+
+    FIELDS = {
+        "Symbol": ("s", str),
+        "EventTime": ("E", int),
+        "EventTimeIST": ("E", excel_time),
+        "LastPrice": ("c", float),
+        "PriceChange": ("p", float),
+        "PriceChangePercent": ("P", float),
+        "HighPrice": ("h", float),
+        "LowPrice": ("l", float),
+        "BaseVolume": ("v", float),
+        "QuoteVolume": ("q", float),
+        "NumberOfTrades": ("n", int),
+    }
+    ROW_COLUMNS = HEADER
+
+
+# Excel columns as record fields; the event time stays int64 ms until table()
+COLUMNS = (
+    ("Symbol", object, False),
+    ("EventTime", np.int64, True),
+    ("LastPrice", np.float64, False),
+    ("PriceChange", np.float64, False),
+    ("PriceChangePercent", np.float64, False),
+    ("HighPrice", np.float64, False),
+    ("LowPrice", np.float64, False),
+    ("BaseVolume", np.float64, False),
+    ("QuoteVolume", np.float64, False),
+    ("NumberOfTrades", np.int64, False),
+)
+FIELDS = tuple(f for f, _, _ in COLUMNS)
+
+
+def normalize(d):
+    return TickerRecord(d)
+
+
 def as_row(d):
-    return [
-        d["Symbol"],
-        d["EventTimeIST"],
-        d["LastPrice"],
-        d["PriceChange"],
-        d["PriceChangePercent"],
-        d["HighPrice"],
-        d["LowPrice"],
-        d["BaseVolume"],
-        d["QuoteVolume"],
-        d["NumberOfTrades"]
-    ]
-
-# ---------------- RTD FUNCTION ----------------
+    return d.row()
+
+# ---------------- Universe Selection ----------------
+
+RANK_COLUMNS = ("QuoteVolume", "PriceChangePercent", "NumberOfTrades")
+
+
+def parse_symbols(value):
+    """
+    Explicit symbol list from Excel:
+      - "BTCUSDT,ETHUSDT"
+      - a range of symbols (arrives as an array)
+    """
+    if value is None or (isinstance(value, str) and not value.strip()):
+        return None
+
+    if isinstance(value, str):
+        items = value.split(",")
+    else:
+        items = []
+        for x in getattr(value, "flat", value):
+            if isinstance(x, (list, tuple)):
+                items.extend(x)
+            else:
+                items.append(x)
+
+    # dict: membership tests like a set, keeps the sheet's order
+    out = dict.fromkeys(str(x).strip().upper() for x in items if x is not None and str(x).strip())
+    return out or None
+
+
+# ---------------- Ticker Board ----------------
+
+class TickerBoard:
+    """
+    Ticker rows for a symbol universe.
+
+    - symbols outside the universe (quote asset / explicit list) are
+      skipped before normalization
+    - only symbols present in an incoming frame are normalized and
+      written, straight into the typed columns of a ColumnBuffer
+    - default order: by symbol, with a stable row index per symbol;
+      re-sorted only when a new symbol shows up
+    - top_n > 0: the top N by `rank_by` (descending), kept in an
+      incrementally maintained sorted index instead of a per-frame sort;
+      only positions whose record changed are rewritten
+    """
+
+    def __init__(
+        self,
+        quote_asset: str = "",
+        symbols=None,
+        top_n: int = 0,
+        rank_by: str = "QuoteVolume"
+    ):
+        self.quote_asset = quote_asset.upper()
+        self.universe = parse_symbols(symbols)
+        self.top_n = top_n if top_n and top_n > 0 else 0
+        self.rank_col = HEADER.index(rank_by)
+
+        self.symbols = []   # row order
+        self.index = {}     # symbol -> row position
+        self.columns = ColumnBuffer(COLUMNS, capacity=self.top_n or 1024)
+
+        self.key_of = {}    # ranked mode: symbol -> rank key
+        self.rec_of = {}    # ranked mode: symbol -> latest record
+        self.shown = []     # ranked mode: record written at each position
+        self.ranked = []    # ranked mode: sorted [(-key, symbol)]
+
+    def __len__(self):
+        return len(self.symbols)
+
+    def accepts(self, symbol: str) -> bool:
+        if self.universe is not None and symbol not in self.universe:
+            return False
+        return symbol.endswith(self.quote_asset)
+
+    def apply(self, batch: list):
+        """
+        Apply one !ticker@arr frame.
+        Returns the changed row positions, or None when the row layout
+        changed (rows inserted / ranking resized).
+        """
+        if self.top_n:
+            return self._apply_ranked(batch)
+
+        changed = []
+        added = {}
+        columns = self.columns
+
+        for item in batch:
+            symbol = item["s"]
+            if not self.accepts(symbol):
+                continue
+
+            i = self.index.get(symbol)
+            if i is None:
+                added[symbol] = normalize(item).pick(FIELDS)
+            else:
+                columns.set(i, normalize(item).pick(FIELDS))
+                changed.append(i)
+
+        if not added:
+            return changed
+
+        symbols = self.symbols + list(added)
+        for values in added.values():
+            columns.append(values)
+        order = sorted(range(len(symbols)), key=symbols.__getitem__)
+        columns.reorder(order)
+        self.symbols = [symbols[i] for i in order]
+        self.index = {s: i for i, s in enumerate(self.symbols)}
+        return None
+
+    def _apply_ranked(self, batch: list):
+        rank_by = HEADER[self.rank_col]
+        ranked = self.ranked
+
+        for item in batch:
+            symbol = item["s"]
+            if not self.accepts(symbol):
+                continue
+
+            # only the rank column is converted here
+            rec = normalize(item)
+            key = rec[rank_by]
+            old = self.key_of.get(symbol)
+            if old is not None:
+                del ranked[bisect.bisect_left(ranked, (-old, symbol))]
+            bisect.insort(ranked, (-key, symbol))
+            self.key_of[symbol] = key
+            self.rec_of[symbol] = rec
+
+        # full rows are converted only for records inside the top N
+        self.symbols = [s for _, s in ranked[:self.top_n]]
+        self.index = {s: i for i, s in enumerate(self.symbols)}
+        records = [self.rec_of[s] for s in self.symbols]
+        columns = self.columns
+
+        if len(records) != len(self.shown):
+            columns.clear()
+            for rec in records:
+                columns.append(rec.pick(FIELDS))
+            self.shown = records
+            return None
+
+        changed = []
+        for i, (rec, old) in enumerate(zip(records, self.shown)):
+            if rec is not old:
+                columns.set(i, rec.pick(FIELDS))
+                changed.append(i)
+        self.shown = records
+        return changed
+
+    def table(self, status_row: list):
+        return self.columns.table(HEADER, status_row)
+
+    def delta(self, changed, status_row: list):
+        """Changed rows only, prefixed with their 1-based row in table()"""
+        if changed is None:
+            changed = range(len(self.symbols))
+        index = np.fromiter(changed, dtype=np.intp)
+        cells = self.columns.cells()[index]
+        return excel_array(
+            DELTA_HEADER,
+            np.column_stack((index + 1, cells)),
+            [""] + status_row
+        )
+
+
+DELTA_HEADER = ["Row"] + HEADER
+
+STATUS_ROW_LIVE = ["STREAM_STATUS", "LIVE"] + [""] * (len(HEADER) - 2)
+STATUS_ROW_DOWN = ["STREAM_STATUS", "DISCONNECTED"] + [""] * (len(HEADER) - 2)
+
+
+def _merge_changed(acc, changed):
+    # None (= layout changed) wins over any index set
+    if acc is None or changed is None:
+        return None
+    acc.update(changed)
+    return acc
+
+
+class BoardListener:
+    """
+    One formula's view of a shared board: the rows changed since it last
+    yielded, and the feed status. Iterating it waits for the next change
+    (so it plugs into Throttle.messages like a hub subscription).
+    """
+
+    def __init__(self):
+        self.status = STATUS_ROW_LIVE
+        self.pending = None         # None = send every row (first yield)
+        self.wake = asyncio.Event()
+
+    def notify(self, changed, status=None):
+        self.pending = _merge_changed(self.pending, changed)
+        if status is not None:
+            self.status = status
+        self.wake.set()
+
+    def take(self):
+        changed = sorted(self.pending) if self.pending is not None else None
+        self.pending = set()
+        return changed
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        await self.wake.wait()
+        self.wake.clear()
+        return True
+
+
+class BoardFeed:
+    """
+    One TickerBoard per universe (quote asset, symbols, top_n, rank_by),
+    fed from the shared !ticker@arr stream by a single task and read by
+    every formula asking for that universe.
+
+    !ticker@arr only carries the symbols that changed, so a board started
+    later would miss rows the other one has; sharing keeps
+    AllCoinsTickerStream and AllCoinsTickerDelta on the very same rows.
+    The task stops when the last formula leaves.
+    """
+
+    feeds = {}
+
+    def __init__(self, key, board: TickerBoard):
+        self.key = key
+        self.board = board
+        self.listeners = set()
+        self.task = None
+
+    @classmethod
+    def get(cls, board: TickerBoard) -> "BoardFeed":
+        universe = board.universe
+        key = (
+            board.quote_asset,
+            frozenset(universe) if universe is not None else None,
+            board.top_n,
+            board.rank_col,
+        )
+        feed = cls.feeds.get(key)
+        if feed is None:
+            feed = cls.feeds[key] = cls(key, board)
+        return feed
+
+    def join(self) -> BoardListener:
+        listener = BoardListener()
+        if len(self.board):
+            listener.wake.set()
+        self.listeners.add(listener)
+        if self.task is None:
+            self.task = asyncio.ensure_future(self._run())
+        return listener
+
+    def leave(self, listener: BoardListener):
+        self.listeners.discard(listener)
+        if not self.listeners:
+            del self.feeds[self.key]
+            if self.task is not None:
+                self.task.cancel()
+
+    def _notify(self, changed, status=None):
+        for listener in self.listeners:
+            listener.notify(changed, status)
+
+    async def _run(self):
+        board = self.board
+        stats = metrics.stream(STREAM)
+        link = hub.link(STREAM)
+        down = False
+
+        while True:
+            async with link:
+                async for data in link:
+                    if down:
+                        down = False
+                        self._notify([], STATUS_ROW_LIVE)
+                    t0 = stats.apply_start()
+                    changed = board.apply(data)
+                    stats.apply_end(t0)
+                    self._notify(changed)
+
+            # ❌ no Excel error
+            down = True
+            self._notify([], STATUS_ROW_DOWN)
+
+
+async def ticker_board_updates(board: TickerBoard, max_hz: float = DEFAULT_MAX_HZ):
+    """
+    Follow the shared board for `board`'s universe (`board` itself is
+    used when no formula has that universe open yet).
+
+    (board, status_row, changed) is yielded at most max_hz times per
+    second, with `changed` accumulated over the frames in between (None
+    = every row), and right away when the status changes.
+    """
+    feed = BoardFeed.get(board)
+    listener = feed.join()
+    shown = None
+
+    try:
+        throttle = Throttle(max_hz)
+        async for woke in throttle.messages(listener):
+            urgent = woke is None or listener.status is not shown
+            if throttle.ready(urgent=urgent):
+                shown = listener.status
+                yield feed.board, shown, listener.take()
+    finally:
+        feed.leave(listener)
+
+
+# ---------------- RTD FUNCTIONS ----------------
+
+def _board_or_error(quote_asset, symbols, top_n, rank_by):
+    if rank_by not in RANK_COLUMNS:
+        return None, f"Invalid rank_by (use {', '.join(RANK_COLUMNS)})"
+    return TickerBoard(quote_asset, symbols, top_n, rank_by), None
+
 
 @xlo.func
-async def AllCoinsTickerStream():
+async def AllCoinsTickerStream(
+    quote_asset: str = "",
+    symbols=None,
+    top_n: int = 0,
+    rank_by: str = "QuoteVolume",
+    max_hz: float = DEFAULT_MAX_HZ
+):
     """
     Excel:
     =AllCoinsTickerStream()
+    =AllCoinsTickerStream("USDT")                       USDT pairs only
+    =AllCoinsTickerStream("", A2:A20)                   explicit symbols
+    =AllCoinsTickerStream("USDT", , 25, "PriceChangePercent")   top 25 movers
     """
 
-    state = {}
-    last_snapshot = None
-    reconnect_delay = 5
+    board, error = _board_or_error(quote_asset, symbols, top_n, rank_by)
+    if error:
+        yield error
+        return
 
-    STATUS_ROW_LIVE = ["STREAM_STATUS", "LIVE"] + [""] * (len(HEADER) - 2)
-    STATUS_ROW_DOWN = ["STREAM_STATUS", "DISCONNECTED"] + [""] * (len(HEADER) - 2)
+    stats = metrics.stream(STREAM)
 
-    while True:
-        try:
-            async with websockets.connect(
-                BINANCE_WS,
-                ping_interval=20,
-                ping_timeout=10
-            ) as ws:
+    async for board, status, changed in ticker_board_updates(board, max_hz):
+        if len(board):
+            t0 = time.perf_counter()
+            table = board.table(status)
+            stats.built(time.perf_counter() - t0)
+            yield table
 
-                async for raw in ws:
-                    data = json.loads(raw)
 
-                    for item in data:
-                        d = normalize(item)
-                        state[d["Symbol"]] = d
+@xlo.func
+async def AllCoinsTickerDelta(
+    quote_asset: str = "",
+    symbols=None,
+    top_n: int = 0,
+    rank_by: str = "QuoteVolume",
+    max_hz: float = DEFAULT_MAX_HZ
+):
+    """
+    Companion of AllCoinsTickerStream that emits only the rows changed by
+    the latest frame. Both read the same shared board for a given
+    universe, so column "Row" is the row's position under the header of
+    =AllCoinsTickerStream() with the same arguments; a full refresh is
+    sent when symbols are added.
 
-                    rows = [as_row(state[s]) for s in sorted(state)]
-                    table = [HEADER] + rows + [STATUS_ROW_LIVE]
+    Takes the same universe / ranking arguments.
 
-                    last_snapshot = table
-                    yield table
+    Excel:
+    =AllCoinsTickerDelta()
+    """
 
-        except Exception:
-            # ❌ no Excel error
-            if last_snapshot:
-                fallback = last_snapshot[:-1] + [STATUS_ROW_DOWN]
-                yield fallback
+    board, error = _board_or_error(quote_asset, symbols, top_n, rank_by)
+    if error:
+        yield error
+        return
+
+    stats = metrics.stream(STREAM)
 
-            await asyncio.sleep(reconnect_delay)
+    async for board, status, changed in ticker_board_updates(board, max_hz):
+        if len(board):
+            t0 = time.perf_counter()
+            table = board.delta(changed, status)
+            stats.built(time.perf_counter() - t0)
+            yield table
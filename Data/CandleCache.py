@@ -0,0 +1,248 @@
+import asyncio
+import bisect
+from KlineStream import (
+    fetch_klines,
+    interval_ms,
+    normalize_rest_kline,
+    now_ms,
+    MAX_REST_LIMIT,
+)
+from MarketStore import market, MarketStore
+
+# ============================
+# Settings
+# ============================
+
+# how long lookups wait for siblings before one range request goes out
+COALESCE_DELAY = 0.02
+
+# epoch-aligned Binance intervals (open time is a multiple of the length)
+ALIGNED_UNITS = ("s", "m", "h")
+
+# shortest calendar month, to size range requests for "1M"
+MIN_MONTH_MS = 28 * 24 * 60 * 60 * 1000
+
+
+def aligned_open(start_ms: int, interval: str):
+    """
+    OpenTime of the first candle at/after start_ms, or None when the
+    interval is not epoch aligned (3d, 1w, 1M, ...).
+    """
+    if interval[-1] not in ALIGNED_UNITS and interval != "1d":
+        return None
+    step = interval_ms(interval)
+    return -(-start_ms // step) * step
+
+
+# ============================
+# Persistent Candle Cache
+# ============================
+
+class CandleCache:
+    """
+    Closed candles keyed by (symbol, interval, open time).
+
+    An in-memory dict in front of the local MarketStore, so date lookups
+    and the live streams fill and reuse the same files. Only closed
+    candles are stored, so a stored candle is final and is never
+    fetched again. Open times Binance returned no candle for after they
+    closed (before listing, no trading) are remembered in memory too.
+    """
+
+    def __init__(self, store: MarketStore | None = None):
+        self.store = store or market
+        self._memory = {}
+        self._missing = set()       # (symbol, interval, open_time)
+
+    async def get(self, symbol: str, interval: str, open_time: int):
+        key = (symbol, interval, open_time)
+        d = self._memory.get(key)
+        if d is not None:
+            return d
+
+        row = await self.store.call(self.store.kline, symbol, interval, open_time)
+        if row is None:
+            return None
+
+        d = self._memory[key] = normalize_rest_kline(row)
+        return d
+
+    def missing(self, symbol: str, interval: str, open_time: int) -> bool:
+        return (symbol, interval, open_time) in self._missing
+
+    def put_missing(self, symbol: str, interval: str, open_times):
+        self._missing.update((symbol, interval, t) for t in open_times)
+
+    def put_many(self, symbol: str, interval: str, candles: list):
+        closed = [d for d in candles if d["IsClosed"]]
+        if not closed:
+            return
+
+        for d in closed:
+            self._memory[(symbol, interval, d["OpenTime"])] = d
+
+        self.store.submit(self.store.put_klines, symbol, interval, closed)
+
+
+# ============================
+# Request Coalescer
+# ============================
+
+def span_ranges(open_times: list, step: int):
+    """Greedy (start, end) ranges of sorted OpenTimes, each <= MAX_REST_LIMIT candles"""
+    ranges = []
+    for t in open_times:
+        if ranges and (t - ranges[-1][0]) // step < MAX_REST_LIMIT:
+            ranges[-1] = (ranges[-1][0], t)
+        else:
+            ranges.append((t, t))
+    return ranges
+
+
+class CandleLookup:
+    """
+    Cache-first candle lookup.
+
+    Misses for the same symbol/interval that arrive within COALESCE_DELAY
+    are merged into range requests of up to 1000 candles, sent through
+    the shared RestClient.
+
+    Intervals that are not epoch aligned (3d, 1w, 1M) have no open time
+    to key on before the first request: their lookups are coalesced the
+    same way by [start_ms, end_ms] window, and settled answers (a closed
+    candle, or nothing in a window that has passed) are memoized per
+    window.
+    """
+
+    def __init__(self, cache: CandleCache):
+        self.cache = cache
+        self._pending = {}      # (symbol, interval) -> {open_time: [futures]}
+        self._pending_windows = {}  # (symbol, interval) -> [(start, end, future)]
+        self._windows = {}      # (symbol, interval, start, end) -> candle or None
+
+    async def candle(self, symbol: str, interval: str, start_ms: int, end_ms: int):
+        """First candle with start_ms <= OpenTime <= end_ms, or None"""
+        open_time = aligned_open(start_ms, interval)
+
+        if open_time is None:
+            return await self._window_candle(symbol, interval, start_ms, end_ms)
+
+        if open_time > end_ms:
+            return None
+
+        d = await self.cache.get(symbol, interval, open_time)
+        if d is not None:
+            return d
+        if self.cache.missing(symbol, interval, open_time):
+            return None
+
+        fut = asyncio.get_running_loop().create_future()
+        group = self._pending.get((symbol, interval))
+        if group is None:
+            group = self._pending[(symbol, interval)] = {}
+            asyncio.ensure_future(self._flush(symbol, interval))
+        group.setdefault(open_time, []).append(fut)
+
+        return await fut
+
+    async def _flush(self, symbol: str, interval: str):
+        await asyncio.sleep(COALESCE_DELAY)
+        group = self._pending.pop((symbol, interval))
+        step = interval_ms(interval)
+
+        async def fetch(start, end):
+            return await fetch_klines(
+                symbol, interval,
+                min(MAX_REST_LIMIT, (end - start) // step + 1),
+                start_ms=start, end_ms=end
+            )
+
+        try:
+            pages = await asyncio.gather(*[
+                fetch(start, end)
+                for start, end in span_ranges(sorted(group), step)
+            ])
+        except Exception as e:
+            for futures in group.values():
+                for fut in futures:
+                    if not fut.done():
+                        fut.set_exception(e)
+            return
+
+        found = {}
+        for page in pages:
+            self.cache.put_many(symbol, interval, page)
+            for d in page:
+                found[d["OpenTime"]] = d
+
+        # no candle for a period that is over: there never will be one
+        closed_before = now_ms()
+        self.cache.put_missing(symbol, interval, [
+            t for t in group
+            if t not in found and t + step <= closed_before
+        ])
+
+        for open_time, futures in group.items():
+            for fut in futures:
+                if not fut.done():
+                    fut.set_result(found.get(open_time))
+
+    # ---------- calendar / unaligned intervals ----------
+
+    async def _window_candle(self, symbol: str, interval: str, start_ms: int, end_ms: int):
+        key = (symbol, interval, start_ms, end_ms)
+        if key in self._windows:
+            return self._windows[key]
+
+        fut = asyncio.get_running_loop().create_future()
+        group = self._pending_windows.get((symbol, interval))
+        if group is None:
+            group = self._pending_windows[(symbol, interval)] = []
+            asyncio.ensure_future(self._flush_windows(symbol, interval))
+        group.append((start_ms, end_ms, fut))
+
+        return await fut
+
+    async def _flush_windows(self, symbol: str, interval: str):
+        await asyncio.sleep(COALESCE_DELAY)
+        group = self._pending_windows.pop((symbol, interval))
+        group.sort(key=lambda w: w[0])
+
+        # a span of up to 1000 of the shortest candles fits one request
+        span = MAX_REST_LIMIT * (interval_ms(interval) or MIN_MONTH_MS * int(interval[:-1]))
+        ranges = []
+        for start, end, _ in group:
+            if ranges and max(end, ranges[-1][1]) - ranges[-1][0] < span:
+                ranges[-1] = (ranges[-1][0], max(end, ranges[-1][1]))
+            else:
+                ranges.append((start, end))
+
+        try:
+            pages = await asyncio.gather(*[
+                fetch_klines(symbol, interval, MAX_REST_LIMIT, start_ms=start, end_ms=end)
+                for start, end in ranges
+            ])
+        except Exception as e:
+            for _, _, fut in group:
+                if not fut.done():
+                    fut.set_exception(e)
+            return
+
+        page = sorted(
+            {d["OpenTime"]: d for p in pages for d in p}.values(),
+            key=lambda d: d["OpenTime"]
+        )
+        self.cache.put_many(symbol, interval, page)
+        opens = [d["OpenTime"] for d in page]
+        closed_before = now_ms()
+
+        for start, end, fut in group:
+            i = bisect.bisect_left(opens, start)
+            d = page[i] if i < len(page) and opens[i] <= end else None
+            if (d is not None and d["IsClosed"]) or (d is None and end < closed_before):
+                self._windows[(symbol, interval, start, end)] = d
+            if not fut.done():
+                fut.set_result(d)
+
+
+candles = CandleLookup(CandleCache())
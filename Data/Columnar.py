@@ -0,0 +1,174 @@
+import numpy as np
+from ExcelTime import excel_times
+
+# ============================
+# Columnar Row Buffer
+# ============================
+
+class ColumnBuffer:
+    """
+    Rows of record fields stored as typed NumPy columns.
+
+    spec = ((field, dtype, is_time), ...) in Excel column order; time
+    fields are kept as int64 epoch ms. The columns are the fields of one
+    structured array, preallocated with twice `capacity` rows, and the
+    live rows are [start, end) of it:
+
+    - append() writes one structured row (a single NumPy assignment, not
+      one per column), popleft() moves `start`; neither allocates
+    - when `end` reaches the backing size the live rows are moved to the
+      front in one copy, or the array doubles when more than half full
+    - maxlen caps the row count like deque(maxlen=...)
+
+    Excel cells are a 2-D object array in the same layout, with one
+    spare row on each side of the live rows. Writes only mark their row
+    dirty; cells() converts the dirty rows in one vectorized step per
+    column (times -> Excel serials), so a row is converted once per
+    change, not once per snapshot. table() writes the header and status
+    rows into the spare rows and returns a view: no per-yield copy.
+    """
+
+    def __init__(self, spec, capacity: int = 1024, maxlen: int | None = None):
+        self.fields = tuple(f for f, _, _ in spec)
+        self.dtypes = tuple(np.dtype(t) for _, t, _ in spec)
+        self._row_dtype = np.dtype(list(zip(self.fields, self.dtypes)))
+        self.times = tuple(bool(t) for _, _, t in spec)
+        self.maxlen = maxlen if maxlen is not None and maxlen > 0 else None
+        self._alloc(max(1, self.maxlen or capacity))
+        self.start = 0
+        self.end = 0
+        self._dirty = set()         # backing rows whose cells are out of date
+
+    def _alloc(self, capacity: int):
+        self.capacity = capacity
+        self._rows = np.empty(2 * capacity, dtype=self._row_dtype)
+        self.columns = [self._rows[f] for f in self.fields]   # field views
+        # backing row i is cell row i + 1
+        self._cells = np.empty((2 * capacity + 2, len(self.dtypes)), dtype=object)
+
+    def __len__(self):
+        return self.end - self.start
+
+    def _make_room(self):
+        start, end = self.start, self.end
+        n = end - start
+        old, old_cells = self._rows, self._cells
+        if n > self.capacity:
+            self._alloc(2 * self.capacity)
+        self._rows[:n] = old[start:end]
+        self._cells[1:n + 1] = old_cells[start + 1:end + 1]
+        self._dirty = {i - start for i in self._dirty if start <= i < end}
+        self.start = 0
+        self.end = n
+
+    def _index(self, i: int) -> int:
+        n = self.end - self.start
+        if i < 0:
+            i += n
+        if not 0 <= i < n:
+            raise IndexError("row index out of range")
+        return self.start + i
+
+    # ---------- rows ----------
+
+    def append(self, values):
+        if self.maxlen is not None and self.end - self.start == self.maxlen:
+            self.start += 1
+        if self.end == 2 * self.capacity:
+            self._make_room()
+        i = self.end
+        self._rows[i] = tuple(values)
+        self._dirty.add(i)
+        self.end = i + 1
+
+    def set(self, i: int, values):
+        i = self._index(i)
+        self._rows[i] = tuple(values)
+        self._dirty.add(i)
+
+    def insert(self, i: int, values):
+        """Insert before row i (shifts the rows after it; rare paths only)"""
+        n = self.end - self.start
+        if not 0 <= i <= n:
+            raise IndexError("row index out of range")
+        if self.maxlen is not None and n == self.maxlen:
+            if i == 0:
+                return
+            self.start += 1
+            i -= 1
+        if self.end == 2 * self.capacity:
+            self._make_room()
+        j = self.start + i
+        end = self.end
+        rows = self._rows
+        rows[j + 1:end + 1] = rows[j:end].copy()
+        rows[j] = tuple(values)
+        self._cells[j + 2:end + 2] = self._cells[j + 1:end + 1].copy()
+        self._dirty = {k + 1 if k >= j else k for k in self._dirty}
+        self._dirty.add(j)
+        self.end = end + 1
+
+    def reorder(self, order):
+        """Rearrange the live rows: row k becomes old row order[k]"""
+        self.cells()
+        start, end = self.start, self.end
+        rows = start + np.asarray(order, dtype=np.intp)
+        self._rows[start:end] = self._rows[rows]
+        self._cells[start + 1:end + 1] = self._cells[rows + 1]
+
+    def popleft(self, n: int = 1):
+        self.start = min(self.end, self.start + n)
+        if self.start == self.end:
+            self.clear()
+
+    def clear(self):
+        self.start = self.end = 0
+        self._dirty = set()
+
+    def column(self, field: str) -> np.ndarray:
+        """Live rows of one typed column (a view)"""
+        return self.columns[self.fields.index(field)][self.start:self.end]
+
+    # ---------- Excel ----------
+
+    def cells(self) -> np.ndarray:
+        """Live rows as Excel values, 2-D object array (a view; copy to keep)"""
+        start, end = self.start, self.end
+        if self._dirty:
+            dirty = [i for i in self._dirty if start <= i < end]
+            self._dirty = set()
+            if dirty:
+                rows = np.array(dirty, dtype=np.intp)
+                for j, (col, is_time) in enumerate(zip(self.columns, self.times)):
+                    values = col[rows]
+                    self._cells[rows + 1, j] = excel_times(values) if is_time else values
+        return self._cells[start + 1:end + 1]
+
+    def table(self, header: list, status_row: list) -> np.ndarray:
+        """
+        [header, *rows, status_row] as a 2-D object array.
+
+        A view into the buffer, valid until the next write: yield it to
+        xlOil (converted on publish) or copy() it to keep it.
+        """
+        self.cells()
+        cells = self._cells
+        cells[self.start] = header
+        cells[self.end + 1] = status_row
+        return cells[self.start:self.end + 2]
+
+
+def excel_array(header: list, cells: np.ndarray, status_row: list | None = None) -> np.ndarray:
+    """
+    Header + cells (+ status row) as a new 2-D object array, for tables
+    that are not a ColumnBuffer slice (deltas, extra columns).
+    """
+    n = len(cells)
+    extra = 2 if status_row is not None else 1
+    out = np.empty((n + extra, len(header)), dtype=object)
+    out[0] = header
+    out[1:n + 1] = cells
+    if status_row is not None:
+        out[n + 1] = status_row
+    return out
+
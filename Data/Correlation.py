@@ -0,0 +1,412 @@
+import xloil as xlo
+import asyncio
+import time
+import numpy as np
+from StreamHub import hub
+from Metrics import metrics
+from Throttle import Throttle, DEFAULT_MAX_HZ
+from RestClient import rest, is_permanent, error_text
+from KlineStream import load_klines, interval_ms, now_ms, MAX_REST_LIMIT
+from AllCoinTicker import STREAM, parse_symbols
+from Columnar import excel_array
+from RiskMetrics import PERIODS_PER_YEAR
+
+# ============================
+# Settings
+# ============================
+
+DEFAULT_INTERVAL = "1h"
+DEFAULT_WINDOW = 500            # returns per series
+DEFAULT_TOP_N = 20
+BENCHMARK = "BTCUSDT"
+
+# returns, one REST page of candles per symbol (plus the live candle)
+MAX_WINDOW = MAX_REST_LIMIT - 2
+
+# GET /api/v3/ticker/24hr without a symbol
+TICKER_24HR_WEIGHT = 80
+
+DAY_MS = interval_ms("1d")
+
+
+# ============================
+# Rolling Covariance
+# ============================
+
+class RollingCovariance:
+    """
+    Covariance of the last `window` return vectors (one column per asset).
+
+    Returns sit in a ring buffer; the running sums sum(r) and sum(r r^T)
+    get the new vector added and the oldest subtracted, so a new bar
+    costs O(N^2) whatever the window. The sums are recomputed exactly
+    from the ring once per `window` pushes, so add / subtract rounding
+    cannot build up.
+    """
+
+    def __init__(self, window: int, n: int):
+        self.window = window
+        self.ring = np.zeros((window, n))
+        self.count = 0
+        self.pos = 0                # next slot to write (= oldest when full)
+        self.pushes = 0
+        self.sum1 = np.zeros(n)
+        self.sum2 = np.zeros((n, n))
+
+    def load(self, returns: np.ndarray):
+        """Replace the state with the rows of `returns` (oldest first)"""
+        returns = returns[-self.window:]
+        self.count = len(returns)
+        self.ring[:self.count] = returns
+        self.pos = self.count % self.window
+        self._resync()
+
+    def _resync(self):
+        r = self.ring[:self.count]
+        self.sum1 = r.sum(axis=0)
+        self.sum2 = r.T @ r
+        self.pushes = 0
+
+    def push(self, r: np.ndarray):
+        if self.count == self.window:
+            old = self.ring[self.pos]
+            self.sum1 -= old
+            self.sum2 -= np.outer(old, old)
+        else:
+            self.count += 1
+
+        self.ring[self.pos] = r
+        self.sum1 += r
+        self.sum2 += np.outer(r, r)
+        self.pos = (self.pos + 1) % self.window
+
+        self.pushes += 1
+        if self.pushes >= self.window:
+            self._resync()
+
+    def cov(self, extra: np.ndarray | None = None):
+        """
+        Sample covariance (NxN) and observation count. `extra` is a
+        provisional return vector (the bar still forming): it takes the
+        oldest slot for this call only.
+        """
+        k = self.count
+        s1 = self.sum1
+        s2 = self.sum2
+        if extra is not None:
+            if k == self.window:
+                old = self.ring[self.pos]
+                s1 = s1 - old + extra
+                s2 = s2 - np.outer(old, old) + np.outer(extra, extra)
+            else:
+                s1 = s1 + extra
+                s2 = s2 + np.outer(extra, extra)
+                k += 1
+
+        if k < 2:
+            return None, k
+        mean = s1 / k
+        return (s2 - k * np.outer(mean, mean)) / (k - 1), k
+
+
+# ============================
+# Correlation Board
+# ============================
+
+class CorrelationBoard:
+    """
+    Aligned closes of a symbol list on one bar grid, kept live from
+    !ticker@arr.
+
+    - load(): closes of the last window + 1 closed bars -> log returns
+    - apply(): last prices per symbol; when the ticker event time passes
+      the end of the current bar, its return (last price vs the previous
+      close) is pushed into the rolling covariance
+    - stats(): the window with the still-forming bar standing in for
+      the oldest return, so the matrix moves between closes without
+      touching the committed state
+
+    Column 0 is the benchmark.
+    """
+
+    def __init__(self, symbols: list, interval: str, window: int):
+        self.symbols = symbols
+        self.index = {s: i for i, s in enumerate(symbols)}
+        self.interval = interval
+        self.step = step = interval_ms(interval)
+        self.window = window
+        self.periods_per_year = PERIODS_PER_YEAR * DAY_MS / step
+        self.cov = RollingCovariance(window, len(symbols))
+        self.last_close = None      # close of the last committed bar, per symbol
+        self.price = None           # latest price, per symbol
+        self.bar_open = None        # OpenTime of the bar still forming
+
+    def load(self, grid: np.ndarray, closes: np.ndarray, live: np.ndarray):
+        """grid: OpenTimes of closed bars; closes: len(grid) x N; live: prices now"""
+        self.cov = RollingCovariance(self.window, len(self.symbols))
+        self.cov.load(np.diff(np.log(closes), axis=0))
+        self.last_close = closes[-1].copy()
+        self.price = live.copy()
+        self.bar_open = int(grid[-1]) + self.step
+
+    def apply(self, batch: list):
+        """
+        Apply one !ticker@arr frame.
+        Returns "close" when a bar was committed, "gap" when more than
+        one bar went by (the caller reloads), else None.
+        """
+        index = self.index
+        price = self.price
+        event_time = 0
+
+        for item in batch:
+            # any symbol's event time moves the clock
+            event_time = max(event_time, item["E"])
+            i = index.get(item["s"])
+            if i is None:
+                continue
+            p = float(item["c"])
+            if p > 0:
+                price[i] = p
+
+        if event_time < self.bar_open + self.step:
+            return None
+        if event_time >= self.bar_open + 2 * self.step:
+            return "gap"
+
+        self.cov.push(np.log(price / self.last_close))
+        self.last_close = price.copy()
+        self.bar_open += self.step
+        return "close"
+
+    def stats(self):
+        """(correlation NxN, beta, annualized volatility, observations)"""
+        partial = np.log(self.price / self.last_close)
+        cov, k = self.cov.cov(partial)
+        if cov is None:
+            return None, None, None, k
+
+        var = np.maximum(np.diag(cov), 0.0)
+        sd = np.sqrt(var)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            corr = cov / np.outer(sd, sd)
+            beta = cov[:, 0] / var[0]
+        np.clip(corr, -1.0, 1.0, out=corr)
+        vol = np.sqrt(var * self.periods_per_year)
+        return corr, beta, vol, k
+
+
+# ============================
+# Bulk History
+# ============================
+
+async def top_symbols(quote_asset: str, n: int, exclude: str = "") -> list:
+    """The n `quote_asset` pairs with the highest 24h quote volume"""
+    tickers = await rest.get("/api/v3/ticker/24hr", weight=TICKER_24HR_WEIGHT)
+    quote_asset = quote_asset.upper()
+    pairs = [
+        (float(t["quoteVolume"]), t["symbol"])
+        for t in tickers
+        if t["symbol"].endswith(quote_asset) and t["symbol"] != exclude
+    ]
+    pairs.sort(reverse=True)
+    return [s for _, s in pairs[:n]]
+
+
+def align_closes(grid: np.ndarray, candles: list):
+    """
+    Closes of `candles` on the OpenTime grid. Missing bars repeat the
+    previous close; bars before the first trade (new listings) repeat
+    the first close, i.e. count as zero returns. None without any
+    closed candle on the grid.
+    """
+    closed = {d["OpenTime"]: d["Close"] for d in candles if d["IsClosed"]}
+    col = np.array([closed.get(int(t), np.nan) for t in grid])
+    have = ~np.isnan(col)
+    if not have.any():
+        return None
+
+    filled = np.where(have, np.arange(len(col)), 0)
+    np.maximum.accumulate(filled, out=filled)
+    col = col[filled]
+    first = int(np.argmax(have))
+    col[:first] = col[first]
+    return col
+
+
+async def load_board(symbols: list, interval: str, window: int):
+    """
+    Load window + 1 closed bars of every symbol concurrently (store
+    first, then the shared REST client) and align them on the grid of
+    symbols[0], the benchmark. Returns (board, skipped): symbols that
+    could not be loaded are left out of the board.
+    """
+    bars = window + 2               # + the live candle
+    results = await asyncio.gather(
+        *[load_klines(s, interval, bars) for s in symbols],
+        return_exceptions=True
+    )
+
+    bench = results[0]
+    if isinstance(bench, Exception):
+        raise bench
+    grid = np.array(
+        [d["OpenTime"] for d in bench if d["IsClosed"]][-(window + 1):],
+        dtype=np.int64
+    )
+    if len(grid) < 3:
+        raise ValueError(f"Not enough {interval} history for {symbols[0]}")
+
+    kept, columns, live, skipped = [], [], [], []
+    for symbol, candles in zip(symbols, results):
+        col = None if isinstance(candles, Exception) else align_closes(grid, candles)
+        if col is None:
+            skipped.append(symbol)
+            continue
+        kept.append(symbol)
+        columns.append(col)
+        # the live candle's close is the latest price
+        live.append(candles[-1]["Close"] if not candles[-1]["IsClosed"] else col[-1])
+
+    board = CorrelationBoard(kept, interval, window)
+    board.load(grid, np.column_stack(columns), np.array(live, dtype=float))
+    return board, skipped
+
+
+# ============================
+# Excel Table
+# ============================
+
+def _cells(a: np.ndarray) -> np.ndarray:
+    out = a.astype(object)
+    out[~np.isfinite(a)] = ""
+    return out
+
+
+def correlation_table(board: CorrelationBoard, state: str, skipped: list):
+    symbols = board.symbols
+    header = ["Symbol", "Beta", "AnnualizedVolatility", *symbols]
+    corr, beta, vol, k = board.stats()
+
+    n = len(symbols)
+    if corr is None:
+        cells = np.full((n, len(header)), "", dtype=object)
+        cells[:, 0] = symbols
+    else:
+        cells = np.empty((n, len(header)), dtype=object)
+        cells[:, 0] = symbols
+        cells[:, 1] = _cells(beta)
+        cells[:, 2] = _cells(vol)
+        cells[:, 3:] = _cells(corr)
+
+    status = [
+        "STREAM_STATUS", state,
+        "RETURNS", k,
+        "INTERVAL", board.interval,
+        "SKIPPED", ",".join(skipped),
+    ]
+    status = (status + [""] * len(header))[:len(header)]
+    return excel_array(header, cells, status)
+
+
+# ============================
+# XlOil Streaming Function
+# ============================
+
+@xlo.func
+async def CorrelationMatrix(
+    symbols=None,
+    interval: str = DEFAULT_INTERVAL,
+    window: int = DEFAULT_WINDOW,
+    benchmark: str = BENCHMARK,
+    top_n: int = DEFAULT_TOP_N,
+    quote_asset: str = "USDT",
+    max_hz: float = DEFAULT_MAX_HZ
+):
+    """
+    Live correlation matrix plus beta / volatility against a benchmark.
+
+    Excel:
+    =CorrelationMatrix()                                top 20 USDT pairs vs BTC, 1h bars
+    =CorrelationMatrix(A2:A101, "4h", 250)              explicit symbols
+    =CorrelationMatrix(, "1d", 365, "ETHUSDT", 50)      top 50 vs ETH, daily
+
+    Log returns of the last `window` closed bars, all symbols loaded in
+    one batch through the shared REST client and aligned on the
+    benchmark's bars. Without `symbols` the top_n `quote_asset` pairs by
+    24h quote volume are used. Prices then come from the single
+    !ticker@arr stream: each bar close adds one return to the rolling
+    covariance (O(N^2), no history rescan), and the bar still forming is
+    included provisionally. Rows: symbol, beta, annualized volatility,
+    then its correlation with every symbol (benchmark first).
+    """
+
+    step = interval_ms(str(interval or DEFAULT_INTERVAL))
+    if step is None:
+        yield "Unsupported interval (calendar months have no fixed length)"
+        return
+    interval = str(interval or DEFAULT_INTERVAL)
+    window = max(2, min(int(window or DEFAULT_WINDOW), MAX_WINDOW))
+    benchmark = str(benchmark or BENCHMARK).strip().upper()
+
+    stats = metrics.stream(STREAM)
+    link = hub.link(STREAM)
+    board = None
+    skipped = []
+    last_table = None
+
+    while True:
+        # subscribe first: prices arriving during the REST load queue up
+        throttle = Throttle(max_hz)
+        async with link:
+
+            # ---------- Bulk load (first run / outage longer than a bar) ----------
+            if board is None or now_ms() >= board.bar_open + 2 * step:
+                if last_table is not None:
+                    yield correlation_table(board, "STALE", skipped)
+
+                if board is None:
+                    listed = list(parse_symbols(symbols) or ())
+                    if not listed:
+                        listed = await top_symbols(quote_asset, int(top_n or DEFAULT_TOP_N), benchmark)
+                    listed = [benchmark] + [s for s in listed if s != benchmark]
+                else:
+                    listed = board.symbols + skipped
+
+                board, skipped = await load_board(listed, interval, window)
+                last_table = correlation_table(board, "LIVE", skipped)
+                yield last_table
+
+            async for data in throttle.messages(link):
+                event = None
+                if data is not None:
+                    t0 = stats.apply_start()
+                    event = board.apply(data)
+                    stats.apply_end(t0)
+
+                    if event == "gap":
+                        # the stream skipped a whole bar: reload
+                        yield correlation_table(board, "STALE", skipped)
+                        board, skipped = await load_board(
+                            board.symbols + skipped, interval, window
+                        )
+                        event = "close"
+
+                # bar closes go out right away
+                if not throttle.ready(urgent=event == "close" or data is None):
+                    continue
+
+                t0 = time.perf_counter()
+                last_table = correlation_table(board, "LIVE", skipped)
+                stats.built(time.perf_counter() - t0)
+                yield last_table
+
+        # Excel keeps the last matrix
+        if last_table is not None:
+            yield correlation_table(board, "DISCONNECTED", skipped)
+        else:
+            # nothing loaded yet: show why; a bad benchmark / interval
+            # / symbol list will not get better by retrying
+            yield error_text(link.error)
+            if is_permanent(link.error):
+                return
@@ -1,9 +1,9 @@
 import xloil as xlo
-import aiohttp
+import asyncio
 import datetime as dt
 from dateutil import parser
-
-BINANCE_REST = "https://api.binance.com"
+from CandleCache import candles
+from RestClient import error_text
 
 
 # ============================
@@ -41,6 +41,60 @@ def to_ms(d: dt.datetime) -> int:
     return int(d.astimezone(dt.timezone.utc).timestamp() * 1000)
 
 
+def candle_window(start_ms: int, interval: str) -> int:
+    """End of the lookup window for a candle starting at/after start_ms"""
+    if interval.endswith("m"):
+        return start_ms + int(interval[:-1]) * 60 * 1000
+    elif interval.endswith("h"):
+        return start_ms + int(interval[:-1]) * 60 * 60 * 1000
+    elif interval.endswith("d"):
+        return start_ms + 24 * 60 * 60 * 1000
+    else:
+        return start_ms + 24 * 60 * 60 * 1000
+
+
+def flatten(value) -> list:
+    """Excel scalar / range (array) -> flat list of cell values"""
+    if value is None or isinstance(value, (str, int, float, dt.datetime)):
+        return [value]
+
+    out = []
+    for x in getattr(value, "flat", value):
+        if isinstance(x, (list, tuple)):
+            out.extend(x)
+        else:
+            out.append(x)
+    return out
+
+
+def parse_dates(values: list) -> list:
+    """Bulk version of excel_date_to_datetime + to_ms; each distinct value is parsed once"""
+    parsed = {}
+    out = []
+    for v in values:
+        if v is None or v == "":
+            out.append(None)
+            continue
+
+        key = (type(v), v)
+        if key not in parsed:
+            try:
+                parsed[key] = to_ms(excel_date_to_datetime(v))
+            except (ValueError, OverflowError):
+                parsed[key] = None
+        out.append(parsed[key])
+    return out
+
+
+PRICE_FIELDS = {
+    "open": "Open",
+    "high": "High",
+    "low": "Low",
+    "close": "Close",
+    "volume": "Volume"
+}
+
+
 # ============================
 # xlOil Function
 # ============================
@@ -67,44 +121,67 @@ async def CryptoPriceOnDate(
     start_ms = to_ms(dt_obj)
 
     # Candle duration logic
-    if interval.endswith("m"):
-        end_ms = start_ms + int(interval[:-1]) * 60 * 1000
-    elif interval.endswith("h"):
-        end_ms = start_ms + int(interval[:-1]) * 60 * 60 * 1000
-    elif interval.endswith("d"):
-        end_ms = start_ms + 24 * 60 * 60 * 1000
-    else:
-        end_ms = start_ms + 24 * 60 * 60 * 1000
+    end_ms = candle_window(start_ms, interval)
+
+    # cached / coalesced with every other lookup of this symbol
+    k = await candles.candle(symbol, interval, start_ms, end_ms)
 
-    url = f"{BINANCE_REST}/api/v3/klines"
+    if k is None:
+        return "No data"
 
-    params = {
-        "symbol": symbol,
-        "interval": interval,
-        "startTime": start_ms,
-        "endTime": end_ms,
-        "limit": 1
-    }
+    if price_type not in PRICE_FIELDS:
+        return "Invalid price_type"
 
-    async with aiohttp.ClientSession() as session:
-        async with session.get(url, params=params) as r:
-            r.raise_for_status()
-            data = await r.json()
+    return k[PRICE_FIELDS[price_type]]
 
-    if not data:
-        return "No data"
 
-    k = data[0]
+@xlo.func
+async def CryptoPricesOnDates(
+    symbols,
+    dates,
+    interval: str = "1d",
+    price_type: str = "close"
+):
+    """
+    Price matrix for many dates (rows) x many symbols (columns) in one call.
+
+    Excel:
+    =CryptoPricesOnDates("BTCUSDT", A2:A500)
+    =CryptoPricesOnDates(B1:F1, A2:A500, "1d", "open")
 
-    price_map = {
-        "open":   float(k[1]),
-        "high":   float(k[2]),
-        "low":    float(k[3]),
-        "close":  float(k[4]),
-        "volume": float(k[5])
-    }
+    Every lookup goes through the shared candle cache, so the whole
+    matrix costs at most one range request per ~1000 candles per symbol.
+    """
 
-    if price_type not in price_map:
+    price_type = price_type.lower()
+    if price_type not in PRICE_FIELDS:
         return "Invalid price_type"
-
-    return price_map[price_type]
+    field = PRICE_FIELDS[price_type]
+
+    symbol_list = [
+        str(s).strip().upper() if s is not None and str(s).strip() else None
+        for s in flatten(symbols)
+    ]
+    raw_dates = flatten(dates)
+    starts = parse_dates(raw_dates)
+
+    async def cell(symbol, raw, start_ms):
+        if symbol is None or raw is None or raw == "":
+            return ""
+        if start_ms is None:
+            return "Invalid date"
+        k = await candles.candle(
+            symbol, interval, start_ms, candle_window(start_ms, interval)
+        )
+        return "No data" if k is None else k[field]
+
+    # a bad symbol / date fails its own cells, not the whole matrix
+    values = await asyncio.gather(*[
+        cell(symbol, raw, start_ms)
+        for raw, start_ms in zip(raw_dates, starts)
+        for symbol in symbol_list
+    ], return_exceptions=True)
+    values = [error_text(v) if isinstance(v, Exception) else v for v in values]
+
+    width = len(symbol_list)
+    return [values[i:i + width] for i in range(0, len(values), width)]
@@ -0,0 +1,107 @@
+# ============================
+# Fast JSON Backend
+# ============================
+#
+# orjson -> msgspec -> stdlib json, whichever is installed.
+
+try:
+    import orjson
+
+    loads = orjson.loads
+    JSON_BACKEND = "orjson"
+
+except ImportError:
+    try:
+        import msgspec
+
+        loads = msgspec.json.Decoder().decode
+        JSON_BACKEND = "msgspec"
+
+    except ImportError:
+        import json
+
+        loads = json.loads
+        JSON_BACKEND = "json"
+
+
+# ============================
+# Lazy Records
+# ============================
+
+class LazyRecord:
+    """
+    Read-only, dict-like view over a raw Binance payload.
+
+    Subclasses declare FIELDS = {column: (raw_key, converter)} and
+    ROW_COLUMNS (the Excel column order). A column is converted on first
+    access and cached, so columns the sheet never reads are never
+    converted; row() converts the whole Excel row in one pass.
+    """
+
+    __slots__ = ("raw", "_cache")
+
+    FIELDS = {}
+    ROW_COLUMNS = ()
+
+    def __init_subclass__(cls, **kw):
+        super().__init_subclass__(**kw)
+        cls._row_spec = tuple(
+            (name, *cls.FIELDS[name]) for name in cls.ROW_COLUMNS
+        )
+        cls._pick_specs = {}    # names -> ((name, raw_key, converter), ...)
+
+    def __init__(self, raw, **known):
+        self.raw = raw
+        self._cache = known
+
+    def __getitem__(self, name):
+        try:
+            return self._cache[name]
+        except KeyError:
+            key, convert = self.FIELDS[name]
+            value = self._cache[name] = convert(self.raw[key])
+            return value
+
+    def get(self, name, default=None):
+        try:
+            return self[name]
+        except KeyError:
+            return default
+
+    def __contains__(self, name):
+        return name in self.FIELDS or name in self._cache
+
+    def keys(self):
+        return self.FIELDS.keys()
+
+    def row(self) -> list:
+        raw = self.raw
+        cache = self._cache
+        if not cache:
+            return [convert(raw[key]) for _, key, convert in self._row_spec]
+        return [
+            cache[name] if name in cache else convert(raw[key])
+            for name, key, convert in self._row_spec
+        ]
+
+    def pick(self, names: tuple) -> tuple:
+        """Converted values of `names`, in that order (no caching)"""
+        spec = self._pick_specs.get(names)
+        if spec is None:
+            spec = self._pick_specs[names] = tuple(
+                (name, *self.FIELDS[name]) for name in names
+            )
+        raw = self.raw
+        cache = self._cache
+        if not cache:
+            return tuple([convert(raw[key]) for _, key, convert in spec])
+        return tuple([
+            cache[name] if name in cache else convert(raw[key])
+            for name, key, convert in spec
+        ])
+
+    def to_dict(self) -> dict:
+        return {name: self[name] for name in self.FIELDS}
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.raw!r})"
@@ -0,0 +1,113 @@
+import datetime as dt
+import os
+import re
+from functools import lru_cache
+import numpy as np
+
+# ============================
+# Display Timezone
+# ============================
+
+# every timestamp cell (the ...IST columns, TickerStream times,
+# StreamStats) is shown in this zone:
+#   "IST" (default), "UTC", a fixed offset such as "+05:30" / "-04:00",
+#   or an IANA name such as "Europe/London" (DST aware; Windows needs
+#   `pip install tzdata` for IANA names)
+DISPLAY_TZ = os.environ.get("BITWISE_DISPLAY_TZ", "IST")
+
+TZ_ALIASES = {
+    "IST": "+05:30",
+    "UTC": "+00:00",
+    "GMT": "+00:00",
+}
+
+EXCEL_EPOCH_DAYS = 25569            # 1970-01-01 as an Excel serial date
+DAY_MS = 24 * 60 * 60 * 1000
+
+# zones with DST: offsets are looked up once per quarter hour of UTC time
+# (every zone changes offset on a quarter hour)
+OFFSET_BUCKET_MS = 15 * 60 * 1000
+
+# years a zone must have kept one offset to be treated as fixed
+FIXED_SINCE_YEAR = 2017
+
+
+def parse_timezone(name: str) -> dt.tzinfo:
+    name = name.strip()
+    name = TZ_ALIASES.get(name.upper(), name)
+    m = re.fullmatch(r"([+-])(\d{1,2}):?(\d{2})", name)
+    if m:
+        offset = dt.timedelta(hours=int(m.group(2)), minutes=int(m.group(3)))
+        return dt.timezone(-offset if m.group(1) == "-" else offset)
+
+    from zoneinfo import ZoneInfo
+    return ZoneInfo(name)
+
+
+def _resolve(name: str) -> dt.tzinfo:
+    try:
+        return parse_timezone(name)
+    except Exception as e:
+        # a typo must not break every stream; fall back to the old default
+        print(f"[ExcelTime] unknown display timezone {name!r} ({e}); using IST")
+        return parse_timezone("IST")
+
+
+def _fixed_offset_ms(tz: dt.tzinfo):
+    """The zone's offset in ms if it has not changed since FIXED_SINCE_YEAR, else None"""
+    if isinstance(tz, dt.timezone):
+        return int(tz.utcoffset(None).total_seconds() * 1000)
+
+    year = dt.datetime.now(dt.timezone.utc).year
+    offsets = {
+        tz.utcoffset(dt.datetime(y, month, 1))
+        for y in range(FIXED_SINCE_YEAR, year + 2)
+        for month in (1, 4, 7, 10)
+    }
+    if len(offsets) != 1:
+        return None
+    return int(offsets.pop().total_seconds() * 1000)
+
+
+TZ = _resolve(DISPLAY_TZ)
+FIXED_OFFSET_MS = _fixed_offset_ms(TZ)
+
+
+# ============================
+# Conversion
+# ============================
+
+@lru_cache(maxsize=65536)
+def _bucket_offset_ms(bucket: int) -> int:
+    t = dt.datetime.fromtimestamp(bucket * OFFSET_BUCKET_MS / 1000, TZ)
+    return int(t.utcoffset().total_seconds() * 1000)
+
+
+def offset_ms(ms: int) -> int:
+    """Display zone offset from UTC at epoch ms `ms`"""
+    if FIXED_OFFSET_MS is not None:
+        return FIXED_OFFSET_MS
+    return _bucket_offset_ms(ms // OFFSET_BUCKET_MS)
+
+
+def excel_time(ms: int) -> float:
+    """Epoch ms (UTC) -> Excel serial date/time in the display zone"""
+    return (ms + offset_ms(ms)) / DAY_MS + EXCEL_EPOCH_DAYS
+
+
+def excel_times(ms: np.ndarray) -> np.ndarray:
+    """
+    excel_time over an int64 ms array. Fixed-offset zones are one
+    arithmetic step; DST zones look up one (cached) offset per distinct
+    quarter hour in the array.
+    """
+    ms = np.asarray(ms, dtype=np.int64)
+    if FIXED_OFFSET_MS is not None:
+        return (ms + FIXED_OFFSET_MS) / DAY_MS + EXCEL_EPOCH_DAYS
+
+    buckets, inverse = np.unique(ms // OFFSET_BUCKET_MS, return_inverse=True)
+    offsets = np.fromiter(
+        (_bucket_offset_ms(int(b)) for b in buckets),
+        dtype=np.int64, count=len(buckets)
+    )
+    return (ms + offsets[inverse]) / DAY_MS + EXCEL_EPOCH_DAYS
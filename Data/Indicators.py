@@ -0,0 +1,422 @@
+import xloil as xlo
+import re
+import time
+from collections import deque
+from KlineStream import (
+    kline_updates,
+    DEFAULT_LIMIT,
+    MAX_REST_LIMIT,
+)
+from Throttle import DEFAULT_MAX_HZ
+from Metrics import metrics
+
+# ============================
+# Incremental Indicators
+# ============================
+#
+# Every indicator keeps only COMMITTED state (closed candles).
+#   value(bar)  -> outputs as if `bar` were the next candle, no mutation
+#   commit(bar) -> fold a closed candle into the state
+# The live candle is revised by calling value() again on the same
+# committed state, so a revision never needs an explicit rollback.
+# Both calls are O(1). Outputs are None during warm-up.
+
+
+class EMA:
+    """EMA seeded with the SMA of the first n values"""
+
+    def __init__(self, n: int):
+        self.n = n
+        self.alpha = 2.0 / (n + 1)
+        self.ema = None
+        self.count = 0
+        self.seed_sum = 0.0
+        self.columns = [f"EMA({n})"]
+        self.warmup = 3 * n
+
+    def next_value(self, x: float):
+        if self.ema is not None:
+            return self.ema + self.alpha * (x - self.ema)
+        if self.count + 1 == self.n:
+            return (self.seed_sum + x) / self.n
+        return None
+
+    def commit_value(self, x: float):
+        value = self.next_value(x)
+        self.count += 1
+        if value is None:
+            self.seed_sum += x
+        else:
+            self.ema = value
+
+    def value(self, bar):
+        return [self.next_value(bar["Close"])]
+
+    def commit(self, bar):
+        self.commit_value(bar["Close"])
+
+
+class RSI:
+    """Wilder RSI: simple average of the first n changes, then Wilder smoothing"""
+
+    def __init__(self, n: int = 14):
+        self.n = n
+        self.prev_close = None
+        self.count = 0              # number of price changes seen
+        self.avg_gain = 0.0
+        self.avg_loss = 0.0
+        self.columns = [f"RSI({n})"]
+        self.warmup = 3 * n
+
+    def _next(self, close: float):
+        if self.prev_close is None:
+            return None, None, None
+
+        change = close - self.prev_close
+        gain = change if change > 0 else 0.0
+        loss = -change if change < 0 else 0.0
+        n = self.n
+
+        if self.count + 1 < n:
+            # still collecting: keep running sums
+            return self.avg_gain + gain, self.avg_loss + loss, None
+        if self.count + 1 == n:
+            ag = (self.avg_gain + gain) / n
+            al = (self.avg_loss + loss) / n
+        else:
+            ag = (self.avg_gain * (n - 1) + gain) / n
+            al = (self.avg_loss * (n - 1) + loss) / n
+
+        if al == 0:
+            rsi = 100.0 if ag > 0 else 50.0
+        else:
+            rsi = 100.0 - 100.0 / (1.0 + ag / al)
+        return ag, al, rsi
+
+    def value(self, bar):
+        return [self._next(bar["Close"])[2]]
+
+    def commit(self, bar):
+        close = bar["Close"]
+        ag, al, _ = self._next(close)
+        if self.prev_close is not None:
+            self.avg_gain, self.avg_loss = ag, al
+            self.count += 1
+        self.prev_close = close
+
+
+class MACD:
+    """MACD line = EMA(fast) - EMA(slow), signal = EMA(signal) of the line"""
+
+    def __init__(self, fast: int = 12, slow: int = 26, signal: int = 9):
+        self.fast = EMA(fast)
+        self.slow = EMA(slow)
+        self.signal = EMA(signal)
+        self.columns = [
+            f"MACD({fast},{slow},{signal})",
+            "MACDSignal",
+            "MACDHist",
+        ]
+        self.warmup = 3 * slow + signal
+
+    def _line(self, close: float):
+        f = self.fast.next_value(close)
+        s = self.slow.next_value(close)
+        return None if f is None or s is None else f - s
+
+    def value(self, bar):
+        line = self._line(bar["Close"])
+        if line is None:
+            return [None, None, None]
+        sig = self.signal.next_value(line)
+        return [line, sig, None if sig is None else line - sig]
+
+    def commit(self, bar):
+        close = bar["Close"]
+        line = self._line(close)
+        self.fast.commit_value(close)
+        self.slow.commit_value(close)
+        if line is not None:
+            self.signal.commit_value(line)
+
+
+class BollingerBands:
+    """SMA(n) +/- k * population std of the last n closes"""
+
+    def __init__(self, n: int = 20, k: float = 2.0):
+        self.n = n
+        self.k = k
+        self.window = deque()
+        # sums of (close - shift): deviations are small, so
+        # E[d^2] - E[d]^2 loses far fewer digits than on raw prices
+        self.shift = None
+        self.total = 0.0
+        self.total_sq = 0.0
+        self._since_resum = 0
+        self.columns = [f"BBMid({n})", "BBUpper", "BBLower"]
+        self.warmup = n
+
+    def _sums(self, close: float):
+        d = close - (close if self.shift is None else self.shift)
+        total = self.total + d
+        total_sq = self.total_sq + d * d
+        if len(self.window) == self.n:
+            old = self.window[0] - self.shift
+            total -= old
+            total_sq -= old * old
+        return total, total_sq
+
+    def value(self, bar):
+        if len(self.window) + 1 < self.n:
+            return [None, None, None]
+
+        total, total_sq = self._sums(bar["Close"])
+        mean = total / self.n
+        mid = (bar["Close"] if self.shift is None else self.shift) + mean
+        std = max(total_sq / self.n - mean * mean, 0.0) ** 0.5
+        return [mid, mid + self.k * std, mid - self.k * std]
+
+    def commit(self, bar):
+        close = bar["Close"]
+        if self.shift is None:
+            self.shift = close
+        self.total, self.total_sq = self._sums(close)
+        if len(self.window) == self.n:
+            self.window.popleft()
+        self.window.append(close)
+
+        # re-sum once per window to stop floating-point drift; the shift
+        # follows the price
+        self._since_resum += 1
+        if self._since_resum >= self.n:
+            self._since_resum = 0
+            self.shift = close
+            self.total = sum(c - close for c in self.window)
+            self.total_sq = sum((c - close) ** 2 for c in self.window)
+
+
+class ATR:
+    """Wilder ATR: mean of the first n true ranges, then Wilder smoothing"""
+
+    def __init__(self, n: int = 14):
+        self.n = n
+        self.prev_close = None
+        self.count = 0
+        self.atr = 0.0              # running TR sum during warm-up
+        self.columns = [f"ATR({n})"]
+        self.warmup = 3 * n
+
+    def _true_range(self, bar):
+        high, low = bar["High"], bar["Low"]
+        if self.prev_close is None:
+            return high - low
+        pc = self.prev_close
+        return max(high - low, abs(high - pc), abs(low - pc))
+
+    def _next(self, bar):
+        tr = self._true_range(bar)
+        n = self.n
+        if self.count + 1 < n:
+            return self.atr + tr, None
+        if self.count + 1 == n:
+            atr = (self.atr + tr) / n
+        else:
+            atr = (self.atr * (n - 1) + tr) / n
+        return atr, atr
+
+    def value(self, bar):
+        return [self._next(bar)[1]]
+
+    def commit(self, bar):
+        self.atr, _ = self._next(bar)
+        self.count += 1
+        self.prev_close = bar["Close"]
+
+
+INDICATORS = {
+    "EMA": EMA,
+    "RSI": RSI,
+    "MACD": MACD,
+    "BB": BollingerBands,
+    "ATR": ATR,
+}
+
+# leading arguments that are periods (whole numbers of candles)
+PERIOD_ARGS = {
+    "EMA": 1,
+    "RSI": 1,
+    "MACD": 3,
+    "BB": 1,
+    "ATR": 1,
+}
+
+_SPEC_ITEM = re.compile(r"\s*([A-Za-z]+)\s*(?:\(([^)]*)\))?\s*(?:,|$)")
+
+
+def parse_spec(spec: str) -> list:
+    """
+    "EMA(20),RSI(14),MACD(12,26,9),BB(20,2),ATR(14)" -> indicator objects.
+    Arguments are optional: "RSI,BB" uses the defaults. Periods must be
+    positive integers; other arguments (the BB width) may be decimals.
+    """
+    out = []
+    pos = 0
+    spec = spec.strip()
+    while pos < len(spec):
+        m = _SPEC_ITEM.match(spec, pos)
+        if not m or m.end() == pos:
+            raise ValueError(f"Invalid indicator spec near: {spec[pos:]!r}")
+        pos = m.end()
+
+        name = m.group(1).upper()
+        if name not in INDICATORS:
+            raise ValueError(f"Unknown indicator: {name}")
+
+        args = [a.strip() for a in (m.group(2) or "").split(",") if a.strip()]
+        args = [
+            _period(name, a) if i < PERIOD_ARGS[name] else _number(name, a)
+            for i, a in enumerate(args)
+        ]
+        out.append(INDICATORS[name](*args))
+    return out
+
+
+def _period(name: str, text: str) -> int:
+    try:
+        n = int(text)
+    except ValueError:
+        n = 0
+    if n < 1:
+        raise ValueError(f"{name}: period must be a positive integer, got {text!r}")
+    return n
+
+
+def _number(name: str, text: str) -> float:
+    try:
+        return float(text)
+    except ValueError:
+        raise ValueError(f"{name}: invalid argument {text!r}") from None
+
+
+# ============================
+# Engine
+# ============================
+
+class IndicatorEngine:
+    """
+    Indicator rows kept in step with a KlineBuffer.
+
+    sync() only looks at candles newer than the last committed one, so a
+    live tick costs O(1) per indicator. Closed candles are committed; the
+    live candle is (re)valued against the committed state.
+    """
+
+    def __init__(self, spec: str, limit: int):
+        self.spec = spec
+        self.limit = limit
+        self.reset()
+
+    def reset(self):
+        self.indicators = parse_spec(self.spec)
+        self.header = ["OpenDateTimeIST"] + [
+            c for ind in self.indicators for c in ind.columns
+        ]
+        self.rows = deque(maxlen=self.limit)
+        self.committed_open = None      # OpenTime of the last committed candle
+        self.live_open = None           # OpenTime of the row at rows[-1] if uncommitted
+
+    @property
+    def warmup(self) -> int:
+        return max((ind.warmup for ind in self.indicators), default=0)
+
+    def _row(self, bar) -> list:
+        values = [v for ind in self.indicators for v in ind.value(bar)]
+        return [bar["OpenDateTimeIST"], *["" if v is None else v for v in values]]
+
+    def _apply(self, bar, is_last: bool):
+        t = bar["OpenTime"]
+        row = self._row(bar)
+
+        if self.live_open == t:
+            self.rows[-1] = row
+        else:
+            self.rows.append(row)
+
+        # the newest unclosed candle stays live; anything older is final
+        if bar["IsClosed"] or not is_last:
+            for ind in self.indicators:
+                ind.commit(bar)
+            self.committed_open = t
+            self.live_open = None
+        else:
+            self.live_open = t
+
+    def sync(self, candles):
+        newer = []
+        for bar in reversed(candles):
+            if self.committed_open is not None and bar["OpenTime"] <= self.committed_open:
+                break
+            newer.append(bar)
+
+        for i, bar in enumerate(reversed(newer)):
+            self._apply(bar, is_last=(i == len(newer) - 1))
+
+    def rebuild(self, candles):
+        self.reset()
+        self.sync(candles)
+
+    def table(self, status_row: list) -> list:
+        return [self.header, *self.rows, status_row]
+
+    def status_row(self, state: str) -> list:
+        return ["STREAM_STATUS", state] + [""] * (len(self.header) - 2)
+
+
+# ============================
+# xlOil Function
+# ============================
+
+@xlo.func
+async def KlineIndicators(
+    symbol: str,
+    interval: str,
+    spec: str = "EMA(20),RSI(14),MACD(12,26,9),BB(20,2),ATR(14)",
+    limit: int = DEFAULT_LIMIT,
+    max_hz: float = DEFAULT_MAX_HZ
+):
+    """
+    Live indicator columns on top of the kline stream.
+
+    Excel:
+    =KlineIndicators("BTCUSDT", "1h", "EMA(50),RSI(14),BB(20,2)", 500)
+    """
+
+    try:
+        engine = IndicatorEngine(spec, limit)
+    except (ValueError, TypeError) as e:
+        yield str(e)
+        return
+
+    # extra history so the first visible rows are already warmed up
+    history = min(MAX_REST_LIMIT, limit + engine.warmup)
+    last_snapshot = None
+    stats = metrics.stream(f"{symbol.lower()}@kline_{interval}")
+
+    async for event, klines in kline_updates(symbol, interval, history, max_hz):
+
+        if event in ("down", "stale"):
+            if last_snapshot:
+                state = "DISCONNECTED" if event == "down" else "STALE"
+                yield last_snapshot[:-1] + [engine.status_row(state)]
+            continue
+
+        t0 = time.perf_counter()
+        if event in ("load", "repair", "resume"):
+            engine.rebuild(klines.candles)
+        else:
+            engine.sync(klines.candles)
+
+        table = engine.table(engine.status_row("LIVE"))
+        stats.built(time.perf_counter() - t0)
+        last_snapshot = table
+        yield table
@@ -1,74 +1,44 @@
 import xloil as xlo
 import asyncio
-import aiohttp
-import websockets
-import datetime as dt
-import json
+import time
+import numpy as np
+from collections import deque
+from StreamHub import hub
+from Metrics import metrics
+from Decoding import LazyRecord
+from Throttle import Throttle, DEFAULT_MAX_HZ
+from MarketStore import market
+from RestClient import rest, PRIORITY_LIVE, PRIORITY_NORMAL
+from Columnar import ColumnBuffer
+from ExcelTime import excel_time
 
-BINANCE_REST = "https://api.binance.com"
-BINANCE_WS   = "wss://stream.binance.com:9443/ws"
 DEFAULT_LIMIT = 200
+MAX_REST_LIMIT = 1000
 
-
-# ------------------- Time Helpers -------------------
-
-def to_ist(ms: int) -> dt.datetime:
-    return dt.datetime.utcfromtimestamp(ms / 1000) + dt.timedelta(hours=5, minutes=30)
+INTERVAL_UNIT_MS = {
+    "s": 1000,
+    "m": 60 * 1000,
+    "h": 60 * 60 * 1000,
+    "d": 24 * 60 * 60 * 1000,
+    "w": 7 * 24 * 60 * 60 * 1000,
+}
 
 
-# ------------------- Normalizers -------------------
+# ------------------- Time Helpers -------------------
 
-def normalize_rest_kline(k):
-    return {
-        "OpenTime": int(k[0]),
-        "OpenDateTimeIST": to_ist(int(k[0])),
-        "Open": float(k[1]),
-        "High": float(k[2]),
-        "Low": float(k[3]),
-        "Close": float(k[4]),
-        "Volume": float(k[5]),
-        "CloseTime": int(k[6]),
-        "CloseDateTimeIST": to_ist(int(k[6])),
-        "QuoteAssetVolume": float(k[7]),
-        "NumberOfTrades": int(k[8]),
-        "TakerBuyBaseVol": float(k[9]),
-        "TakerBuyQuoteVol": float(k[10]),
-    }
+def now_ms() -> int:
+    return int(time.time() * 1000)
 
 
-def normalize_ws_kline(k):
-    return {
-        "OpenTime": int(k["t"]),
-        "OpenDateTimeIST": to_ist(int(k["t"])),
-        "Open": float(k["o"]),
-        "High": float(k["h"]),
-        "Low": float(k["l"]),
-        "Close": float(k["c"]),
-        "Volume": float(k["v"]),
-        "CloseTime": int(k["T"]),
-        "CloseDateTimeIST": to_ist(int(k["T"])),
-        "QuoteAssetVolume": float(k["q"]),
-        "NumberOfTrades": int(k["n"]),
-        "TakerBuyBaseVol": float(k["V"]),
-        "TakerBuyQuoteVol": float(k["Q"]),
-    }
+def interval_ms(interval: str):
+    """Candle length in ms, None for calendar intervals (1M)"""
+    unit = INTERVAL_UNIT_MS.get(interval[-1])
+    if unit is None:
+        return None
+    return int(interval[:-1]) * unit
 
 
-def as_row(d):
-    return [
-        d["OpenDateTimeIST"],
-        d["Open"],
-        d["High"],
-        d["Low"],
-        d["Close"],
-        d["Volume"],
-        d["CloseDateTimeIST"],
-        d["QuoteAssetVolume"],
-        d["NumberOfTrades"],
-        d["TakerBuyBaseVol"],
-        d["TakerBuyQuoteVol"],
-    ]
-
+# ------------------- Normalizers -------------------
 
 HEADER = [
     "OpenDateTimeIST",
@@ -85,110 +55,452 @@ HEADER = [
 ]
 
 
+def _excel_time(v):
+    return excel_time(int(v))
+
+
+class RestKlineRecord(LazyRecord):
+    """/api/v3/klines array row"""
+    __slots__ = ()
+
+    FIELDS = {
+        "OpenTime": (0, int),
+        "OpenDateTimeIST": (0, _excel_time),
+        "Open": (1, float),
+        "High": (2, float),
+        "Low": (3, float),
+        "Close": (4, float),
+        "Volume": (5, float),
+        "CloseTime": (6, int),
+        "CloseDateTimeIST": (6, _excel_time),
+        "QuoteAssetVolume": (7, float),
+        "NumberOfTrades": (8, int),
+        "TakerBuyBaseVol": (9, float),
+        "TakerBuyQuoteVol": (10, float),
+    }
+    ROW_COLUMNS = HEADER
+
+
+class WsKlineRecord(LazyRecord):
+    """@kline payload `k`"""
+    __slots__ = ()
+
+    FIELDS = {
+        "OpenTime": ("t", int),
+        "OpenDateTimeIST": ("t", _excel_time),
+        "Open": ("o", float),
+        "High": ("h", float),
+        "Low": ("l", float),
+        "Close": ("c", float),
+        "Volume": ("v", float),
+        "CloseTime": ("T", int),
+        "CloseDateTimeIST": ("T", _excel_time),
+        "QuoteAssetVolume": ("q", float),
+        "NumberOfTrades": ("n", int),
+        "TakerBuyBaseVol": ("V", float),
+        "TakerBuyQuoteVol": ("Q", float),
+        "IsClosed": ("x", bool),
+    }
+    ROW_COLUMNS = HEADER
+
+
+# Excel columns as record fields; times stay int64 ms until table()
+COLUMNS = (
+    ("OpenTime", np.int64, True),
+    ("Open", np.float64, False),
+    ("High", np.float64, False),
+    ("Low", np.float64, False),
+    ("Close", np.float64, False),
+    ("Volume", np.float64, False),
+    ("CloseTime", np.int64, True),
+    ("QuoteAssetVolume", np.float64, False),
+    ("NumberOfTrades", np.int64, False),
+    ("TakerBuyBaseVol", np.float64, False),
+    ("TakerBuyQuoteVol", np.float64, False),
+)
+
+
+def normalize_rest_kline(k, closed_before=None):
+    if closed_before is None:
+        closed_before = now_ms()
+    return RestKlineRecord(k, IsClosed=int(k[6]) < closed_before)
+
+
+def normalize_ws_kline(k):
+    return WsKlineRecord(k)
+
+
+def as_row(d):
+    return d.row()
+
+
+# ------------------- Candle Buffer -------------------
+
+class KlineBuffer:
+    """
+    Fixed-capacity, OpenTime-ordered candle buffer.
+
+    - a new candle is appended on the right, the oldest falls off the left (O(1))
+    - a tick on the live candle replaces the last slot in place
+    - the Excel columns live in a preallocated ColumnBuffer, only the
+      touched row is written; table() is one bulk copy per column
+    """
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.candles = deque(maxlen=limit)
+        self.columns = ColumnBuffer(COLUMNS, maxlen=limit)
+        self.repaired = 0
+        # OpenTimes REST had nothing for (maintenance gaps, halted symbols)
+        self.unfillable = set()
+
+    def __len__(self):
+        return len(self.candles)
+
+    @property
+    def last_open_time(self):
+        return self.candles[-1]["OpenTime"] if self.candles else None
+
+    def upsert(self, d):
+        t = d["OpenTime"]
+        last = self.last_open_time
+
+        if last is None or t > last:
+            self.candles.append(d)
+            self.columns.append(d.pick(self.columns.fields))
+        elif t == last:
+            self.candles[-1] = d
+            self.columns.set(-1, d.pick(self.columns.fields))
+        else:
+            self._upsert_past(d)
+
+    def _upsert_past(self, d):
+        # rare: REST data for an older candle, scan back from the end
+        t = d["OpenTime"]
+        i = len(self.candles) - 1
+        while i >= 0 and self.candles[i]["OpenTime"] > t:
+            i -= 1
+
+        values = d.pick(self.columns.fields)
+        if i >= 0 and self.candles[i]["OpenTime"] == t:
+            self.candles[i] = d
+            self.columns.set(i, values)
+            return
+
+        if len(self.candles) == self.limit:
+            # older than everything we keep -> drop it
+            if i < 0:
+                return
+            self.candles.popleft()
+            self.columns.popleft()
+            i -= 1
+
+        self.candles.insert(i + 1, d)
+        self.columns.insert(i + 1, values)
+
+    def extend(self, candles):
+        for d in candles:
+            self.upsert(d)
+
+    def missing_open_times(self, step, now: int) -> list:
+        """
+        OpenTimes that need a REST repair:
+          - holes in the OpenTime sequence (step = candle length in ms)
+          - candles whose close time passed but never got a closed frame
+        OpenTimes in `unfillable` are skipped.
+        """
+        out = []
+        prev = None
+        for d in self.candles:
+            t = d["OpenTime"]
+            if step and prev is not None and t - prev > step:
+                out.extend(range(prev + step, t, step))
+            if not d["IsClosed"] and d["CloseTime"] < now:
+                out.append(t)
+            prev = t
+
+        unfillable = self.unfillable
+        if unfillable:
+            # forget the ones that fell off the left edge
+            if self.candles and min(unfillable) < self.candles[0]["OpenTime"]:
+                first = self.candles[0]["OpenTime"]
+                unfillable.difference_update([t for t in unfillable if t < first])
+            out = [t for t in out if t not in unfillable]
+        return sorted(out)
+
+    def table(self, status_row):
+        return self.columns.table(HEADER, status_row)
+
+
 # ------------------- REST Fetch -------------------
 
-async def fetch_klines(session, symbol, interval, limit):
-    url = f"{BINANCE_REST}/api/v3/klines"
+async def fetch_klines(symbol, interval, limit, start_ms=None, end_ms=None,
+                       priority=PRIORITY_NORMAL):
     params = {
         "symbol": symbol.upper(),
         "interval": interval,
         "limit": limit,
     }
-    async with session.get(url, params=params) as r:
-        r.raise_for_status()
-        raw = await r.json()
+    if start_ms is not None:
+        params["startTime"] = start_ms
+    if end_ms is not None:
+        params["endTime"] = end_ms
+
+    raw = await rest.get("/api/v3/klines", params, priority=priority)
+
+    closed_before = now_ms()
+    return [normalize_rest_kline(k, closed_before) for k in raw]
+
+
+# ------------------- Gap Reconciliation -------------------
+
+def group_ranges(open_times: list, step):
+    """Split sorted OpenTimes into contiguous (start, end, count) REST ranges"""
+    ranges = []
+    for t in open_times:
+        if (
+            ranges
+            and step
+            and t - ranges[-1][1] == step
+            and ranges[-1][2] < MAX_REST_LIMIT
+        ):
+            start, _, count = ranges[-1]
+            ranges[-1] = (start, t, count + 1)
+        else:
+            ranges.append((t, t, 1))
+    return ranges
+
+
+async def reconcile_klines(symbol, interval, klines) -> int:
+    """Fetch only missing / unconfirmed candles; returns how many were repaired"""
+    step = interval_ms(interval)
+    wanted = klines.missing_open_times(step, now_ms())
+    if not wanted:
+        return 0
+
+    wanted_set = set(wanted)
+    repaired = 0
+    for start, end, count in group_ranges(wanted, step):
+        fresh = await fetch_klines(
+            symbol, interval, count,
+            start_ms=start, end_ms=end, priority=PRIORITY_LIVE
+        )
+        returned = set()
+        for d in fresh:
+            returned.add(d["OpenTime"])
+            if d["OpenTime"] in wanted_set and d["IsClosed"]:
+                repaired += 1
+        klines.extend(fresh)
+        market.submit(market.put_klines, symbol, interval, fresh)
+
+        # Binance has no candle there and never will: stop asking
+        klines.unfillable.update(
+            t for t in wanted
+            if start <= t <= end and t not in returned
+        )
+
+    klines.repaired += repaired
+    return repaired
+
+
+async def load_klines(symbol, interval, limit) -> list:
+    """
+    The newest `limit` candles, store first.
+
+    Stored closed candles are reused for one contiguous run: the first
+    stored OpenTime in the window up to the next missing one (normally
+    everything but the tail since the last run and the live candle).
+    The spans before and after that run are fetched in full
+    MAX_REST_LIMIT pages, so a sparse store (scattered CryptoPriceOnDate
+    lookups) costs a few requests, not one per hole.
+    """
+    step = interval_ms(interval)
+    stored = await market.call(market.last_klines, symbol, interval, limit)
+
+    if step is None or not stored:
+        # calendar interval or nothing stored yet
+        data = await fetch_klines(symbol, interval, limit)
+        market.submit(market.put_klines, symbol, interval, data)
+        return data
+
+    closed_before = now_ms()
+
+    # stored OpenTimes anchor the grid, so 3d / 1w alignment is exact
+    anchor = stored[-1][0]
+    live_open = anchor + max(0, (closed_before - anchor) // step) * step
+    first_open = live_open - (limit - 1) * step
+    stop = live_open + step
+
+    have = {row[0] for row in stored}
+    run_start = next((t for t in range(first_open, stop, step) if t in have), stop)
+    run_end = next((t for t in range(run_start, stop, step) if t not in have), stop)
+
+    candles = [
+        normalize_rest_kline(row, closed_before)
+        for row in stored if run_start <= row[0] < run_end
+    ]
+
+    pages = await asyncio.gather(*[
+        fetch_klines(
+            symbol, interval, count,
+            start_ms=start, end_ms=start + (count - 1) * step
+        )
+        for span_start, span_end in ((first_open, run_start), (run_end, stop))
+        for start in range(span_start, span_end, MAX_REST_LIMIT * step)
+        for count in [min(MAX_REST_LIMIT, (span_end - start) // step)]
+    ])
+    for fresh in pages:
+        market.submit(market.put_klines, symbol, interval, fresh)
+        candles.extend(fresh)
+
+    candles.sort(key=lambda d: d["OpenTime"])
+    return candles
+
+
+def status_row(state: str, klines=None) -> list:
+    repaired = klines.repaired if klines is not None else 0
+    return ["STREAM_STATUS", state, "REPAIRED", repaired] + [""] * (len(HEADER) - 4)
+
+
+# ------------------- Live Buffer Driver -------------------
+
+async def resume_klines(symbol, interval, klines) -> bool:
+    """
+    Close the gap after a reconnect: fetch from the last buffered OpenTime
+    (the candle that was live when the connection dropped) up to now, in
+    one request. False when the gap is longer than the buffer; the
+    caller reloads instead.
+    """
+    last = klines.last_open_time
+    if last is None:
+        return False
+
+    step = interval_ms(interval)
+    if step is None:
+        # calendar interval: a handful of candles at most
+        count = min(klines.limit, MAX_REST_LIMIT)
+    else:
+        live_open = last + max(0, (now_ms() - last) // step) * step
+        count = (live_open - last) // step + 1
+        if count > min(klines.limit, MAX_REST_LIMIT):
+            return False
+
+    fresh = await fetch_klines(
+        symbol, interval, count, start_ms=last, priority=PRIORITY_LIVE
+    )
+    klines.extend(fresh)
+    market.submit(market.put_klines, symbol, interval, fresh)
+    return True
+
+
+async def kline_updates(symbol: str, interval: str, limit: int, max_hz: float = DEFAULT_MAX_HZ):
+    """
+    Keep a KlineBuffer in sync with REST + the shared kline stream.
+
+    Yields (event, klines):
+      "load"   buffer (re)loaded from the store + REST
+      "stale"  reconnected, the gap since the drop is being fetched
+      "resume" gap filled, the buffer was kept
+      "tick"   live candle updated (throttled to max_hz)
+      "close"  a candle closed (always right away)
+      "repair" reconciliation rewrote past candles
+      "down"   connection lost; klines keeps the last state (may be None)
+
+    The buffer survives reconnects; only an outage longer than the
+    buffer triggers a full reload. Reconnects back off exponentially.
+    """
+    symbol = symbol.upper()
+    stream = f"{symbol.lower()}@kline_{interval}"
+    stats = metrics.stream(stream)
+
+    klines = None
+    link = hub.link(stream)
 
-    return [normalize_rest_kline(k) for k in raw]
+    while True:
+        # subscribe first: frames arriving during the REST calls
+        # queue up and are applied right after them
+        throttle = Throttle(max_hz)
+        async with link:
+
+            # ---------- Resume: keep the buffer, fill the gap ----------
+            event = None
+            if klines is not None:
+                yield "stale", klines
+                if await resume_klines(symbol, interval, klines):
+                    event = "resume"
+
+            # ---------- Full Load (store + missing tail) ----------
+            if event is None:
+                rest_data = await load_klines(symbol, interval, limit)
+                old = klines
+                klines = KlineBuffer(limit)
+                if old is not None:
+                    klines.repaired = old.repaired
+                    klines.unfillable = old.unfillable
+                klines.extend(rest_data)
+                event = "load"
+
+            yield event, klines
+
+            # ---------- WebSocket Stream (shared) ----------
+            async for msg in throttle.messages(link):
+
+                # held-back ticks fell due
+                if msg is None:
+                    if throttle.ready(urgent=True):
+                        yield "tick", klines
+                    continue
+
+                if "k" not in msg:
+                    continue
+
+                t0 = stats.apply_start()
+                d = normalize_ws_kline(msg["k"])
+                klines.upsert(d)
+                stats.apply_end(t0)
+
+                # candle close is always emitted right away
+                if throttle.ready(urgent=d["IsClosed"]):
+                    yield ("close" if d["IsClosed"] else "tick"), klines
+
+                # ---------- On Candle Close ----------
+                # persist it, then repair only holes / unconfirmed candles
+                if d["IsClosed"]:
+                    market.submit(market.put_klines, symbol, interval, [d])
+                    repaired = await reconcile_klines(symbol, interval, klines)
+                    if repaired:
+                        yield "repair", klines
+
+        # ⏳ the link waits (jittered, growing) before resubscribing
+        yield "down", klines
 
 
 # ------------------- RTD Function -------------------
 
 @xlo.func
-async def KlineStream(symbol: str, interval: str, limit: int = DEFAULT_LIMIT):
-
-    symbol = symbol.upper()
-    ws_url = f"{BINANCE_WS}/{symbol.lower()}@kline_{interval}"
+async def KlineStream(
+    symbol: str,
+    interval: str,
+    limit: int = DEFAULT_LIMIT,
+    max_hz: float = DEFAULT_MAX_HZ
+):
 
-    reconnect_delay = 5
-    last_snapshot = None
+    shown = None    # buffer behind the last table sent to Excel
+    stats = metrics.stream(f"{symbol.lower()}@kline_{interval}")
 
-    STATUS_ROW_LIVE = ["STREAM_STATUS", "LIVE"] + [""] * (len(HEADER) - 2)
-    STATUS_ROW_DOWN = ["STREAM_STATUS", "DISCONNECTED"] + [""] * (len(HEADER) - 2)
+    async for event, klines in kline_updates(symbol, interval, limit, max_hz):
 
-    while True:
-        try:
-            async with aiohttp.ClientSession() as session:
-
-                # ---------- Initial REST Load ----------
-                rest_data = await fetch_klines(session, symbol, interval, limit)
-                klines = {d["OpenTime"]: d for d in rest_data}
-
-                def enforce_limit():
-                    if len(klines) > limit:
-                        excess = len(klines) - limit
-                        for t in sorted(klines.keys())[:excess]:
-                            del klines[t]
-
-                def sorted_rows():
-                    return [as_row(klines[t]) for t in sorted(klines.keys())]
-
-                enforce_limit()
-                table = [HEADER] + sorted_rows() + [STATUS_ROW_LIVE]
-                last_snapshot = table
-                yield table
-
-                # ---------- WebSocket Stream ----------
-                async with websockets.connect(
-                    ws_url,
-                    ping_interval=20,
-                    ping_timeout=10
-                ) as ws:
-
-                    async for raw in ws:
-                        msg = json.loads(raw)
-
-                        if "k" not in msg:
-                            continue
-
-                        k = msg["k"]
-                        d = normalize_ws_kline(k)
-
-                        klines[d["OpenTime"]] = d
-                        enforce_limit()
-
-                        table = (
-                            [HEADER]
-                            + sorted_rows()
-                            + [STATUS_ROW_LIVE]
-                        )
-                        last_snapshot = table
-                        yield table
-
-                        # ---------- On Candle Close ----------
-                        if k.get("x", False):
-                            fresh = await fetch_klines(
-                                session, symbol, interval, limit
-                            )
-                            for row in fresh:
-                                klines[row["OpenTime"]] = row
-
-                            enforce_limit()
-                            table = (
-                                [HEADER]
-                                + sorted_rows()
-                                + [STATUS_ROW_LIVE]
-                            )
-                            last_snapshot = table
-                            yield table
-
-        except Exception:
+        if event in ("down", "stale"):
             # ❌ Excel ko error mat dikhao
-            # 🧊 last data freeze rahe
-            if last_snapshot:
-                fallback = last_snapshot[:-1] + [STATUS_ROW_DOWN]
-                yield fallback
-
-            # ⏳ sirf error ke baad wait
-            await asyncio.sleep(reconnect_delay)
-
-
+            # 🧊 last data freeze rahe (STALE while the gap is fetched)
+            if shown is not None:
+                state = "DISCONNECTED" if event == "down" else "STALE"
+                yield shown.table(status_row(state, shown))
+            continue
+
+        t0 = time.perf_counter()
+        table = klines.table(status_row("LIVE", klines))
+        stats.built(time.perf_counter() - t0)
+
+        shown = klines
+        yield table
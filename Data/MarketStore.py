@@ -0,0 +1,292 @@
+import asyncio
+import os
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# ============================
+# Settings
+# ============================
+
+STORE_DIR = (
+    os.environ.get("BITWISE_DATA_DIR")
+    or os.environ.get("BITWISE_CACHE_DIR")
+    or os.path.join(os.path.expanduser("~"), ".bitwise")
+)
+
+# aggTrades are bulky; closed candles are kept forever
+TRADE_RETENTION_DAYS = float(os.environ.get("BITWISE_TRADE_RETENTION_DAYS", 7))
+
+# live trades are written in batches, not one commit per trade
+FLUSH_ROWS = 500
+FLUSH_SECONDS = 1.0
+
+# expired trades are deleted in chunks of this many rows, so reads queued
+# on the store thread get a turn in between
+EXPIRE_CHUNK = 50_000
+
+COLUMNS = (
+    "open_time", "open", "high", "low", "close", "volume", "close_time",
+    "quote_volume", "trades", "taker_base", "taker_quote"
+)
+
+# record fields in COLUMNS order (= /api/v3/klines array order)
+RECORD_FIELDS = (
+    "OpenTime", "Open", "High", "Low", "Close", "Volume", "CloseTime",
+    "QuoteAssetVolume", "NumberOfTrades", "TakerBuyBaseVol", "TakerBuyQuoteVol"
+)
+
+TRADE_COLUMNS = (
+    "agg_id", "trade_time", "price", "qty", "first_id", "last_id",
+    "is_buyer_maker", "is_best_match"
+)
+
+# aggTrade payload keys in TRADE_COLUMNS order
+TRADE_KEYS = ("a", "T", "p", "q", "f", "l", "m", "M")
+
+
+def _trade_values(d) -> tuple:
+    return (
+        d["AggTradeID"], d["TradeTime"], d["Price"], d["Quantity"],
+        d["FirstTradeID"], d["LastTradeID"],
+        int(bool(d["IsBuyerMaker"])), int(bool(d["IsBestMatch"])),
+    )
+
+
+# ============================
+# Local Market-Data Store
+# ============================
+
+class MarketStore:
+    """
+    Append-only local store of closed candles and aggTrades.
+
+    One SQLite file per symbol under STORE_DIR/market. Candles are keyed
+    (interval, open_time) in a WITHOUT ROWID table, so every interval is
+    its own contiguous partition inside the file (and "1m" / "1M" never
+    clash on a case-insensitive file system). Trades are keyed by
+    AggTradeID and indexed by trade time.
+
+    Only final data is written: candles that have closed and trades, so
+    a stored row never needs to be fetched again. Reads return raw
+    rows in the REST shape; the stream modules wrap them with their own
+    normalizers.
+
+    The store only saves REST calls: a read that fails returns nothing
+    and a write that fails is dropped, the callers then simply fetch.
+
+    SQLite work never runs on the event loop (it would stall every RTD
+    formula): every call goes through one store thread, reads with
+    `await store.call(store.method, ...)`, writes queued with
+    `store.submit(store.method, ...)` without waiting. One thread keeps
+    the calls in order, so a read sees every write submitted before it.
+    """
+
+    def __init__(self, root: str | None = None):
+        self.root = os.path.join(root or STORE_DIR, "market")
+        self._dbs = {}
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="MarketStore")
+
+    async def call(self, fn, *args):
+        """Run a store method on the store thread and wait for its result"""
+        return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+
+    def submit(self, fn, *args):
+        """Queue a store method (a write) on the store thread; does not wait"""
+        return self._executor.submit(fn, *args)
+
+    def db(self, symbol: str) -> sqlite3.Connection:
+        symbol = symbol.upper()
+        con = self._dbs.get(symbol)
+        if con is not None:
+            return con
+
+        if not symbol.isalnum():
+            raise ValueError(f"Invalid symbol: {symbol!r}")
+
+        os.makedirs(self.root, exist_ok=True)
+        # opened on the store thread; check_same_thread=False only so a
+        # direct (synchronous) caller outside the event loop still works
+        con = sqlite3.connect(
+            os.path.join(self.root, f"{symbol}.sqlite"), check_same_thread=False
+        )
+        con.execute("PRAGMA journal_mode=WAL")
+        con.execute("PRAGMA synchronous=NORMAL")
+        con.execute(
+            "CREATE TABLE IF NOT EXISTS klines ("
+            " interval TEXT, open_time INTEGER,"
+            " open REAL, high REAL, low REAL, close REAL, volume REAL,"
+            " close_time INTEGER, quote_volume REAL, trades INTEGER,"
+            " taker_base REAL, taker_quote REAL,"
+            " PRIMARY KEY (interval, open_time)"
+            ") WITHOUT ROWID"
+        )
+        con.execute(
+            "CREATE TABLE IF NOT EXISTS aggtrades ("
+            " agg_id INTEGER PRIMARY KEY, trade_time INTEGER,"
+            " price REAL, qty REAL, first_id INTEGER, last_id INTEGER,"
+            " is_buyer_maker INTEGER, is_best_match INTEGER"
+            ")"
+        )
+        con.execute(
+            "CREATE INDEX IF NOT EXISTS aggtrades_time ON aggtrades (trade_time)"
+        )
+
+        self._dbs[symbol] = con
+
+        # once per process and symbol is plenty; queued behind the call
+        # that opened the file instead of delaying it
+        if TRADE_RETENTION_DAYS > 0:
+            cutoff = int((time.time() - TRADE_RETENTION_DAYS * 86400) * 1000)
+            self.submit(self._expire_trades, symbol, cutoff)
+        return con
+
+    def _expire_trades(self, symbol: str, cutoff: int):
+        """Delete one chunk of trades older than cutoff; requeues itself until done"""
+        try:
+            con = self.db(symbol)
+            with con:
+                deleted = con.execute(
+                    "DELETE FROM aggtrades WHERE agg_id IN ("
+                    " SELECT agg_id FROM aggtrades WHERE trade_time < ? LIMIT ?)",
+                    (cutoff, EXPIRE_CHUNK)
+                ).rowcount
+        except (sqlite3.Error, OSError, ValueError):
+            return
+        if deleted == EXPIRE_CHUNK:
+            self.submit(self._expire_trades, symbol, cutoff)
+
+    def _query(self, symbol: str, sql: str, params: tuple) -> list:
+        try:
+            return self.db(symbol).execute(sql, params).fetchall()
+        except (sqlite3.Error, OSError, ValueError):
+            return []
+
+    def _write(self, symbol: str, sql: str, rows: list) -> int:
+        try:
+            con = self.db(symbol)
+            with con:
+                con.executemany(sql, rows)
+        except (sqlite3.Error, OSError, ValueError):
+            return 0
+        return len(rows)
+
+    def close(self):
+        for con in self._dbs.values():
+            con.close()
+        self._dbs.clear()
+
+    # ---------- klines ----------
+
+    def put_klines(self, symbol: str, interval: str, candles) -> int:
+        """Store the closed candles among `candles`; returns how many"""
+        rows = [
+            (interval, *[d[name] for name in RECORD_FIELDS])
+            for d in candles if d["IsClosed"]
+        ]
+        if not rows:
+            return 0
+
+        return self._write(
+            symbol,
+            f"INSERT OR REPLACE INTO klines (interval, {', '.join(COLUMNS)})"
+            f" VALUES (?, {', '.join('?' * len(COLUMNS))})",
+            rows
+        )
+
+    def kline(self, symbol: str, interval: str, open_time: int):
+        rows = self._query(
+            symbol,
+            f"SELECT {', '.join(COLUMNS)} FROM klines"
+            " WHERE interval = ? AND open_time = ?",
+            (interval, open_time)
+        )
+        return list(rows[0]) if rows else None
+
+    def klines(self, symbol: str, interval: str, start_ms: int, end_ms: int | None = None) -> list:
+        """Stored candles with start_ms <= OpenTime <= end_ms, oldest first"""
+        if end_ms is None:
+            end_ms = 2 ** 62
+        return [
+            list(row) for row in self._query(
+                symbol,
+                f"SELECT {', '.join(COLUMNS)} FROM klines"
+                " WHERE interval = ? AND open_time BETWEEN ? AND ?"
+                " ORDER BY open_time",
+                (interval, start_ms, end_ms)
+            )
+        ]
+
+    def last_klines(self, symbol: str, interval: str, limit: int) -> list:
+        """The newest `limit` stored candles, oldest first"""
+        rows = self._query(
+            symbol,
+            f"SELECT {', '.join(COLUMNS)} FROM klines"
+            " WHERE interval = ? ORDER BY open_time DESC LIMIT ?",
+            (interval, limit)
+        )
+        return [list(row) for row in reversed(rows)]
+
+    # ---------- aggTrades ----------
+
+    def put_trades(self, symbol: str, trades) -> int:
+        rows = [_trade_values(d) for d in trades]
+        if not rows:
+            return 0
+
+        return self._write(
+            symbol,
+            f"INSERT OR IGNORE INTO aggtrades ({', '.join(TRADE_COLUMNS)})"
+            f" VALUES ({', '.join('?' * len(TRADE_COLUMNS))})",
+            rows
+        )
+
+    def trades(self, symbol: str, start_ms: int) -> list:
+        """Stored trades with TradeTime >= start_ms as aggTrade payload dicts, in ID order"""
+        rows = self._query(
+            symbol,
+            f"SELECT {', '.join(TRADE_COLUMNS)} FROM aggtrades"
+            " WHERE trade_time >= ? ORDER BY agg_id",
+            (start_ms,)
+        )
+        out = []
+        for row in rows:
+            t = dict(zip(TRADE_KEYS, row))
+            t["m"] = bool(t["m"])
+            t["M"] = bool(t["M"])
+            out.append(t)
+        return out
+
+
+class TradeRecorder:
+    """
+    Batches live trades for one symbol into the store.
+
+    add() is O(1); the batch is queued for the store thread once it
+    holds FLUSH_ROWS trades or FLUSH_SECONDS have passed since the last
+    write. Call flush() when the stream stops so nothing is lost.
+    """
+
+    def __init__(self, store: MarketStore, symbol: str):
+        self.store = store
+        self.symbol = symbol
+        self.pending = []
+        self._last_flush = time.monotonic()
+
+    def add(self, d):
+        self.pending.append(d)
+        if (
+            len(self.pending) >= FLUSH_ROWS
+            or time.monotonic() - self._last_flush >= FLUSH_SECONDS
+        ):
+            self.flush()
+
+    def flush(self):
+        self._last_flush = time.monotonic()
+        if not self.pending:
+            return
+        batch, self.pending = self.pending, []
+        self.store.submit(self.store.put_trades, self.symbol, batch)
+
+
+market = MarketStore()
@@ -0,0 +1,172 @@
+import time
+from collections import deque
+
+# ============================
+# Stream Metrics Registry
+# ============================
+#
+# Hot-path cost is kept to a counter bump per frame: lag / parse /
+# apply timings are sampled on every SAMPLE_EVERY-th frame (and at least
+# once between two StreamStats refreshes, so slow streams still show a
+# fresh last-message time).
+#
+# Readers never reset shared state: msgs/sec and the lag maximum are
+# computed per reader (MetricsReader) from the running frame counter and
+# per-second lag maxima, so several StreamStats cells do not steal each
+# other's windows.
+
+SAMPLE_EVERY = 8
+_SAMPLE_MASK = SAMPLE_EVERY - 1
+
+# weight of the newest sample in the moving averages
+EWMA_ALPHA = 0.2
+
+# per-second lag maxima kept for readers (longest refresh window served)
+LAG_HISTORY_SECONDS = 600
+
+
+def _ewma(avg, x):
+    return x if avg is None else avg + EWMA_ALPHA * (x - avg)
+
+
+class StreamMetrics:
+    """Counters and timings of one Binance stream (shared by every formula on it)"""
+
+    __slots__ = (
+        "name", "frames", "want_sample", "last_recv",
+        "lag_ms", "lag_max", "parse_us", "applied", "apply_us",
+        "build_ms", "yields", "reconnects",
+        "last_error", "last_error_at", "created",
+    )
+
+    def __init__(self, name: str):
+        self.name = name
+        self.frames = 0
+        self.want_sample = True
+        self.last_recv = None       # epoch seconds of the newest sampled frame
+        self.lag_ms = None          # EWMA of receive time - Binance event time
+        self.lag_max = deque(maxlen=LAG_HISTORY_SECONDS)    # [second, worst lag ms]
+        self.parse_us = None
+        self.applied = 0
+        self.apply_us = None
+        self.build_ms = None
+        self.yields = 0
+        self.reconnects = 0
+        self.last_error = ""
+        self.last_error_at = None
+        self.created = time.monotonic()
+
+    # ---------- hub side ----------
+
+    def sampled(self, recv: float, event_ms, parse_s):
+        """One sampled frame: receive time (epoch s), Binance E/T (ms), decode time or None"""
+        self.want_sample = False
+        self.last_recv = recv
+        if parse_s is not None:
+            self.parse_us = _ewma(self.parse_us, parse_s * 1e6)
+        if event_ms is not None:
+            lag = recv * 1000 - event_ms
+            self.lag_ms = _ewma(self.lag_ms, lag)
+            second = int(recv)
+            buckets = self.lag_max
+            if buckets and buckets[-1][0] == second:
+                if lag > buckets[-1][1]:
+                    buckets[-1][1] = lag
+            else:
+                buckets.append([second, lag])
+
+    def disconnected(self, error):
+        """Connection dropped or a formula restarted its stream after an error"""
+        self.reconnects += 1
+        self.error(error)
+
+    # ---------- function side ----------
+
+    def apply_start(self) -> float:
+        """perf_counter() on sampled messages, 0.0 otherwise; pass to apply_end()"""
+        self.applied += 1
+        if self.applied & _SAMPLE_MASK:
+            return 0.0
+        return time.perf_counter()
+
+    def apply_end(self, t0: float):
+        if t0:
+            self.apply_us = _ewma(self.apply_us, (time.perf_counter() - t0) * 1e6)
+
+    def built(self, seconds: float):
+        """One table handed to Excel, `seconds` spent building it"""
+        self.yields += 1
+        self.build_ms = _ewma(self.build_ms, seconds * 1000)
+
+    def error(self, error):
+        self.last_error = f"{type(error).__name__}: {error}" if isinstance(error, BaseException) else str(error)
+        self.last_error_at = time.time()
+
+    # ---------- readers ----------
+
+    def lag_max_since(self, since: float):
+        """Worst sampled lag (ms) in the seconds from `since` (epoch s) on, None if none"""
+        first = int(since)
+        worst = None
+        for second, lag in reversed(self.lag_max):
+            if second < first:
+                break
+            if worst is None or lag > worst:
+                worst = lag
+        return worst
+
+
+class MetricsRegistry:
+    """Process-wide stream name -> StreamMetrics"""
+
+    def __init__(self):
+        self.streams = {}
+
+    def stream(self, name: str) -> StreamMetrics:
+        m = self.streams.get(name)
+        if m is None:
+            m = self.streams[name] = StreamMetrics(name)
+        return m
+
+    def reader(self) -> "MetricsReader":
+        return MetricsReader(self)
+
+
+class MetricsReader:
+    """
+    One consumer's view of the registry (one StreamStats cell, a
+    benchmark): msgs/sec and the lag maximum cover the time since THIS
+    reader's previous read. Shared counters are only read.
+    """
+
+    def __init__(self, registry: MetricsRegistry):
+        self.registry = registry
+        self._last = {}         # stream name -> (frames, monotonic, epoch s)
+
+    def read(self) -> list:
+        """[(StreamMetrics, msgs/sec, lag max ms), ...] for every stream seen so far"""
+        now = time.monotonic()
+        wall = time.time()
+        out = []
+        for name, m in self.registry.streams.items():
+            # first read: everything since the stream was first seen
+            frames, at, since = self._last.get(name, (0, m.created, 0.0))
+            rate = (m.frames - frames) / (now - at) if now > at else 0.0
+            out.append((m, rate, m.lag_max_since(since)))
+            self._last[name] = (m.frames, now, wall)
+            # take a fresh sample before the next read
+            m.want_sample = True
+        return out
+
+
+metrics = MetricsRegistry()
+
+
+def event_time(data):
+    """Binance event time (E, else T) of a stream payload, None if absent"""
+    if isinstance(data, list):
+        data = data[0] if data else None
+    if not isinstance(data, dict):
+        return None
+    t = data.get("E", data.get("T"))
+    return t if isinstance(t, (int, float)) else None
@@ -0,0 +1,361 @@
+import xloil as xlo
+import asyncio
+import time
+from bisect import bisect_left, bisect_right
+from StreamHub import hub
+from Metrics import metrics
+from Throttle import Throttle, DEFAULT_MAX_HZ
+from RestClient import rest, PRIORITY_LIVE, PRIORITY_NORMAL
+
+# ============================
+# Settings
+# ============================
+
+# levels per side in the REST snapshot
+DEPTH_LIMIT = 1000
+
+# levels per side kept locally; diffs far from the top are dropped
+MAX_LEVELS = 5000
+
+DEFAULT_LEVELS = 10
+
+# wait before asking again when the snapshot is older than the stream
+RESYNC_DELAY = 0.5
+
+
+def depth_weight(limit: int) -> int:
+    """Binance request weight of /api/v3/depth"""
+    if limit <= 100:
+        return 5
+    if limit <= 500:
+        return 25
+    if limit <= 1000:
+        return 50
+    return 250
+
+
+# ============================
+# Price Levels
+# ============================
+
+class BookSide:
+    """
+    One side of the book as two parallel sorted lists (keys, quantities).
+
+    Keys are prices times `sign` (-1 for bids), so index 0 is always the
+    best level on both sides and bisect works unchanged. A diff level is
+    one binary search plus, for a new or removed price, a list
+    insert / delete (a memmove of a few KB).
+    """
+
+    __slots__ = ("sign", "keys", "qtys")
+
+    def __init__(self, descending: bool):
+        self.sign = -1.0 if descending else 1.0
+        self.keys = []
+        self.qtys = []
+
+    def __len__(self):
+        return len(self.keys)
+
+    def load(self, levels):
+        sign = self.sign
+        pairs = sorted(
+            (sign * float(p), float(q)) for p, q in levels if float(q)
+        )
+        self.keys = [k for k, _ in pairs]
+        self.qtys = [q for _, q in pairs]
+
+    def update(self, levels, max_levels: int = MAX_LEVELS):
+        """Apply [price, qty] pairs; qty 0 removes the level"""
+        keys = self.keys
+        qtys = self.qtys
+        sign = self.sign
+
+        for p, q in levels:
+            k = sign * float(p)
+            q = float(q)
+            i = bisect_left(keys, k)
+            if i < len(keys) and keys[i] == k:
+                if q:
+                    qtys[i] = q
+                else:
+                    del keys[i]
+                    del qtys[i]
+            elif q and i < max_levels:
+                keys.insert(i, k)
+                qtys.insert(i, q)
+
+        if len(keys) > max_levels:
+            del keys[max_levels:]
+            del qtys[max_levels:]
+
+    def best(self):
+        return self.sign * self.keys[0] if self.keys else None
+
+    def top(self, n: int) -> list:
+        """(price, qty) of the best n levels"""
+        sign = self.sign
+        return [(sign * k, q) for k, q in zip(self.keys[:n], self.qtys[:n])]
+
+    def qty_through(self, price: float) -> float:
+        """Total quantity at `price` and every better level"""
+        return sum(self.qtys[:bisect_right(self.keys, self.sign * price)])
+
+
+# ============================
+# Local Order Book
+# ============================
+
+class OrderBook:
+    """
+    REST snapshot + @depth diff events, Binance's sequencing rules:
+
+    - events with u <= lastUpdateId are already in the book -> skipped
+    - the next event must have U <= lastUpdateId + 1 (<= u); anything
+      else means updates were lost -> apply() returns False and the
+      caller reloads the snapshot
+    """
+
+    def __init__(self, max_levels: int = MAX_LEVELS):
+        self.max_levels = max_levels
+        self.bids = BookSide(descending=True)
+        self.asks = BookSide(descending=False)
+        self.last_update_id = None
+        self.event_time = None
+        self.resyncs = 0
+
+    def load_snapshot(self, snap: dict):
+        self.bids.load(snap["bids"])
+        self.asks.load(snap["asks"])
+        self.last_update_id = int(snap["lastUpdateId"])
+
+    def apply(self, event: dict) -> bool:
+        """Apply one depthUpdate; False on a sequence gap"""
+        last = self.last_update_id
+        if last is None:
+            return False
+
+        u = event["u"]
+        if u <= last:
+            return True
+        if event["U"] > last + 1:
+            return False
+
+        self.bids.update(event["b"], self.max_levels)
+        self.asks.update(event["a"], self.max_levels)
+        self.last_update_id = u
+        self.event_time = event.get("E")
+        return True
+
+    # ---------- metrics ----------
+
+    @property
+    def best_bid(self):
+        return self.bids.best()
+
+    @property
+    def best_ask(self):
+        return self.asks.best()
+
+    @property
+    def mid(self):
+        b, a = self.best_bid, self.best_ask
+        return None if b is None or a is None else (b + a) / 2
+
+    @property
+    def spread(self):
+        b, a = self.best_bid, self.best_ask
+        return None if b is None or a is None else a - b
+
+    def depth_within(self, bps: float):
+        """(bid qty, ask qty) within `bps` basis points of the mid"""
+        mid = self.mid
+        if mid is None:
+            return None, None
+        return (
+            self.bids.qty_through(mid * (1 - bps / 10000)),
+            self.asks.qty_through(mid * (1 + bps / 10000)),
+        )
+
+
+# ============================
+# REST Snapshot
+# ============================
+
+async def fetch_depth_snapshot(symbol: str, limit: int = DEPTH_LIMIT,
+                               priority: int = PRIORITY_NORMAL) -> dict:
+    return await rest.get(
+        "/api/v3/depth",
+        {"symbol": symbol.upper(), "limit": limit},
+        weight=depth_weight(limit),
+        priority=priority
+    )
+
+
+async def sync_book(book: OrderBook, symbol: str, pending: dict | None = None,
+                    priority: int = PRIORITY_NORMAL):
+    """
+    (Re)load the snapshot until `pending` (the event that did not fit)
+    applies on top of it. Events buffered behind it in the subscription
+    are applied by the caller as usual.
+    """
+    while True:
+        book.load_snapshot(await fetch_depth_snapshot(symbol, priority=priority))
+        if pending is None or book.apply(pending):
+            return
+        # snapshot is older than the stream; Binance catches up quickly
+        await asyncio.sleep(RESYNC_DELAY)
+
+
+# ============================
+# Excel Table
+# ============================
+
+HEADER = [
+    "Level",
+    "BidPrice",
+    "BidQty",
+    "BidCumQty",
+    "BidCumQuote",
+    "AskPrice",
+    "AskQty",
+    "AskCumQty",
+    "AskCumQuote",
+]
+
+
+def _pad(row: list) -> list:
+    return row + [""] * (len(HEADER) - len(row))
+
+
+def _side_columns(levels: list, n: int) -> list:
+    out = []
+    cum_qty = 0.0
+    cum_quote = 0.0
+    for p, q in levels:
+        cum_qty += q
+        cum_quote += p * q
+        out.append([p, q, cum_qty, cum_quote])
+    return out + [["", "", "", ""]] * (n - len(out))
+
+
+def book_table(book: OrderBook, levels: int, depth_bps: float, state: str) -> list:
+    """Top `levels` of both sides with running totals, then summary rows"""
+    bids = _side_columns(book.bids.top(levels), levels)
+    asks = _side_columns(book.asks.top(levels), levels)
+
+    rows = [HEADER]
+    for i in range(levels):
+        rows.append([i + 1, *bids[i], *asks[i]])
+
+    mid = book.mid
+    spread = book.spread
+    spread_bps = spread / mid * 10000 if mid else None
+
+    bid_top = sum(book.bids.qtys[:levels])
+    ask_top = sum(book.asks.qtys[:levels])
+    total = bid_top + ask_top
+    imbalance = (bid_top - ask_top) / total if total else None
+
+    bid_bps, ask_bps = book.depth_within(depth_bps)
+
+    rows += [
+        _pad(["MID_PRICE", mid, "SPREAD", spread, "SPREAD_BPS", spread_bps]),
+        _pad(["TOP_BID_QTY", bid_top, "TOP_ASK_QTY", ask_top, "IMBALANCE", imbalance]),
+        _pad(["DEPTH_BPS", depth_bps, "BID_QTY", bid_bps, "ASK_QTY", ask_bps]),
+        _pad([
+            "STREAM_STATUS", state,
+            "LAST_UPDATE_ID", book.last_update_id,
+            "RESYNCS", book.resyncs,
+        ]),
+    ]
+    return [["" if v is None else v for v in row] for row in rows]
+
+
+# ============================
+# XlOil Streaming Function
+# ============================
+
+@xlo.func
+async def OrderBookStream(
+    symbol: str,
+    levels: int = DEFAULT_LEVELS,
+    depth_bps: float = 10.0,
+    max_hz: float = DEFAULT_MAX_HZ
+):
+    """
+    Live local order book: REST depth snapshot + <symbol>@depth@100ms diffs.
+
+    Excel:
+    =OrderBookStream("BTCUSDT")
+    =OrderBookStream("BTCUSDT", 20, 25)
+
+    Top `levels` bids / asks with cumulative quantity and notional, then
+    mid price, spread (absolute and in bps), top-of-book imbalance and the
+    quantity resting within `depth_bps` of the mid. A sequence gap reloads
+    the snapshot (STALE meanwhile); the book survives reconnects the same
+    way.
+    """
+
+    symbol = symbol.upper()
+    stream = f"{symbol.lower()}@depth@100ms"
+    levels = max(1, min(int(levels or DEFAULT_LEVELS), DEPTH_LIMIT))
+    depth_bps = float(depth_bps or 0)
+
+    stats = metrics.stream(stream)
+    link = hub.link(stream)
+    book = OrderBook()
+    last_table = None
+
+    def table(state):
+        return book_table(book, levels, depth_bps, state)
+
+    while True:
+        # subscribe first: diffs arriving during the snapshot call
+        # queue up and are sequenced against it
+        throttle = Throttle(max_hz)
+        async with link:
+
+            if book.last_update_id is not None:
+                # reconnect: the diffs in between are gone
+                book.resyncs += 1
+                if last_table:
+                    yield last_table[:-1] + [_pad(["STREAM_STATUS", "STALE"])]
+                await sync_book(book, symbol, priority=PRIORITY_LIVE)
+            else:
+                await sync_book(book, symbol)
+
+            last_table = table("LIVE")
+            yield last_table
+
+            async for msg in throttle.messages(link):
+
+                if msg is not None:
+                    if msg.get("e") != "depthUpdate":
+                        continue
+
+                    t0 = stats.apply_start()
+                    ok = book.apply(msg)
+                    stats.apply_end(t0)
+
+                    if not ok:
+                        book.resyncs += 1
+                        yield last_table[:-1] + [_pad(["STREAM_STATUS", "STALE"])]
+                        await sync_book(book, symbol, msg, PRIORITY_LIVE)
+                        throttle.ready(urgent=True)
+                        last_table = table("LIVE")
+                        yield last_table
+                        continue
+
+                if not throttle.ready(urgent=msg is None):
+                    continue
+
+                t0 = time.perf_counter()
+                last_table = table("LIVE")
+                stats.built(time.perf_counter() - t0)
+                yield last_table
+
+        # Excel keeps the last book
+        if last_table:
+            yield last_table[:-1] + [_pad(["STREAM_STATUS", "DISCONNECTED"])]
@@ -0,0 +1,289 @@
+import xloil as xlo
+import heapq
+import math
+import time
+from aggTrade import aggtrade_updates
+from Metrics import metrics
+from Throttle import DEFAULT_MAX_HZ
+
+# ============================
+# Settings
+# ============================
+
+DEFAULT_MINUTES = 5.0
+
+# a trade at or above this quote notional counts as large
+LARGE_QUOTE = 100_000.0
+
+DEFAULT_PROFILE_ROWS = 20
+
+# automatic profile bucket: about this share of the price, rounded to 1/2/5
+AUTO_BUCKET_FRACTION = 0.0005
+
+
+def nice_step(price: float) -> float:
+    """1, 2 or 5 x 10^k closest below price * AUTO_BUCKET_FRACTION"""
+    raw = price * AUTO_BUCKET_FRACTION
+    if raw <= 0:
+        return 1.0
+    base = 10 ** math.floor(math.log10(raw))
+    for m in (5, 2, 1):
+        if raw >= m * base:
+            return m * base
+    return base
+
+
+def _div(a: float, b: float):
+    return a / b if b > 0 else None
+
+
+# ============================
+# Rolling Order Flow
+# ============================
+
+class ProfileBucket:
+    __slots__ = ("buy", "sell", "trades")
+
+    def __init__(self):
+        self.buy = 0.0
+        self.sell = 0.0
+        self.trades = 0
+
+
+class OrderFlowState:
+    """
+    Order-flow totals of the trades currently in the window.
+
+    add() when a trade enters, remove() when it is evicted; both are
+    O(1), so the window is never rescanned. When the window or a profile
+    bucket empties, its totals restart from exactly zero, so float drift
+    from add / subtract pairs cannot build up.
+    """
+
+    def __init__(self, bucket_size: float | None = None, large_quote: float = LARGE_QUOTE):
+        self.bucket_size = bucket_size
+        self.large_quote = large_quote
+        self.reset()
+
+    def reset(self):
+        self.trades = 0
+        self.buy_volume = 0.0
+        self.sell_volume = 0.0
+        self.buy_quote = 0.0
+        self.sell_quote = 0.0
+        self.large_buys = 0
+        self.large_sells = 0
+        self.cvd = 0.0              # buy - sell since the last reset, never evicted
+        self.profile = {}           # bucket index -> ProfileBucket
+
+    def _bucket(self, price: float) -> int:
+        if not self.bucket_size:
+            self.bucket_size = nice_step(price)
+        return int(price // self.bucket_size)
+
+    def add(self, d):
+        p = d["Price"]
+        q = d["Quantity"]
+        quote = p * q
+        sell = d["IsBuyerMaker"]
+
+        self.trades += 1
+        if sell:
+            self.sell_volume += q
+            self.sell_quote += quote
+            self.cvd -= q
+            if quote >= self.large_quote:
+                self.large_sells += 1
+        else:
+            self.buy_volume += q
+            self.buy_quote += quote
+            self.cvd += q
+            if quote >= self.large_quote:
+                self.large_buys += 1
+
+        key = self._bucket(p)
+        b = self.profile.get(key)
+        if b is None:
+            b = self.profile[key] = ProfileBucket()
+        b.trades += 1
+        if sell:
+            b.sell += q
+        else:
+            b.buy += q
+
+    def remove(self, d):
+        p = d["Price"]
+        q = d["Quantity"]
+        quote = p * q
+        sell = d["IsBuyerMaker"]
+
+        self.trades -= 1
+        if self.trades <= 0:
+            # window is empty: drop accumulated rounding, keep the CVD
+            cvd = self.cvd
+            self.reset()
+            self.cvd = cvd
+            return
+
+        if sell:
+            self.sell_volume -= q
+            self.sell_quote -= quote
+            if quote >= self.large_quote:
+                self.large_sells -= 1
+        else:
+            self.buy_volume -= q
+            self.buy_quote -= quote
+            if quote >= self.large_quote:
+                self.large_buys -= 1
+
+        key = self._bucket(p)
+        b = self.profile.get(key)
+        if b is None:
+            return
+        b.trades -= 1
+        if b.trades <= 0:
+            del self.profile[key]
+        elif sell:
+            b.sell -= q
+        else:
+            b.buy -= q
+
+    # ---------- derived ----------
+
+    @property
+    def volume(self) -> float:
+        return self.buy_volume + self.sell_volume
+
+    @property
+    def delta(self) -> float:
+        return self.buy_volume - self.sell_volume
+
+    @property
+    def quote_volume(self) -> float:
+        return self.buy_quote + self.sell_quote
+
+    @property
+    def imbalance(self):
+        """(buy - sell) / (buy + sell), -1 .. 1"""
+        return _div(self.delta, self.volume)
+
+    @property
+    def vwap(self):
+        return _div(self.quote_volume, self.volume)
+
+    def poc(self):
+        """Lower edge of the bucket with the most volume (point of control)"""
+        if not self.profile:
+            return None
+        key = max(self.profile, key=lambda k: self.profile[k].buy + self.profile[k].sell)
+        return self._level(key)
+
+    def _level(self, key: int) -> float:
+        return round(key * self.bucket_size, 10)
+
+    def profile_rows(self, n: int) -> list:
+        """The n busiest buckets, highest price first"""
+        top = heapq.nlargest(
+            n, self.profile.items(), key=lambda kv: kv[1].buy + kv[1].sell
+        )
+        top.sort(key=lambda kv: kv[0], reverse=True)
+        return [
+            [self._level(k), b.buy, b.sell, b.buy + b.sell, b.buy - b.sell]
+            for k, b in top
+        ]
+
+
+# ============================
+# Excel Table
+# ============================
+
+HEADER = ["Metric", "Value", "Buy", "Sell", "Total"]
+PROFILE_HEADER = ["PriceLevel", "BuyVolume", "SellVolume", "TotalVolume", "Delta"]
+
+
+def _row(*values) -> list:
+    row = ["" if v is None else v for v in values]
+    return row + [""] * (len(HEADER) - len(row))
+
+
+def flow_table(flow: OrderFlowState, minutes: float, profile_rows: int, state: str) -> list:
+    return [
+        HEADER,
+        _row("WindowMinutes", minutes),
+        _row("Trades", flow.trades),
+        _row("Volume", flow.volume, flow.buy_volume, flow.sell_volume, flow.volume),
+        _row("QuoteVolume", flow.quote_volume, flow.buy_quote, flow.sell_quote, flow.quote_volume),
+        _row(
+            "VWAP", flow.vwap,
+            _div(flow.buy_quote, flow.buy_volume),
+            _div(flow.sell_quote, flow.sell_volume),
+        ),
+        _row("Delta", flow.delta),
+        _row("CVD", flow.cvd),
+        _row("ImbalanceRatio", flow.imbalance),
+        _row("BuySellRatio", _div(flow.buy_volume, flow.sell_volume)),
+        _row("LargeTrades", flow.large_buys + flow.large_sells, flow.large_buys, flow.large_sells),
+        _row("LargeTradeQuote", flow.large_quote),
+        _row("POC", flow.poc()),
+        _row("BucketSize", flow.bucket_size),
+        PROFILE_HEADER,
+        *flow.profile_rows(profile_rows),
+        _row("STREAM_STATUS", state),
+    ]
+
+
+# ============================
+# XlOil Streaming Function
+# ============================
+
+@xlo.func
+async def OrderFlow(
+    symbol: str,
+    minutes: float = DEFAULT_MINUTES,
+    bucket_size: float | None = None,
+    large_quote: float = LARGE_QUOTE,
+    profile_rows: int = DEFAULT_PROFILE_ROWS,
+    max_hz: float = DEFAULT_MAX_HZ
+):
+    """
+    Rolling order flow over the last `minutes` of aggTrades.
+
+    Excel:
+    =OrderFlow("BTCUSDT")
+    =OrderFlow("BTCUSDT", 15, 50, 250000)
+
+    Buy / sell volume (aggressor side from IsBuyerMaker), delta,
+    cumulative volume delta since the formula started, imbalance ratio,
+    VWAP (all / buys / sells), large-trade counts (quote >= large_quote)
+    and a volume profile of the `profile_rows` busiest price buckets
+    (bucket_size in quote currency, automatic when empty). Trades enter
+    and leave the totals as the window slides; only the summary goes
+    to Excel.
+    """
+
+    bucket_size = float(bucket_size or 0) or None
+    large_quote = float(large_quote or LARGE_QUOTE)
+    profile_rows = max(0, int(profile_rows or 0))
+
+    flow = OrderFlowState(bucket_size, large_quote)
+    last_table = None
+    stats = metrics.stream(f"{symbol.lower()}@aggTrade")
+
+    async for event, _, added, evicted in aggtrade_updates(symbol, minutes, None, max_hz, rows=False):
+
+        if event in ("down", "stale"):
+            if last_table:
+                yield last_table[:-1] + [_row("STREAM_STATUS", "DISCONNECTED" if event == "down" else "STALE")]
+            continue
+
+        t0 = time.perf_counter()
+        if event == "load":
+            flow.reset()
+        for d in added:
+            flow.add(d)
+        for d in evicted:
+            flow.remove(d)
+
+        last_table = flow_table(flow, minutes, profile_rows, "LIVE")
+        stats.built(time.perf_counter() - t0)
+        yield last_table
@@ -0,0 +1,242 @@
+import asyncio
+import aiohttp
+import heapq
+import itertools
+import json
+import os
+import time
+from Decoding import loads
+
+# ============================
+# Binance REST Endpoint
+# ============================
+
+# point every REST call somewhere else (local stub, testnet, api1...)
+BINANCE_REST = os.environ.get("BITWISE_REST_URL", "https://api.binance.com")
+
+# Binance REQUEST_WEIGHT limit per IP and minute; we only plan to use
+# WEIGHT_HEADROOM of it so other tools on the same IP still get some
+WEIGHT_LIMIT = 6000
+WEIGHT_HEADROOM = 0.8
+
+# keep-alive pool shared by every module
+MAX_CONNECTIONS = 10
+REQUEST_TIMEOUT = 30
+
+# 429: wait Retry-After and try again this many times
+MAX_RETRIES = 3
+DEFAULT_RETRY_AFTER = 5.0
+
+# scheduling order when the budget is short (lower goes first)
+PRIORITY_LIVE = 0       # gap fills of a running stream
+PRIORITY_NORMAL = 1     # initial loads, date lookups
+PRIORITY_BULK = 2       # history backfills
+
+# estimated weight per endpoint; the response headers correct it
+ENDPOINT_WEIGHT = {
+    "/api/v3/klines": 2,
+    "/api/v3/aggTrades": 2,
+}
+
+USED_WEIGHT_HEADER = "X-MBX-USED-WEIGHT-1M"
+
+
+class RestBanned(Exception):
+    """Binance answered 418: this IP is banned until the Retry-After time"""
+
+
+def is_permanent(error: BaseException) -> bool:
+    """
+    True for failures a retry cannot fix: a 4xx answer other than the
+    rate-limit ones (unknown symbol, bad parameter) or bad input
+    (ValueError, e.g. no history for the requested range).
+    """
+    status = getattr(error, "status", None)
+    if isinstance(status, int):
+        return 400 <= status < 500 and status not in (418, 429)
+    return isinstance(error, ValueError) and not isinstance(error, json.JSONDecodeError)
+
+
+def error_text(error: BaseException) -> str:
+    """A failed load as one Excel cell (HTTP status when there is one)"""
+    status = getattr(error, "status", None)
+    if status:
+        return f"Error: HTTP {status}"
+    return f"Error: {error}" if str(error) else f"Error: {type(error).__name__}"
+
+
+def _retry_after(r) -> float:
+    try:
+        return max(0.0, float(r.headers.get("Retry-After", DEFAULT_RETRY_AFTER)))
+    except ValueError:
+        return DEFAULT_RETRY_AFTER
+
+
+# ============================
+# Process-wide REST Client
+# ============================
+
+class RestClient:
+    """
+    One pooled aiohttp session for every REST call in the process.
+
+    - keep-alive connections are reused by all formulas (at most
+      MAX_CONNECTIONS in flight)
+    - a token bucket of WEIGHT_LIMIT * WEIGHT_HEADROOM, refilled evenly
+      over a minute, is charged the endpoint weight before each request;
+      the X-MBX-USED-WEIGHT-1M header of every response pulls it down to
+      what Binance actually counted (other formulas, other processes)
+    - when the budget or the pool is short, waiting requests go out by
+      priority, then in arrival order
+    - 429: every request pauses for Retry-After, the request is retried;
+      418: requests fail with RestBanned until the ban is over
+
+    Usage:
+        data = await rest.get("/api/v3/klines", params, priority=PRIORITY_LIVE)
+    """
+
+    def __init__(self, base_url: str = BINANCE_REST, weight_limit: int = WEIGHT_LIMIT):
+        self.base_url = base_url
+        self.weight_limit = weight_limit
+        self.budget = weight_limit * WEIGHT_HEADROOM
+        self.tokens = self.budget
+        self.used_weight = 0        # last X-MBX-USED-WEIGHT-1M seen
+        self.requests = 0
+        self.throttled = 0          # 429 / 418 responses
+        self._refilled_at = time.monotonic()
+        self._blocked_until = 0.0
+        self._banned = False
+        self._in_flight = 0
+        self._queue = []            # heap of (priority, seq)
+        self._seq = itertools.count()
+        self._changed = asyncio.Event()
+        self._session = None
+
+    # ---------- session ----------
+
+    def session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=MAX_CONNECTIONS),
+                timeout=aiohttp.ClientTimeout(total=REQUEST_TIMEOUT)
+            )
+        return self._session
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    # ---------- token bucket ----------
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(
+            self.budget,
+            self.tokens + (now - self._refilled_at) * self.budget / 60
+        )
+        self._refilled_at = now
+
+    def _notify(self):
+        # wake every waiter once; each re-checks whether it is next
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    def _ready_in(self, weight: float) -> float:
+        """Seconds until the head of the queue may go (0 = now)"""
+        now = time.monotonic()
+        if self._blocked_until > now:
+            return self._blocked_until - now
+        if self.tokens < weight:
+            return (weight - self.tokens) * 60 / self.budget
+        return 0.0
+
+    async def _acquire(self, weight: float, priority: int):
+        weight = min(weight, self.budget)
+        ticket = (priority, next(self._seq))
+        heapq.heappush(self._queue, ticket)
+        try:
+            while True:
+                if self._banned and self._blocked_until > time.monotonic():
+                    raise RestBanned(
+                        f"IP banned by Binance for another "
+                        f"{self._blocked_until - time.monotonic():.0f}s"
+                    )
+
+                changed = self._changed
+                delay = None
+                if self._queue[0] == ticket and self._in_flight < MAX_CONNECTIONS:
+                    self._refill()
+                    delay = self._ready_in(weight)
+                    if delay == 0:
+                        heapq.heappop(self._queue)
+                        self.tokens -= weight
+                        self._in_flight += 1
+                        self._notify()
+                        return
+
+                try:
+                    await asyncio.wait_for(changed.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+        except BaseException:
+            if ticket in self._queue:
+                self._queue.remove(ticket)
+                heapq.heapify(self._queue)
+                self._notify()
+            raise
+
+    def _release(self):
+        self._in_flight -= 1
+        self._notify()
+
+    def _account(self, r):
+        used = r.headers.get(USED_WEIGHT_HEADER)
+        if used is None:
+            return
+        try:
+            used = int(used)
+        except ValueError:
+            return
+        self.used_weight = used
+        self._refill()
+        self.tokens = min(self.tokens, self.budget - used)
+
+    def _block(self, r):
+        self.throttled += 1
+        if self._blocked_until <= time.monotonic():
+            self._banned = False
+        self.tokens = min(self.tokens, 0)
+        self._blocked_until = max(self._blocked_until, time.monotonic() + _retry_after(r))
+        if r.status == 418:
+            self._banned = True
+
+    # ---------- public ----------
+
+    async def get(self, path: str, params: dict | None = None,
+                  weight: float | None = None, priority: int = PRIORITY_NORMAL):
+        """GET base_url + path, decoded JSON; raises on HTTP errors"""
+        if weight is None:
+            weight = ENDPOINT_WEIGHT.get(path, 1)
+        url = f"{self.base_url}{path}"
+
+        for attempt in range(MAX_RETRIES + 1):
+            await self._acquire(weight, priority)
+            try:
+                async with self.session().get(url, params=params) as r:
+                    self.requests += 1
+                    self._account(r)
+
+                    if r.status in (418, 429):
+                        self._block(r)
+                        if r.status == 418 or attempt == MAX_RETRIES:
+                            r.raise_for_status()
+                        continue
+
+                    r.raise_for_status()
+                    return await r.json(loads=loads, content_type=None)
+            finally:
+                self._release()
+
+
+rest = RestClient()
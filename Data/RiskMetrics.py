@@ -0,0 +1,263 @@
+import xloil as xlo
+import math
+import numpy as np
+from KlineStream import (
+    fetch_klines,
+    kline_updates,
+    interval_ms,
+    MAX_REST_LIMIT,
+)
+from CryptoPriceOnDate import excel_date_to_datetime, to_ms
+from MarketStore import market
+from StreamHub import Backoff
+from RestClient import PRIORITY_BULK, PRIORITY_LIVE, is_permanent, error_text
+
+DAY_MS = interval_ms("1d")
+PERIODS_PER_YEAR = 365      # crypto trades every day
+
+
+# ============================
+# REST History
+# ============================
+
+async def fetch_daily_candles(symbol: str, start_ms: int, end_ms: int | None = None,
+                              priority: int = PRIORITY_BULK) -> list:
+    """Closed daily candles from REST (paged), written to the local store"""
+    out = []
+    cursor = start_ms
+
+    while True:
+        page = await fetch_klines(
+            symbol, "1d", MAX_REST_LIMIT,
+            start_ms=cursor, end_ms=end_ms, priority=priority
+        )
+        out.extend(d for d in page if d["IsClosed"])
+
+        if len(page) < MAX_REST_LIMIT:
+            break
+        cursor = page[-1]["OpenTime"] + DAY_MS
+
+    market.submit(market.put_klines, symbol, "1d", out)
+    return out
+
+
+async def fetch_daily_closes(symbol: str, start_ms: int, end_ms: int | None = None,
+                             priority: int = PRIORITY_BULK):
+    """
+    Closed daily candles from start_ms onward -> (open_times, closes) arrays.
+
+    The contiguous run of candles already in the local store is reused;
+    only the days before it (normally none) and after it are fetched.
+    """
+    first_open = -(-start_ms // DAY_MS) * DAY_MS
+
+    run = []
+    for row in await market.call(market.klines, symbol, "1d", first_open, end_ms):
+        if run and row[0] != run[-1][0] + DAY_MS:
+            break
+        run.append(row)
+
+    if not run:
+        candles = await fetch_daily_candles(symbol, start_ms, end_ms, priority)
+        pairs = [(d["OpenTime"], d["Close"]) for d in candles]
+    else:
+        head = []
+        if run[0][0] > first_open:
+            head = await fetch_daily_candles(symbol, start_ms, run[0][0] - 1, priority)
+
+        tail = []
+        tail_start = run[-1][0] + DAY_MS
+        if end_ms is None or tail_start <= end_ms:
+            tail = await fetch_daily_candles(symbol, tail_start, end_ms, priority)
+
+        pairs = (
+            [(d["OpenTime"], d["Close"]) for d in head]
+            + [(row[0], row[4]) for row in run]
+            + [(d["OpenTime"], d["Close"]) for d in tail]
+        )
+
+    opens = np.array([t for t, _ in pairs], dtype=np.int64)
+    closes = np.array([c for _, c in pairs], dtype=float)
+    return opens, closes
+
+
+# ============================
+# Risk State
+# ============================
+
+class RiskState:
+    """
+    Running sums behind the risk metrics.
+
+    from_closes() builds the state from full history with NumPy in one
+    pass; add() folds in one new daily close in O(1), so a candle close
+    never recomputes the history.
+    """
+
+    def __init__(self):
+        self.n_closes = 0
+        self.first_close = None
+        self.last_close = None
+        self.last_open = None
+        self.sum_r = 0.0            # sum of log returns
+        self.sum_r2 = 0.0           # sum of squared log returns
+        self.sum_down2 = 0.0        # sum of squared negative log returns
+        self.peak = None
+        self.max_drawdown = 0.0
+
+    @classmethod
+    def from_closes(cls, opens: np.ndarray, closes: np.ndarray):
+        st = cls()
+        if len(closes) == 0:
+            return st
+
+        r = np.diff(np.log(closes))
+        down = np.minimum(r, 0.0)
+        peak = np.maximum.accumulate(closes)
+        drawdown = closes / peak - 1.0
+
+        st.n_closes = len(closes)
+        st.first_close = float(closes[0])
+        st.last_close = float(closes[-1])
+        st.last_open = int(opens[-1])
+        st.sum_r = float(r.sum())
+        st.sum_r2 = float((r * r).sum())
+        st.sum_down2 = float((down * down).sum())
+        st.peak = float(peak[-1])
+        st.max_drawdown = float(drawdown.min())
+        return st
+
+    def add(self, open_time: int, close: float):
+        if self.last_close is None:
+            self.first_close = self.peak = close
+        else:
+            r = math.log(close / self.last_close)
+            self.sum_r += r
+            self.sum_r2 += r * r
+            if r < 0:
+                self.sum_down2 += r * r
+
+        self.n_closes += 1
+        self.last_close = close
+        self.last_open = open_time
+        self.peak = max(self.peak, close)
+        self.max_drawdown = min(self.max_drawdown, close / self.peak - 1.0)
+
+    def metrics(self, risk_free_rate: float = 0.0) -> list:
+        n = self.n_closes - 1           # number of returns
+        if n < 2:
+            return []
+
+        mean = self.sum_r / n
+        var = max((self.sum_r2 - n * mean * mean) / (n - 1), 0.0)
+        vol = math.sqrt(var * PERIODS_PER_YEAR)
+        downside = math.sqrt(self.sum_down2 / n * PERIODS_PER_YEAR)
+        excess = mean * PERIODS_PER_YEAR - risk_free_rate
+
+        years = n / PERIODS_PER_YEAR
+        cagr = (self.last_close / self.first_close) ** (1.0 / years) - 1.0
+
+        return [
+            ["Observations", self.n_closes],
+            ["LastClose", self.last_close],
+            ["TotalReturn", self.last_close / self.first_close - 1.0],
+            ["CAGR", cagr],
+            ["AnnualizedVolatility", vol],
+            ["SharpeRatio", excess / vol if vol else ""],
+            ["SortinoRatio", excess / downside if downside else ""],
+            ["MaxDrawdown", self.max_drawdown],
+            ["CurrentDrawdown", self.last_close / self.peak - 1.0],
+        ]
+
+
+HEADER = ["Metric", "Value"]
+
+
+def risk_table(state: RiskState, risk_free_rate: float, status: str) -> list:
+    return [HEADER, *state.metrics(risk_free_rate), ["STREAM_STATUS", status]]
+
+
+# ============================
+# xlOil Function
+# ============================
+
+@xlo.func
+async def RiskMetrics(
+    symbol: str,
+    start_date,
+    risk_free_rate: float = 0.0
+):
+    """
+    Daily-close risk metrics from start_date to today:
+    CAGR, annualized volatility (log returns, sqrt(365)), Sharpe, Sortino,
+    max / current drawdown. Updates when a new daily candle closes.
+
+    Excel:
+    =RiskMetrics("BTCUSDT", "2021-01-01")
+    =RiskMetrics("BTCUSDT", G11, 0.05)
+    """
+
+    symbol = symbol.upper()
+    try:
+        start_ms = to_ms(excel_date_to_datetime(start_date))
+    except (ValueError, OverflowError):
+        yield "Invalid start_date"
+        return
+
+    backoff = Backoff()
+    while True:
+        try:
+            opens, closes = await fetch_daily_closes(symbol, start_ms)
+            break
+        except Exception as e:
+            # a bad symbol / start date will not get better: say so and stop
+            yield error_text(e)
+            if is_permanent(e):
+                return
+            await backoff.sleep()
+
+    state = RiskState.from_closes(opens, closes)
+
+    last_table = risk_table(state, risk_free_rate, "LIVE")
+    yield last_table
+
+    # a small live buffer is enough: only new closes are folded in
+    async for event, klines in kline_updates(symbol, "1d", 3, max_hz=0):
+
+        if event in ("down", "stale"):
+            status = "DISCONNECTED" if event == "down" else "STALE"
+            yield last_table[:-1] + [["STREAM_STATUS", status]]
+            continue
+
+        # live ticks do not change daily-close metrics
+        if event == "tick":
+            continue
+
+        new = [
+            d for d in klines.candles
+            if d["IsClosed"] and (state.last_open is None or d["OpenTime"] > state.last_open)
+        ]
+        if not new:
+            if event == "load":
+                last_table = risk_table(state, risk_free_rate, "LIVE")
+                yield last_table
+            continue
+
+        # outage longer than the live buffer -> fetch only the hole
+        if state.last_open is not None and new[0]["OpenTime"] > state.last_open + DAY_MS:
+            try:
+                gap_opens, gap_closes = await fetch_daily_closes(
+                    symbol, state.last_open + DAY_MS,
+                    end_ms=new[0]["OpenTime"] - 1, priority=PRIORITY_LIVE
+                )
+            except Exception:
+                # keep the state contiguous; retried on the next event
+                continue
+            for t, c in zip(gap_opens, gap_closes):
+                state.add(int(t), float(c))
+
+        for d in new:
+            state.add(d["OpenTime"], d["Close"])
+
+        last_table = risk_table(state, risk_free_rate, "LIVE")
+        yield last_table
@@ -0,0 +1,401 @@
+import asyncio
+import websockets
+import json
+import random
+import time
+from Decoding import loads
+from Metrics import metrics, event_time, SAMPLE_EVERY
+
+# ============================
+# Binance Combined Stream Endpoint
+# ============================
+
+BINANCE_WS_BASE = "wss://stream.binance.com:9443"
+
+# reconnect delays: 1s, 2s, 4s ... capped, each with jitter
+BACKOFF_BASE = 1.0
+BACKOFF_CAP = 60.0
+
+# frames held per subscriber before the oldest is dropped (a cell that
+# is blocked or recalculating must not grow memory without bound)
+QUEUE_MAXSIZE = 10_000
+
+# Binance drops a connection that sends more than 5 messages a second
+# (SUBSCRIBE / UNSUBSCRIBE, pings and pongs all count); control messages
+# are batched and kept below that, leaving room for the keepalive
+CONTROL_MAX_HZ = 4
+
+
+class StreamDisconnected(Exception):
+    """Raised inside a subscriber when the shared connection drops"""
+
+
+class Backoff:
+    """
+    Jittered exponential reconnect delay.
+
+    next() returns a delay in [d/2, d] with d = base * 2**failures
+    (capped), so many formulas that lost the same connection do not
+    reconnect in lockstep. reset() after a successful (re)connect.
+    """
+
+    def __init__(self, base: float = BACKOFF_BASE, cap: float = BACKOFF_CAP):
+        self.base = base
+        self.cap = cap
+        self.failures = 0
+
+    def next(self) -> float:
+        d = min(self.cap, self.base * 2 ** self.failures)
+        self.failures += 1
+        return d / 2 + random.uniform(0, d / 2)
+
+    def reset(self):
+        self.failures = 0
+
+    async def sleep(self):
+        await asyncio.sleep(self.next())
+
+
+# ============================
+# Subscriber
+# ============================
+
+class Subscription:
+    """
+    One xlOil generator's view of a stream.
+
+    Usage:
+        async with hub.subscribe("btcusdt@ticker") as sub:
+            async for msg in sub:
+                ...
+
+    The queue holds at most `maxsize` frames; when a slow consumer falls
+    that far behind the oldest frame is dropped (counted in `dropped`).
+    maxsize=1 keeps only the latest frame, for snapshot-style streams
+    where each frame replaces the previous one.
+    """
+
+    def __init__(self, hub, stream: str, maxsize: int = QUEUE_MAXSIZE):
+        self.hub = hub
+        self.stream = stream
+        self.queue = asyncio.Queue(max(1, maxsize))
+        self.dropped = 0
+
+    async def __aenter__(self):
+        await self.hub._add(self)
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.hub._remove(self)
+
+    def put(self, item):
+        queue = self.queue
+        if queue.full():
+            queue.get_nowait()
+            self.dropped += 1
+        queue.put_nowait(item)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        item = await self.queue.get()
+        if isinstance(item, BaseException):
+            raise item
+        return item
+
+
+# ============================
+# Reconnecting Subscription
+# ============================
+
+class StreamLink:
+    """
+    A stream function's subscription across reconnects: the backoff,
+    the disconnect accounting and the resubscribe every stream shares.
+
+    Usage:
+        link = hub.link("btcusdt@kline_1m")
+        while True:
+            async with link:
+                ...                         # REST load (frames queue up)
+                async for msg in link:
+                    ...
+            yield "down", ...               # link.error says why
+
+    - entering subscribes; after a failed attempt it first waits out a
+      jittered, growing delay
+    - the first frame of an attempt resets the delay: the stream is
+      really back, not just reconnected
+    - any Exception raised in the block (StreamDisconnected, a failed
+      REST load, ...) ends the attempt: it is kept in `error`, counted
+      in the stream's metrics (hub drops already are, by the hub) and
+      suppressed, so the caller continues with its "down" state
+    """
+
+    def __init__(self, hub, stream: str, maxsize: int = QUEUE_MAXSIZE):
+        self.hub = hub
+        self.stream = stream
+        self.maxsize = maxsize
+        self.backoff = Backoff()
+        self.error = None
+        self._sub = None
+        self._live = False
+
+    async def __aenter__(self):
+        if self.error is not None:
+            await self.backoff.sleep()
+        self.error = None
+        self._live = False
+        self._sub = self.hub.subscribe(self.stream, self.maxsize)
+        await self._sub.__aenter__()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        sub, self._sub = self._sub, None
+        await sub.__aexit__(exc_type, exc, tb)
+        if not isinstance(exc, Exception):
+            # normal exit, or the formula went away (cancel / close)
+            return False
+
+        self.error = exc
+        if not isinstance(exc, StreamDisconnected):
+            metrics.stream(self.stream).disconnected(exc)
+        return True
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        item = await self._sub.__anext__()
+        if not self._live:
+            self._live = True
+            self.backoff.reset()
+        return item
+
+
+# ============================
+# Process-wide Hub
+# ============================
+
+class StreamHub:
+    """
+    Multiplex every subscribed stream name over ONE Binance combined-stream
+    connection (/stream?streams=a/b/c).
+
+    - stream names are reference counted: the first subscriber queues a
+      SUBSCRIBE, the last one leaving queues an UNSUBSCRIBE; queued
+      changes go out as one params list per message, at most
+      CONTROL_MAX_HZ messages a second, and the socket is closed when
+      no stream is left
+    - each frame is parsed once (Decoding.loads) and the `data` payload
+      is fanned out to every subscriber queue of that stream
+    - on a dropped connection every subscriber gets StreamDisconnected,
+      so the calling xlOil function can run its normal recovery path
+    """
+
+    def __init__(self, base_url: str = BINANCE_WS_BASE):
+        self.base_url = base_url
+        self._subs = {}        # stream name -> set[Subscription]
+        self._ws = None
+        self._task = None
+        self._next_id = 0
+        self._closing = False
+        self._pending = {}     # stream name -> "SUBSCRIBE" / "UNSUBSCRIBE" not sent yet
+        self._flusher = None
+        self._next_send = 0.0  # monotonic time the next control message may go
+        # lives on the hub, not in _run: the task ends whenever the last
+        # formula leaves after a drop, and must not start over at 1s
+        self._backoff = Backoff()
+
+    # ---------- public ----------
+
+    def subscribe(self, stream: str, maxsize: int = QUEUE_MAXSIZE) -> Subscription:
+        return Subscription(self, stream, maxsize)
+
+    def link(self, stream: str, maxsize: int = QUEUE_MAXSIZE) -> StreamLink:
+        return StreamLink(self, stream, maxsize)
+
+    @property
+    def streams(self) -> list:
+        return list(self._subs)
+
+    @property
+    def connected(self) -> bool:
+        return self._ws is not None
+
+    def refcount(self, stream: str) -> int:
+        return len(self._subs.get(stream, ()))
+
+    # ---------- subscription bookkeeping ----------
+
+    async def _add(self, sub: Subscription):
+        subs = self._subs.get(sub.stream)
+        first = subs is None
+        if first:
+            subs = self._subs[sub.stream] = set()
+        subs.add(sub)
+
+        if self._task is None or self._task.done():
+            self._task = asyncio.ensure_future(self._run())
+        elif first:
+            self._queue(sub.stream, "SUBSCRIBE")
+
+    async def _remove(self, sub: Subscription):
+        subs = self._subs.get(sub.stream)
+        if not subs or sub not in subs:
+            return
+
+        subs.discard(sub)
+        if subs:
+            return
+
+        del self._subs[sub.stream]
+        ws = self._ws
+        if ws is None:
+            return
+
+        if self._subs:
+            self._queue(sub.stream, "UNSUBSCRIBE")
+            return
+
+        # last formula gone -> drop the socket
+        self._pending.clear()
+        self._closing = True
+        try:
+            await ws.close()
+        except Exception:
+            pass
+
+    def _queue(self, stream: str, method: str):
+        """Queue a SUBSCRIBE / UNSUBSCRIBE for the open connection"""
+        if self._ws is None or self._closing:
+            # _run sends the current stream list when it (re)connects
+            return
+        if self._pending.get(stream, method) != method:
+            # subscribed and unsubscribed again before anything was sent
+            del self._pending[stream]
+        else:
+            self._pending[stream] = method
+        if self._pending and (self._flusher is None or self._flusher.done()):
+            self._flusher = asyncio.ensure_future(self._flush())
+
+    async def _flush(self):
+        """Send queued changes, one params list per method, rate limited"""
+        interval = 1.0 / CONTROL_MAX_HZ
+        while self._pending and self._ws is not None:
+            wait = self._next_send - time.monotonic()
+            if wait > 0:
+                # changes keep queueing meanwhile and go out in one message
+                await asyncio.sleep(wait)
+                continue
+
+            pending = self._pending
+            method = "UNSUBSCRIBE" if "UNSUBSCRIBE" in pending.values() else "SUBSCRIBE"
+            params = [s for s, m in pending.items() if m == method]
+            for s in params:
+                del pending[s]
+
+            self._next_send = time.monotonic() + interval
+            try:
+                await self._send(method, params)
+            except Exception:
+                # connection is dying; _run resubscribes on reconnect
+                return
+
+    async def _send(self, method: str, params: list):
+        self._next_id += 1
+        await self._ws.send(json.dumps({
+            "method": method,
+            "params": params,
+            "id": self._next_id
+        }))
+
+    # ---------- connection loop ----------
+
+    def _fan_out(self, stream: str, item):
+        for sub in tuple(self._subs.get(stream, ())):
+            sub.put(item)
+
+    async def _run(self):
+        self._closing = False
+        backoff = self._backoff
+        while self._subs:
+            streams = list(self._subs)
+            url = f"{self.base_url}/stream?streams={'/'.join(streams)}"
+            error = None
+
+            try:
+                async with websockets.connect(
+                    url,
+                    ping_interval=20,
+                    ping_timeout=10
+                ) as ws:
+                    self._ws = ws
+
+                    # formulas added / removed while we were connecting
+                    for s in self._subs:
+                        if s not in streams:
+                            self._queue(s, "SUBSCRIBE")
+                    for s in streams:
+                        if s not in self._subs:
+                            self._queue(s, "UNSUBSCRIBE")
+
+                    # per frame: one counter bump; timings on every SAMPLE_EVERY-th
+                    registry = metrics.streams
+                    sample_mask = SAMPLE_EVERY - 1
+                    frames = 0
+
+                    async for raw in ws:
+                        frames += 1
+                        t0 = 0.0 if frames & sample_mask else time.perf_counter()
+
+                        msg = loads(raw)
+
+                        # SUBSCRIBE / UNSUBSCRIBE acks have no stream
+                        stream = msg.get("stream") if isinstance(msg, dict) else None
+                        if stream is None:
+                            continue
+
+                        # frames flow again: a connection that opens and then
+                        # drops straight away keeps backing off
+                        if backoff.failures:
+                            backoff.reset()
+
+                        data = msg["data"]
+                        m = registry.get(stream) or metrics.stream(stream)
+                        m.frames += 1
+                        if t0 or m.want_sample:
+                            m.sampled(
+                                time.time(), event_time(data),
+                                time.perf_counter() - t0 if t0 else None
+                            )
+
+                        self._fan_out(stream, data)
+
+            except Exception as e:
+                error = e
+
+            finally:
+                self._ws = None
+                # the next connection URL carries the current stream list
+                self._pending.clear()
+
+            if not self._subs:
+                break
+
+            if self._closing:
+                # we closed it ourselves but a formula re-subscribed meanwhile
+                self._closing = False
+                continue
+
+            # tell every live subscriber; each one unsubscribes and recovers
+            reason = StreamDisconnected(str(error) if error else "connection closed")
+            for stream in list(self._subs):
+                metrics.stream(stream).disconnected(reason)
+                self._fan_out(stream, reason)
+
+            await backoff.sleep()
+
+
+hub = StreamHub()
@@ -0,0 +1,84 @@
+import xloil as xlo
+import asyncio
+from StreamHub import hub
+from Metrics import metrics, MetricsReader
+from ExcelTime import excel_time
+
+
+HEADER = [
+    "Stream",
+    "Status",
+    "Subscribers",
+    "Messages",
+    "MsgPerSec",
+    "LagMs",
+    "LagMaxMs",
+    "ParseUs",
+    "ApplyUs",
+    "BuildMs",
+    "Yields",
+    "Reconnects",
+    "LastError",
+    "LastErrorIST",
+    "LastMessageIST",
+]
+
+DEFAULT_REFRESH = 1.0
+
+
+def _num(v, digits=2):
+    return "" if v is None else round(v, digits)
+
+
+def _status(stream: str) -> str:
+    if hub.refcount(stream) == 0:
+        return "IDLE"
+    return "LIVE" if hub.connected else "CONNECTING"
+
+
+def stats_table(reader: MetricsReader) -> list:
+    rows = [HEADER]
+    for m, rate, lag_max in reader.read():
+        rows.append([
+            m.name,
+            _status(m.name),
+            hub.refcount(m.name),
+            m.frames,
+            _num(rate),
+            _num(m.lag_ms),
+            _num(lag_max),
+            _num(m.parse_us),
+            _num(m.apply_us),
+            _num(m.build_ms, 3),
+            m.yields,
+            m.reconnects,
+            m.last_error,
+            "" if m.last_error_at is None else excel_time(int(m.last_error_at * 1000)),
+            "" if m.last_recv is None else excel_time(int(m.last_recv * 1000)),
+        ])
+    return rows
+
+
+@xlo.func
+async def StreamStats(refresh_seconds: float = DEFAULT_REFRESH):
+    """
+    Health of every stream used in this Excel session, one row per
+    Binance stream: subscribers, messages and msgs/sec, event-to-receive
+    lag (Binance E/T vs local clock, so clock skew shows up here too),
+    decode / apply / table-build times, Excel yields, reconnects and the
+    last error. LagMaxMs and MsgPerSec cover the time since this cell's
+    previous refresh (to the second for LagMaxMs); other StreamStats cells
+    do not affect them.
+
+    Excel (Data_Status sheet):
+    =StreamStats()
+    =StreamStats(5)
+    """
+
+    refresh_seconds = max(0.2, float(refresh_seconds or DEFAULT_REFRESH))
+
+    # this cell's own rate / lag-max window
+    reader = metrics.reader()
+    while True:
+        yield stats_table(reader)
+        await asyncio.sleep(refresh_seconds)
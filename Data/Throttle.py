@@ -0,0 +1,69 @@
+import asyncio
+import time
+
+# ============================
+# Emission Throttle
+# ============================
+
+# Excel only repaints a few times per second
+DEFAULT_MAX_HZ = 4.0
+
+
+class Throttle:
+    """
+    Limit how often a stream function yields to Excel.
+
+    Internal state is still updated for every message; only the snapshot
+    emission is rate limited. The latest state always gets out: when an
+    update was held back, messages() wakes up once it falls due even if
+    no new frame arrives. Urgent events (candle close, status change)
+    bypass the limit.
+
+    max_hz <= 0 disables throttling (emit on every message).
+
+    Usage:
+        throttle = Throttle(max_hz)
+        async for msg in throttle.messages(sub):
+            if msg is not None:
+                apply(msg)
+            if throttle.ready(urgent=msg is None or important):
+                yield snapshot()
+    """
+
+    def __init__(self, max_hz: float = DEFAULT_MAX_HZ):
+        self.min_interval = 1.0 / max_hz if max_hz and max_hz > 0 else 0.0
+        self.pending = False
+        self._last = float("-inf")
+
+    def ready(self, urgent: bool = False) -> bool:
+        """Call after applying an update; True means emit a snapshot now"""
+        now = time.monotonic()
+        if urgent or now - self._last >= self.min_interval:
+            self._last = now
+            self.pending = False
+            return True
+
+        self.pending = True
+        return False
+
+    def timeout(self):
+        """Seconds until a held-back snapshot is due, None if nothing is held back"""
+        if not self.pending:
+            return None
+        return max(0.0, self.min_interval - (time.monotonic() - self._last))
+
+    async def messages(self, source):
+        """
+        Iterate an async iterator (hub subscription); yields None when a
+        held-back snapshot falls due before the next message.
+        """
+        while True:
+            timeout = self.timeout()
+            if timeout is None:
+                yield await source.__anext__()
+                continue
+
+            try:
+                yield await asyncio.wait_for(source.__anext__(), timeout)
+            except asyncio.TimeoutError:
+                yield None
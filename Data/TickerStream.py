@@ -1,10 +1,9 @@
 import xloil
-import asyncio
 import time
-import json
-from websocket import create_connection
-from datetime import datetime
-import sys
+from StreamHub import hub
+from Metrics import metrics
+from Throttle import Throttle, DEFAULT_MAX_HZ
+from ExcelTime import excel_time
 
 Ticker_Field_Name = {
     "Event time": "E", # =TickerStream("btcusdt", "Event time")
@@ -35,7 +34,7 @@ def safe_float(x):
 def _format_ticker_value(key: str, val):
     """
     Normalize/format values based on Binance key:
-      - timestamps (E, O, C) -> "YYYY-MM-DD HH:MM:SS" (UTC)
+      - timestamps (E, O, C) -> Excel date/time in the display timezone
       - numeric strings -> float
       - integer ids/counters -> int
       - otherwise -> return original
@@ -44,13 +43,10 @@ def _format_ticker_value(key: str, val):
         return None
 
     try:
-        # timestamps in ms -> formatted datetime string
+        # timestamps in ms -> Excel serial date (format the cell as a date)
         if key in ("E", "O", "C"):
-            # Binance sends epoch in milliseconds
-            # convert to seconds and format as UTC
-            ms = int(val)
-            dt = datetime.utcfromtimestamp(ms / 1000.0)
-            return dt.strftime("%Y-%m-%d %H:%M:%S")
+            # Binance sends epoch in milliseconds (UTC)
+            return excel_time(int(val))
 
         # integer id/counters
         if key in ("F", "L", "n"):
@@ -72,80 +68,102 @@ def _format_ticker_value(key: str, val):
         # if formatting fails, return original raw value
         return val
 
-def BinanceTickerStream(symbol: str, field: str):
+def _resolve_fields(fields) -> list:
+    """
+    Friendly names / raw keys -> Binance keys.
+    Accepts "Last price,High price" or a range of names.
+    """
+    if isinstance(fields, str):
+        names = fields.split(",")
+    else:
+        names = [x for x in getattr(fields, "flat", fields)]
+    return [
+        Ticker_Field_Name.get(str(n).strip(), str(n).strip())
+        for n in names
+        if n is not None and str(n).strip()
+    ]
+
+
+async def ticker_messages(symbol: str, max_hz: float = DEFAULT_MAX_HZ):
+    """
+    Yield the latest @ticker payload for `symbol` at most max_hz times
+    per second, reconnecting forever.
+
+    All cells of a symbol ride the hub's single `<symbol>@ticker`
+    subscription: one Binance stream, one parse, fanned out to each cell.
+    """
+    stream = f"{symbol.lower()}@ticker"
+
+    # every @ticker frame is a full snapshot: only the latest matters
+    link = hub.link(stream, maxsize=1)
+
     while True:
-        ws = None
-        try:
-            ws = create_connection(f"wss://stream.binance.com:9443/ws/{symbol}@ticker", timeout=10)
-            while True:
-                raw = ws.recv()
-                if not raw:
-                    raise RuntimeError("empty message / closed socket")
-                try:
-                    msg = json.loads(raw)
-                except Exception:
-                    # skip malformed frames
-                    continue
-
-                # Use the requested field key from the message
-                if field in msg:
-                    raw_value = msg.get(field)
-                else:
-                    # If user passed a friendly name (should already have been mapped),
-                    # or the key doesn't exist, return an 'Invalid Field' marker.
-                    raw_value = "Invalid Field"
-
-                # Format the raw value into appropriate datatype/representation
-                dynamic_value = _format_ticker_value(field, raw_value)
-
-                yield dynamic_value
-
-        except Exception as e:
-            print(f"[live_btc_stream] websocket error: {e}. Reconnecting in 3s...")
-            try:
-                if ws:
-                    ws.close()
-            except Exception:
-                pass
-            time.sleep(3)
-            continue
-       
+        throttle = Throttle(max_hz)
+        latest = None
+
+        async with link:
+            async for msg in throttle.messages(link):
+                if msg is not None:
+                    latest = msg
+                if throttle.ready(urgent=msg is None):
+                    yield latest
+
+        print(f"[TickerStream] websocket error: {link.error}. Reconnecting...")
+
+
+def _field_value(msg: dict, key: str):
+    # Use the requested field key from the message
+    if key in msg:
+        raw_value = msg.get(key)
+    else:
+        # If user passed a friendly name (should already have been mapped),
+        # or the key doesn't exist, return an 'Invalid Field' marker.
+        raw_value = "Invalid Field"
+
+    # Format the raw value into appropriate datatype/representation
+    return _format_ticker_value(key, raw_value)
+
+
 @xloil.func
-async def TickerStream(symbol: str, field: str):
+async def TickerStream(symbol: str, field: str, max_hz: float = DEFAULT_MAX_HZ):
     """
     Stream a single Binance @ticker field to Excel.
     Accepts a human-friendly name (e.g. "High price") OR the raw Binance key (e.g. "h").
     """
     # map friendly name to Binance key if needed
     key = Ticker_Field_Name.get(field, field)
+    stats = metrics.stream(f"{symbol.lower()}@ticker")
 
-    # ensure symbol lowercased for Binance ws path
-    res = BinanceTickerStream(symbol.lower(), key)
+    last = None
+    async for msg in ticker_messages(symbol, max_hz):
+        t0 = time.perf_counter()
+        value = _field_value(msg, key)
 
-    try:
-        while True:
-            try:
-                # run blocking generator in thread and await the result
-                value = await asyncio.to_thread(next, res)
-            except StopIteration:
-                return
-
-            # yield the concrete value back to Excel (string/number)
+        # unchanged value -> no Excel write
+        if value != last:
+            last = value
+            stats.built(time.perf_counter() - t0)
             yield value
 
-            # breathe for the event loop
-            await asyncio.sleep(0)
-
-    except asyncio.CancelledError:
-        # best-effort cleanup
-        try:
-            await asyncio.to_thread(getattr, res, "close")
-        except Exception:
-            pass
-        return
 
-    except Exception as e:
-        # present error text to Excel instead of raising an exception
-        yield f"Error: {e}"
-        return
+@xloil.func
+async def TickerStreamFields(symbol: str, fields, max_hz: float = DEFAULT_MAX_HZ):
+    """
+    Stream several @ticker fields of one symbol as a single row.
 
+    Excel:
+    =TickerStreamFields("btcusdt", "Last price,High price,Low price")
+    =TickerStreamFields("btcusdt", B1:F1)
+    """
+    keys = _resolve_fields(fields)
+    stats = metrics.stream(f"{symbol.lower()}@ticker")
+
+    last = None
+    async for msg in ticker_messages(symbol, max_hz):
+        t0 = time.perf_counter()
+        row = [_field_value(msg, key) for key in keys]
+
+        if row != last:
+            last = row
+            stats.built(time.perf_counter() - t0)
+            yield [row]
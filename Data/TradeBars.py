@@ -0,0 +1,238 @@
+import xloil as xlo
+import time
+from collections import deque
+from aggTrade import aggtrade_updates
+from ExcelTime import excel_time
+from Metrics import metrics
+from Throttle import DEFAULT_MAX_HZ
+
+# ============================
+# Settings
+# ============================
+
+DEFAULT_BARS = 200
+
+# history replayed into the bars on start (and after a long outage)
+DEFAULT_MINUTES = 5.0
+
+# bar_type -> default size: seconds, trades, base volume, quote volume
+BAR_SIZES = {
+    "time": 1.0,
+    "tick": 100,
+    "volume": 10.0,
+    "dollar": 1_000_000.0,
+}
+
+HEADER = [
+    "BarStartIST",
+    "BarEndIST",
+    "Open",
+    "High",
+    "Low",
+    "Close",
+    "Volume",
+    "QuoteVolume",
+    "BuyVolume",
+    "SellVolume",
+    "VWAP",
+    "Trades",
+    "FirstAggTradeID",
+    "LastAggTradeID",
+    "IsClosed",
+]
+
+
+# ============================
+# Bars
+# ============================
+
+class Bar:
+    """OHLCV of consecutive trades; add() is O(1)"""
+
+    __slots__ = (
+        "start", "end", "open", "high", "low", "close",
+        "volume", "quote", "buy_volume", "sell_volume",
+        "trades", "first_id", "last_id",
+    )
+
+    def __init__(self, start: int, end: int, d):
+        p = d["Price"]
+        self.start = start
+        self.end = end
+        self.open = self.high = self.low = self.close = p
+        self.volume = self.quote = self.buy_volume = self.sell_volume = 0.0
+        self.trades = 0
+        self.first_id = d["AggTradeID"]
+        self.last_id = self.first_id
+
+    def add(self, d):
+        p = d["Price"]
+        q = d["Quantity"]
+        if p > self.high:
+            self.high = p
+        elif p < self.low:
+            self.low = p
+        self.close = p
+        self.volume += q
+        self.quote += p * q
+        # buyer is the maker -> the seller hit the bid
+        if d["IsBuyerMaker"]:
+            self.sell_volume += q
+        else:
+            self.buy_volume += q
+        self.trades += 1
+        self.last_id = d["AggTradeID"]
+
+    def row(self, closed: bool) -> list:
+        return [
+            excel_time(self.start), excel_time(self.end),
+            self.open, self.high, self.low, self.close,
+            self.volume, self.quote, self.buy_volume, self.sell_volume,
+            self.quote / self.volume if self.volume else self.close,
+            self.trades, self.first_id, self.last_id, closed,
+        ]
+
+
+class BarBuilder:
+    """
+    Streaming bar aggregator.
+
+    - "time":   epoch-aligned buckets of `size` seconds (0.25 = 250 ms);
+                a bucket without trades has no bar
+    - "tick":   `size` aggTrades per bar
+    - "volume": bar closes once it holds >= `size` base volume
+    - "dollar": bar closes once it holds >= `size` quote volume
+
+    Trades are never split across bars. Closed bars are turned into Excel
+    rows once and kept in a deque of `limit`; the open bar is the last
+    row, rebuilt on each table().
+    """
+
+    def __init__(self, bar_type: str, size: float, limit: int = DEFAULT_BARS):
+        if bar_type not in BAR_SIZES:
+            raise ValueError(f"Unknown bar_type: {bar_type!r}")
+        if not size or size <= 0:
+            raise ValueError(f"Bar size must be positive: {size!r}")
+
+        self.bar_type = bar_type
+        self.size = size
+        self.size_ms = max(1, int(round(size * 1000)))
+        self.closed = deque(maxlen=max(1, limit))
+        self.bar = None
+
+    def reset(self):
+        self.closed.clear()
+        self.bar = None
+
+    def _close(self):
+        self.closed.append(self.bar.row(True))
+        self.bar = None
+
+    def add(self, d):
+        bar = self.bar
+        t = d["TradeTime"]
+
+        if self.bar_type == "time":
+            start = t - t % self.size_ms
+            if bar is not None and start > bar.start:
+                self._close()
+                bar = None
+            if bar is None:
+                bar = self.bar = Bar(start, start + self.size_ms - 1, d)
+            bar.add(d)
+            return
+
+        if bar is None:
+            bar = self.bar = Bar(t, t, d)
+        bar.add(d)
+        bar.end = t
+
+        if self.bar_type == "tick":
+            full = bar.trades >= self.size
+        elif self.bar_type == "volume":
+            full = bar.volume >= self.size
+        else:
+            full = bar.quote >= self.size
+        if full:
+            self._close()
+
+    def extend(self, trades):
+        for d in trades:
+            self.add(d)
+
+    def table(self, status_row: list) -> list:
+        rows = [HEADER, *self.closed]
+        if self.bar is not None:
+            rows.append(self.bar.row(False))
+        rows.append(status_row)
+        return rows
+
+
+def status_row(state: str) -> list:
+    return ["STREAM_STATUS", state] + [""] * (len(HEADER) - 2)
+
+
+# ============================
+# XlOil Streaming Function
+# ============================
+
+@xlo.func
+async def TradeBars(
+    symbol: str,
+    bar_type: str = "time",
+    size: float | None = None,
+    limit: int = DEFAULT_BARS,
+    minutes: float = DEFAULT_MINUTES,
+    max_hz: float = DEFAULT_MAX_HZ
+):
+    """
+    Live OHLCV bars built from the aggTrade stream.
+
+    bar_type / size:
+        time    seconds per bar, sub-second allowed (default 1)
+        tick    aggTrades per bar (default 100)
+        volume  base volume per bar (default 10)
+        dollar  quote volume per bar (default 1,000,000)
+
+    Excel:
+    =TradeBars("BTCUSDT")
+    =TradeBars("BTCUSDT", "time", 0.25)
+    =TradeBars("BTCUSDT", "dollar", 5000000, 500)
+
+    Each row has buy / sell volume (aggressor side from IsBuyerMaker),
+    VWAP and trade count; the last bar is still open. The last `minutes`
+    of trades are replayed into the bars on start. Only the bar table
+    goes to Excel, at most max_hz times per second.
+    """
+
+    bar_type = str(bar_type or "time").strip().lower()
+    if bar_type not in BAR_SIZES:
+        yield "Invalid bar_type"
+        return
+    if size is None or size == "":
+        size = BAR_SIZES[bar_type]
+
+    try:
+        bars = BarBuilder(bar_type, float(size), int(limit or DEFAULT_BARS))
+    except ValueError as e:
+        yield str(e)
+        return
+
+    last_table = None
+    stats = metrics.stream(f"{symbol.lower()}@aggTrade")
+
+    async for event, _, added, _ in aggtrade_updates(symbol, minutes, None, max_hz, rows=False):
+
+        if event in ("down", "stale"):
+            if last_table:
+                yield last_table[:-1] + [status_row("DISCONNECTED" if event == "down" else "STALE")]
+            continue
+
+        if event == "load":
+            bars.reset()
+
+        t0 = time.perf_counter()
+        bars.extend(added)
+        last_table = bars.table(status_row("LIVE"))
+        stats.built(time.perf_counter() - t0)
+        yield last_table
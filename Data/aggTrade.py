@@ -1,47 +1,21 @@
 import xloil as xlo
-import aiohttp
-import websockets
-import datetime as dt
-import json
 import asyncio
-
-# ============================
-# Binance Endpoints
-# ============================
-
-BINANCE_REST = "https://api.binance.com"
-BINANCE_WS   = "wss://stream.binance.com:9443/ws"
-
-
-# ============================
-# Time Helpers
-# ============================
-
-def to_ist(ms: int) -> dt.datetime:
-    """Convert milliseconds UTC → IST"""
-    return dt.datetime.utcfromtimestamp(ms / 1000) + dt.timedelta(hours=5, minutes=30)
+import time
+import numpy as np
+from collections import deque
+from StreamHub import hub
+from Metrics import metrics
+from Decoding import LazyRecord
+from Throttle import Throttle, DEFAULT_MAX_HZ
+from MarketStore import market, TradeRecorder
+from RestClient import rest, PRIORITY_LIVE, PRIORITY_BULK
+from Columnar import ColumnBuffer
+from ExcelTime import excel_time
 
 # ============================
 # Normalizers
 # ============================
 
-def normalize_aggtrade(t: dict) -> dict:
-    """Normalize aggTrade payload (REST + WS compatible)"""
-    return {
-        "TradeTimeIST": to_ist(int(t["T"])),
-        "Price": float(t["p"]),
-        "Quantity": float(t["q"]),
-        "AggTradeID": int(t["a"]),
-        "FirstTradeID": int(t["f"]),
-        "LastTradeID": int(t["l"]),
-        "IsBuyerMaker": t["m"],
-        "IsBestMatch": t["M"]
-    }
-
-# ============================
-# Table Helpers (UNCHANGED)
-# ============================
-
 HEADER = [
     "TradeTimeIST",
     "Price",
@@ -53,163 +27,474 @@ HEADER = [
     "IsBestMatch"
 ]
 
-def as_row(d: dict) -> list:
-    return [
-        d["TradeTimeIST"],
-        d["Price"],
-        d["Quantity"],
-        d["AggTradeID"],
-        d["FirstTradeID"],
-        d["LastTradeID"],
-        d["IsBuyerMaker"],
-        d["IsBestMatch"]
-    ]
+
+def _excel_time(v):
+    return excel_time(int(v))
+
+
+def _same(v):
+    return v
+
+
+class AggTradeRecord(LazyRecord):
+    """aggTrade payload (REST + WS share the same keys)"""
+    __slots__ = ()
+
+    FIELDS = {
+        "TradeTime": ("T", int),
+        "TradeTimeIST": ("T", _excel_time),
+        "Price": ("p", float),
+        "Quantity": ("q", float),
+        "AggTradeID": ("a", int),
+        "FirstTradeID": ("f", int),
+        "LastTradeID": ("l", int),
+        "IsBuyerMaker": ("m", _same),
+        "IsBestMatch": ("M", _same),
+    }
+    ROW_COLUMNS = HEADER
+
+
+# Excel columns as record fields; the trade time stays int64 ms until table()
+COLUMNS = (
+    ("TradeTime", np.int64, True),
+    ("Price", np.float64, False),
+    ("Quantity", np.float64, False),
+    ("AggTradeID", np.int64, False),
+    ("FirstTradeID", np.int64, False),
+    ("LastTradeID", np.int64, False),
+    ("IsBuyerMaker", np.bool_, False),
+    ("IsBestMatch", np.bool_, False),
+)
+
+
+def normalize_aggtrade(t: dict) -> AggTradeRecord:
+    """Normalize aggTrade payload (REST + WS compatible)"""
+    return AggTradeRecord(t)
+
+
+def as_row(d) -> list:
+    return d.row()
+
+# ============================
+# Rolling Time Window
+# ============================
+
+class TradeWindow:
+    """
+    Trades of the last N minutes, ordered by trade time.
+
+    - new trades are appended on the right
+    - trades older than (latest - window) are evicted from the left
+    - the Excel columns of each trade are written once into a ColumnBuffer
+      kept alongside (rows=False skips it for consumers that never show
+      raw trades)
+    - `limit` (optional) caps the row count; memory is bounded by the
+      window either way
+    """
+
+    def __init__(self, minutes: float, limit: int | None = None, rows: bool = True):
+        self.window_ms = int(minutes * 60 * 1000)
+        maxlen = limit if limit is not None and limit > 0 else None
+        self.trades = deque(maxlen=maxlen)
+        self.columns = ColumnBuffer(COLUMNS, maxlen=maxlen) if rows else None
+        self.last_id = -1
+
+    def __len__(self):
+        return len(self.trades)
+
+    def push(self, d: dict) -> list:
+        """Append one trade, return the trades that left the window"""
+        evicted = []
+        trades = self.trades
+
+        if trades.maxlen is not None and len(trades) == trades.maxlen:
+            evicted.append(trades[0])   # deque drops it on append
+
+        trades.append(d)
+        columns = self.columns
+        if columns is not None:
+            columns.append(d.pick(columns.fields))
+        self.last_id = max(self.last_id, d["AggTradeID"])
+
+        cutoff = d["TradeTime"] - self.window_ms
+        n = 0
+        while trades[0]["TradeTime"] < cutoff:
+            evicted.append(trades.popleft())
+            n += 1
+        if n and columns is not None:
+            columns.popleft(n)
+
+        return evicted
+
+    def extend(self, trades: list) -> list:
+        evicted = []
+        for d in trades:
+            evicted.extend(self.push(d))
+        return evicted
+
+    def table(self, status_row: list):
+        return self.columns.table(HEADER, status_row)
 
 # ============================
-# Time Window Filter
+# PARALLEL REST BACKFILL
 # ============================
 
-def filter_by_time_window(trades: list, minutes: float) -> list:
-    """Keep only trades within last N minutes"""
-    if not trades:
+AGGTRADE_PAGE = 1000
+
+# aggTrades costs request weight per call; keep bulk backfills polite
+BACKFILL_CONCURRENCY = 5
+
+
+async def fetch_aggtrades_page(params: dict, priority: int = PRIORITY_BULK) -> list:
+    return await rest.get("/api/v3/aggTrades", params, priority=priority)
+
+
+def missing_id_ranges(have_ids: list, first_id: int, last_id: int) -> list:
+    """(start, end) AggTradeID ranges in first_id..last_id not in sorted have_ids"""
+    ranges = []
+    nxt = first_id
+    for a in have_ids:
+        if a < nxt:
+            continue
+        if a > last_id:
+            break
+        if a > nxt:
+            ranges.append((nxt, a - 1))
+        nxt = a + 1
+    if nxt <= last_id:
+        ranges.append((nxt, last_id))
+    return ranges
+
+
+async def fetch_aggtrade_ranges(
+    symbol: str,
+    ranges: list,
+    concurrency: int = BACKFILL_CONCURRENCY,
+    priority: int = PRIORITY_BULK
+) -> list:
+    """Trades of the (first_id, last_id) ranges; fromId pages fetched concurrently"""
+    sem = asyncio.Semaphore(concurrency)
+
+    async def page(from_id, count):
+        async with sem:
+            return await fetch_aggtrades_page({
+                "symbol": symbol,
+                "fromId": from_id,
+                "limit": count
+            }, priority)
+
+    pages = await asyncio.gather(*[
+        page(from_id, min(AGGTRADE_PAGE, end - from_id + 1))
+        for start, end in ranges
+        for from_id in range(start, end + 1, AGGTRADE_PAGE)
+    ])
+
+    return [normalize_aggtrade(t) for data in pages for t in data]
+
+
+async def fetch_aggtrades_back(
+    symbol: str,
+    start_ms: int,
+    last_id: int,
+    max_pages: int = 100,
+    priority: int = PRIORITY_BULK
+) -> list:
+    """
+    Trades at/after start_ms up to AggTradeID last_id, one fromId page
+    at a time walking back from last_id, until a page reaches before
+    start_ms (or `max_pages` pages). For windows whose first hour has no
+    trade, where the startTime probe cannot find the first ID.
+    """
+    pages = []
+    to_id = last_id
+    for _ in range(max_pages):
+        from_id = max(0, to_id - AGGTRADE_PAGE + 1)
+        data = await fetch_aggtrades_page({
+            "symbol": symbol,
+            "fromId": from_id,
+            "limit": to_id - from_id + 1
+        }, priority)
+        if not data:
+            break
+        pages.append(data)
+        if data[0]["T"] < start_ms or from_id == 0:
+            break
+        to_id = from_id - 1
+
+    return [
+        normalize_aggtrade(t)
+        for data in reversed(pages) for t in data if t["T"] >= start_ms
+    ]
+
+
+async def fetch_aggtrades_since(
+    symbol: str,
+    from_id: int,
+    max_pages: int = 100,
+    concurrency: int = BACKFILL_CONCURRENCY,
+    store=market,
+    priority: int = PRIORITY_LIVE
+):
+    """
+    Gap fill after a reconnect: every trade from AggTradeID `from_id` up
+    to the newest one. None when that is more than `max_pages` pages;
+    the caller does a window backfill instead.
+    """
+    symbol = symbol.upper()
+    latest = await fetch_aggtrades_page({"symbol": symbol, "limit": 1}, priority)
+    if not latest:
         return []
 
-    latest = max(t["TradeTimeIST"] for t in trades)
-    cutoff = latest - dt.timedelta(minutes=minutes)
+    last_id = int(latest[-1]["a"])
+    if last_id < from_id:
+        return []
+    if last_id - from_id + 1 > max_pages * AGGTRADE_PAGE:
+        return None
 
-    return [t for t in trades if t["TradeTimeIST"] >= cutoff]
+    fetched = await fetch_aggtrade_ranges(
+        symbol, [(from_id, last_id)], concurrency, priority
+    )
+    if store is not None:
+        store.submit(store.put_trades, symbol, fetched)
+    return fetched
 
-# ============================
-# LOOPED REST BACKFILL
-# ============================
 
-async def fetch_aggtrades_looped(
-    session,
+async def fetch_aggtrades_window(
     symbol: str,
     minutes: float,
-    max_loops: int = 6
+    max_pages: int = 100,
+    concurrency: int = BACKFILL_CONCURRENCY,
+    store=market,
+    priority: int = PRIORITY_BULK
 ):
+    """
+    Backfill the last N minutes of aggTrades, store first.
+
+    1. one concurrent round-trip finds the newest AggTradeID and the
+       first AggTradeID at/after (now - window) via startTime/endTime;
+       when the window's first hour has no trade, the window is walked
+       back page by page from the newest ID instead
+    2. trades of that ID range already in the local store are reused;
+       AggTradeIDs are contiguous, so the holes are exact ID ranges
+    3. only the holes are split into fromId pages fetched concurrently,
+       keeping the newest `max_pages`; with `concurrency` in flight that
+       is ceil(pages / concurrency) rounds (20 for 100 pages at 5)
+    4. fetched trades go back into the store; stored + fetched trades
+       are merged in ID order
+
+    store=None skips the local store (plain REST backfill).
+    """
+    symbol = symbol.upper()
+    start_ms = int(time.time() * 1000 - minutes * 60 * 1000)
+
+    latest, first = await asyncio.gather(
+        fetch_aggtrades_page({"symbol": symbol, "limit": 1}, priority),
+        fetch_aggtrades_page({
+            "symbol": symbol,
+            "startTime": start_ms,
+            # Binance: startTime..endTime must be < 1 hour
+            "endTime": start_ms + 60 * 60 * 1000 - 1,
+            "limit": 1
+        }, priority)
+    )
+
+    if not latest:
+        return []
 
-    url = f"{BINANCE_REST}/api/v3/aggTrades"
+    last_id = int(latest[-1]["a"])
+    if not first:
+        if latest[-1]["T"] < start_ms:
+            # no trade in the window at all
+            return []
+        fetched = await fetch_aggtrades_back(symbol, start_ms, last_id, max_pages, priority)
+        if store is not None:
+            store.submit(store.put_trades, symbol, fetched)
+        return fetched
+
+    first_id = max(
+        int(first[0]["a"]),
+        last_id - max_pages * AGGTRADE_PAGE + 1
+    )
+
+    stored = {}
+    if store is not None:
+        for t in await store.call(store.trades, symbol, start_ms):
+            if first_id <= t["a"] <= last_id:
+                stored[t["a"]] = normalize_aggtrade(t)
+
+    fetched = await fetch_aggtrade_ranges(
+        symbol,
+        missing_id_ranges(sorted(stored), first_id, last_id),
+        concurrency, priority
+    )
+    if store is not None:
+        store.submit(store.put_trades, symbol, fetched)
+
+    if not stored:
+        return fetched
+
+    for d in fetched:
+        stored[d["AggTradeID"]] = d
+    return [stored[a] for a in sorted(stored)]
 
-    trades = []
-    from_id = None
 
-    for _ in range(max_loops):
-        params = {
-            "symbol": symbol.upper(),
-            "limit": 1000
-        }
-        if from_id is not None:
-            params["fromId"] = from_id
+# ============================
+# Live Window Driver
+# ============================
 
-        async with session.get(url, params=params) as r:
-            r.raise_for_status()
-            data = await r.json()
+MAX_BACKFILL_PAGES = 100
 
-        if not data:
-            break
 
-        normalized = [normalize_aggtrade(t) for t in data]
-        trades = normalized + trades
+async def aggtrade_updates(
+    symbol: str,
+    minutes: float,
+    limit: int | None = None,
+    max_hz: float = DEFAULT_MAX_HZ,
+    rows: bool = True
+):
+    """
+    Keep a TradeWindow in sync with the store + REST + the shared
+    aggTrade stream.
+
+    Yields (event, window, added, evicted):
+      "load"    window (re)built by a backfill; added = every trade in it
+      "stale"   reconnected or trades were skipped; the gap is being fetched
+      "resume"  gap after a reconnect filled, the window was kept
+      "trades"  trades since the previous yield (throttled to max_hz)
+      "down"    connection lost; window keeps the last state (may be None)
+
+    Between two "load"s every trade shows up exactly once in `added` and
+    once in `evicted` when it leaves the window (fold `added` in first),
+    so consumers can keep incremental state without rescanning the
+    window. Live trades are recorded into the local store.
+    """
+    symbol = symbol.upper()
+    stream = f"{symbol.lower()}@aggTrade"
+
+    window = None
+    link = hub.link(stream)
+
+    recorder = TradeRecorder(market, symbol)
+    stats = metrics.stream(stream)
+
+    try:
+        while True:
+            # subscribe first: trades arriving during the REST calls
+            # queue up; duplicates are skipped by AggTradeID
+            throttle = Throttle(max_hz)
+            async with link:
+
+                # ---------- RESUME: keep the window, fill from last AggTradeID ----------
+                event = None
+                if (
+                    window is not None
+                    and window.trades
+                    and time.time() * 1000 - window.trades[-1]["TradeTime"] < window.window_ms
+                ):
+                    yield "stale", window, [], []
+
+                    gap = await fetch_aggtrades_since(
+                        symbol, window.last_id + 1,
+                        max_pages=MAX_BACKFILL_PAGES
+                    )
+                    if gap is not None:
+                        event = "resume"
+                        yield event, window, gap, window.extend(gap)
+
+                # ---------- BACKFILL (store + missing IDs) ----------
+                if event is None:
+                    window = TradeWindow(minutes, limit, rows)
+                    window.extend(await fetch_aggtrades_window(
+                        symbol=symbol,
+                        minutes=minutes,
+                        max_pages=MAX_BACKFILL_PAGES
+                    ))
+                    yield "load", window, list(window.trades), []
+
+                # ---------- WEBSOCKET STREAM (shared) ----------
+                added = []
+                evicted = []
+                async for t in throttle.messages(link):
+
+                    if t is not None:
+                        agg_id = int(t["a"])
+
+                        # Skip duplicates
+                        if agg_id <= window.last_id:
+                            continue
 
-        # Walk backward in AggTradeID space
-        from_id = int(data[0]["a"]) - 1000
+                        # trades lost between the REST fill and the hub
+                        # (re)connecting: fetch just that ID range
+                        if 0 <= window.last_id < agg_id - 1:
+                            yield "stale", window, [], []
+                            first = max(
+                                window.last_id + 1,
+                                agg_id - MAX_BACKFILL_PAGES * AGGTRADE_PAGE
+                            )
+                            gap = await fetch_aggtrade_ranges(
+                                symbol, [(first, agg_id - 1)],
+                                priority=PRIORITY_LIVE
+                            )
+                            market.submit(market.put_trades, symbol, gap)
+                            added.extend(gap)
+                            evicted.extend(window.extend(gap))
+
+                        t0 = stats.apply_start()
+                        d = normalize_aggtrade(t)
+                        added.append(d)
+                        evicted.extend(window.push(d))
+                        recorder.add(d)
+                        stats.apply_end(t0)
 
-        # Stop early if time window is satisfied
-        span = (
-            max(t["TradeTimeIST"] for t in trades)
-            - min(t["TradeTimeIST"] for t in trades)
-        ).total_seconds() / 60
+                    # every trade lands in the window, consumers see them at max_hz
+                    if not throttle.ready(urgent=t is None):
+                        continue
 
-        if span >= minutes * 1.05:
-            break
+                    yield "trades", window, added, evicted
+                    added = []
+                    evicted = []
+
+            recorder.flush()
+
+            # ⏳ the link waits (jittered, growing) before resubscribing
+            yield "down", window, [], []
+    finally:
+        # the last consumer went away: keep what was recorded
+        recorder.flush()
 
-    return trades
 
 # ============================
 # XlOil Streaming Function
 # ============================
 
-
 @xlo.func
 async def AggTradeStreamWindow(
     symbol: str,
     minutes: float = 1.0,
-    limit: int | None = None
+    limit: int | None = None,
+    max_hz: float = DEFAULT_MAX_HZ
 ):
 
-    symbol = symbol.upper()
-    ws_url = f"{BINANCE_WS}/{symbol.lower()}@aggTrade"
-
-    last_snapshot = None
-    reconnect_delay = 5
+    shown = None    # window behind the last table sent to Excel
 
     STATUS_ROW_LIVE = ["STREAM_STATUS", "LIVE"] + [""] * (len(HEADER) - 2)
+    STATUS_ROW_STALE = ["STREAM_STATUS", "STALE"] + [""] * (len(HEADER) - 2)
     STATUS_ROW_DOWN = ["STREAM_STATUS", "DISCONNECTED"] + [""] * (len(HEADER) - 2)
 
-    while True:
-        try:
-            async with aiohttp.ClientSession() as session:
-
-                # ---------- REST BACKFILL ----------
-                trades = await fetch_aggtrades_looped(
-                    session=session,
-                    symbol=symbol,
-                    minutes=minutes,
-                    max_loops=100
-                )
-
-                if trades:
-                    last_id = max(t["AggTradeID"] for t in trades)
-                else:
-                    last_id = -1
-
-                filtered = filter_by_time_window(trades, minutes)
-                table = [HEADER] + [as_row(t) for t in filtered] + [STATUS_ROW_LIVE]
-                last_snapshot = table
-                yield table
-
-                # ---------- WEBSOCKET STREAM ----------
-                async with websockets.connect(
-                    ws_url,
-                    ping_interval=20,
-                    ping_timeout=10
-                ) as ws:
-
-                    async for msg in ws:
-                        t = json.loads(msg)
-                        agg_id = int(t["a"])
+    stats = metrics.stream(f"{symbol.lower()}@aggTrade")
 
-                        # Skip duplicates
-                        if agg_id <= last_id:
-                            continue
+    async for event, window, _, _ in aggtrade_updates(symbol, minutes, limit, max_hz):
 
-                        d = normalize_aggtrade(t)
-                        trades.append(d)
-                        last_id = agg_id
-
-                        # Optional rolling buffer
-                        if limit is not None and limit > 0 and len(trades) > limit:
-                            trades = trades[-limit:]
-
-                        filtered = filter_by_time_window(trades, minutes)
-                        table = (
-                            [HEADER]
-                            + [as_row(t) for t in filtered]
-                            + [STATUS_ROW_LIVE]
-                        )
-
-                        last_snapshot = table
-                        yield table
-
-        except Exception:
+        if event in ("down", "stale"):
             # ❌ Excel ko error nahi milega
-            if last_snapshot:
-                fallback = last_snapshot[:-1] + [STATUS_ROW_DOWN]
-                yield fallback
-
-            # ⏳ wait then auto-restart
-            await asyncio.sleep(reconnect_delay)
+            if shown is not None:
+                status = STATUS_ROW_DOWN if event == "down" else STATUS_ROW_STALE
+                yield shown.table(status)
+            continue
 
+        t0 = time.perf_counter()
+        table = window.table(STATUS_ROW_LIVE)
+        stats.built(time.perf_counter() - t0)
 
+        shown = window
+        yield table
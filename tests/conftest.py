@@ -0,0 +1,30 @@
+import os
+import sys
+import tempfile
+import types
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+# Data/ modules import each other by bare name; Benchmarks/ holds the
+# local Binance stand-in (ReplayServer) the stream tests connect to
+sys.path.insert(0, os.path.join(ROOT, "Benchmarks"))
+sys.path.insert(0, os.path.join(ROOT, "Data"))
+os.environ.setdefault("BITWISE_DATA_DIR", tempfile.mkdtemp(prefix="bitwise-tests-"))
+
+# xlOil only exists inside an Excel process; a no-op stand-in keeps
+# @xlo.func functions plain coroutines / async generators
+try:
+    import xloil  # noqa: F401
+except ImportError:
+    xlo = types.ModuleType("xloil")
+
+    def func(fn=None, **kwargs):
+        return fn if fn is not None else (lambda f: f)
+
+    class Array:
+        def __init__(self, *args, **kwargs):
+            pass
+
+    xlo.func = func
+    xlo.Array = Array
+    sys.modules["xloil"] = xlo
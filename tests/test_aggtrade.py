@@ -0,0 +1,85 @@
+"""
+fetch_aggtrades_window when the startTime probe finds no trade: an
+illiquid symbol whose window starts with more than an hour of silence.
+"""
+
+import asyncio
+import time
+
+import aggTrade
+from aggTrade import AGGTRADE_PAGE, fetch_aggtrades_window
+
+MINUTE = 60 * 1000
+
+
+class FakeRest:
+    """/api/v3/aggTrades over a fixed trade list, counting calls"""
+
+    def __init__(self, trades):
+        self.trades = trades
+        self.calls = []
+
+    async def get(self, path, params, weight=None, priority=None):
+        self.calls.append(params)
+        limit = params["limit"]
+        if "fromId" in params:
+            return [t for t in self.trades if t["a"] >= params["fromId"]][:limit]
+        if "startTime" in params:
+            return [
+                t for t in self.trades
+                if params["startTime"] <= t["T"] <= params["endTime"]
+            ][:limit]
+        return self.trades[-limit:]
+
+
+def trades_at(times):
+    return [
+        {"a": i, "p": "1.0", "q": "1.0", "f": i, "l": i, "T": t, "m": False, "M": True}
+        for i, t in enumerate(times)
+    ]
+
+
+def window(monkeypatch, trades, minutes, **kw):
+    rest = FakeRest(trades)
+    monkeypatch.setattr(aggTrade, "rest", rest)
+    got = asyncio.run(fetch_aggtrades_window("QUIETUSDT", minutes, store=None, **kw))
+    return got, rest
+
+
+def test_empty_probe_walks_back_to_the_window_start(monkeypatch):
+    now = int(time.time() * 1000)
+    # 2,500 trades well before a 3h window, 90 min of silence, then 2,500
+    # trades in the last 90 min
+    old = [now - 5 * 60 * MINUTE + i for i in range(2500)]
+    recent = [now - 90 * MINUTE + i * 2000 for i in range(2500)]
+    trades = trades_at(old + recent)
+
+    got, rest = window(monkeypatch, trades, minutes=180)
+
+    assert [d["AggTradeID"] for d in got] == list(range(2500, 5000))
+    # probes, then 3 pages back from the newest ID (the 3rd reaches old
+    # trades), not max_pages pages from last_id - max_pages * 1000
+    pages = [p for p in rest.calls if "fromId" in p]
+    assert len(pages) == 3
+    assert all(p["limit"] <= AGGTRADE_PAGE for p in pages)
+
+
+def test_empty_probe_stops_at_max_pages(monkeypatch):
+    now = int(time.time() * 1000)
+    trades = trades_at([now - 30 * MINUTE + i for i in range(5000)])
+
+    got, rest = window(monkeypatch, trades, minutes=120, max_pages=2)
+
+    # newest 2 pages only
+    assert [d["AggTradeID"] for d in got] == list(range(3000, 5000))
+    assert len([p for p in rest.calls if "fromId" in p]) == 2
+
+
+def test_window_without_trades(monkeypatch):
+    now = int(time.time() * 1000)
+    trades = trades_at([now - 90 * MINUTE + i for i in range(10)])
+
+    got, rest = window(monkeypatch, trades, minutes=30)
+
+    assert got == []
+    assert all("fromId" not in p for p in rest.calls)
@@ -0,0 +1,151 @@
+import numpy as np
+import pytest
+
+from Correlation import CorrelationBoard, RollingCovariance, align_closes
+from KlineStream import interval_ms
+
+N_ASSETS = 6
+N = 700
+# running sums of squares vs np.cov's two-pass centering
+TOL = dict(rtol=1e-7, atol=1e-12)
+
+
+# ============================
+# Batch NumPy Reference
+# ============================
+
+def random_returns(n: int = N, seed: int = 9) -> np.ndarray:
+    """Correlated hourly-sized log returns, one column per asset"""
+    rng = np.random.default_rng(seed)
+    mix = rng.normal(0, 1, (N_ASSETS, N_ASSETS)) + 2 * np.eye(N_ASSETS)
+    return rng.normal(0, 0.004, (n, N_ASSETS)) @ mix.T / 3 + 0.0002
+
+
+def cov_ref(returns: np.ndarray) -> np.ndarray:
+    return np.cov(returns, rowvar=False, ddof=1)
+
+
+# ============================
+# Tests
+# ============================
+
+@pytest.fixture(scope="module")
+def returns():
+    return random_returns()
+
+
+@pytest.mark.parametrize("window", [2, 7, 50, 240])
+def test_rolling_cov_matches_np_cov(returns, window):
+    rc = RollingCovariance(window, N_ASSETS)
+    assert rc.cov() == (None, 0)
+
+    for i, r in enumerate(returns):
+        rc.push(r)
+        k = min(i + 1, window)
+        cov, got_k = rc.cov()
+        assert got_k == k
+        if k < 2:
+            assert cov is None
+            continue
+        np.testing.assert_allclose(cov, cov_ref(returns[i + 1 - k:i + 1]), **TOL)
+
+
+@pytest.mark.parametrize("window", [7, 50])
+def test_provisional_vector_replaces_the_oldest(returns, window):
+    rc = RollingCovariance(window, N_ASSETS)
+    extra = returns[-1] * 3
+
+    for i, r in enumerate(returns[:200]):
+        rc.push(r)
+        ring = returns[max(0, i + 1 - window):i + 1]
+        with_extra = np.vstack([ring[1:] if len(ring) == window else ring, extra])
+        cov, k = rc.cov(extra)
+        assert k == len(with_extra)
+        np.testing.assert_allclose(cov, cov_ref(with_extra), **TOL)
+
+    # the committed state is untouched
+    np.testing.assert_allclose(rc.cov()[0], cov_ref(returns[200 - window:200]), **TOL)
+
+
+def test_load_then_push(returns):
+    window = 100
+    rc = RollingCovariance(window, N_ASSETS)
+    rc.load(returns[:350])
+    np.testing.assert_allclose(rc.cov()[0], cov_ref(returns[250:350]), **TOL)
+
+    for i in range(350, N):
+        rc.push(returns[i])
+    np.testing.assert_allclose(rc.cov()[0], cov_ref(returns[N - window:]), **TOL)
+
+    short = RollingCovariance(window, N_ASSETS)
+    short.load(returns[:30])
+    for i in range(30, 60):
+        short.push(returns[i])
+    np.testing.assert_allclose(short.cov()[0], cov_ref(returns[:60]), **TOL)
+
+
+def test_no_drift_over_many_windows():
+    # large common offset: the worst case for sum(r r^T) - k mean mean^T
+    returns = random_returns(20_000, seed=4) + 0.01
+    rc = RollingCovariance(64, N_ASSETS)
+    for r in returns:
+        rc.push(r)
+    np.testing.assert_allclose(rc.cov()[0], cov_ref(returns[-64:]), **TOL)
+
+
+def board(returns: np.ndarray, window: int):
+    """A 1h board loaded from closes built out of `returns`"""
+    step = interval_ms("1h")
+    closes = 100 * np.exp(np.vstack([np.zeros(N_ASSETS), np.cumsum(returns, axis=0)]))
+    grid = np.arange(len(closes), dtype=np.int64) * step
+    b = CorrelationBoard([f"S{i}USDT" for i in range(N_ASSETS)], "1h", window)
+    b.load(grid, closes, closes[-1].copy())
+    return b, closes, grid, step
+
+
+def test_board_stats_match_np_corrcoef(returns):
+    window = 120
+    b, closes, grid, step = board(returns[:300], window)
+
+    # the forming bar has not moved yet: a zero return takes the oldest slot
+    corr, beta, vol, k = b.stats()
+    ref = np.vstack([returns[300 - window + 1:300], np.zeros(N_ASSETS)])
+    cov = cov_ref(ref)
+    assert k == window
+    np.testing.assert_allclose(corr, np.corrcoef(ref, rowvar=False), **TOL)
+    np.testing.assert_allclose(beta, cov[:, 0] / cov[0, 0], **TOL)
+    np.testing.assert_allclose(vol, np.sqrt(np.diag(cov) * 24 * 365), **TOL)
+    assert beta[0] == pytest.approx(1.0)
+
+    # ticks inside the bar only move the provisional return
+    last = closes[-1]
+    moved = last * np.exp(returns[300])
+    frame = [{"E": int(b.bar_open) + 1000, "s": s, "c": str(p)} for s, p in zip(b.symbols, moved)]
+    assert b.apply(frame) is None
+    corr, beta, _, _ = b.stats()
+    ref[-1] = np.log(moved / last)
+    cov = cov_ref(ref)
+    np.testing.assert_allclose(corr, np.corrcoef(ref, rowvar=False), **TOL)
+    np.testing.assert_allclose(beta, cov[:, 0] / cov[0, 0], **TOL)
+
+    # the next bar's first event commits it
+    assert b.apply([{"E": int(b.bar_open) + step, "s": "XUSDT", "c": "1"}]) == "close"
+    np.testing.assert_allclose(b.cov.cov()[0], cov_ref(returns[300 - window + 1:301]), **TOL)
+
+    # more than one bar later: the caller reloads
+    assert b.apply([{"E": int(b.bar_open) + 2 * step, "s": "S0USDT", "c": "1"}]) == "gap"
+
+
+def test_align_closes_fills_missing_bars():
+    step = interval_ms("1h")
+    grid = np.arange(6, dtype=np.int64) * step
+
+    def candles(pairs):
+        return [{"OpenTime": int(t * step), "Close": c, "IsClosed": True} for t, c in pairs]
+
+    # late listing, a missing bar, and an unclosed candle that is ignored
+    got = align_closes(grid, candles([(2, 10.0), (3, 11.0), (5, 12.0)]) + [
+        {"OpenTime": int(6 * step), "Close": 99.0, "IsClosed": False},
+    ])
+    assert got.tolist() == [10.0, 10.0, 10.0, 11.0, 11.0, 12.0]
+    assert align_closes(grid, candles([(9, 1.0)])) is None
@@ -0,0 +1,223 @@
+import numpy as np
+import pytest
+
+from Indicators import (
+    ATR,
+    EMA,
+    MACD,
+    RSI,
+    BollingerBands,
+    IndicatorEngine,
+    parse_spec,
+)
+
+SPEC = "EMA(20),RSI(14),MACD(12,26,9),BB(20,2),ATR(14)"
+N = 300
+# running sums vs exact two-pass windows: a flat BB window leaves a
+# band width of ~1e-7 on prices around 100
+TOL = dict(rtol=1e-9, atol=1e-6)
+
+
+# ============================
+# Batch NumPy Reference
+# ============================
+
+def smoothed(x: np.ndarray, n: int, alpha: float) -> np.ndarray:
+    """Mean of the first n values, then x_t -> prev + alpha * (x_t - prev); NaN before"""
+    out = np.full(len(x), np.nan)
+    if len(x) < n:
+        return out
+    step = np.frompyfunc(lambda prev, v: prev + alpha * (v - prev), 2, 1)
+    seeded = np.concatenate(([x[:n].mean()], x[n:])).astype(object)
+    out[n - 1:] = step.accumulate(seeded).astype(float)
+    return out
+
+
+def ema_ref(close, n):
+    return smoothed(close, n, 2.0 / (n + 1))
+
+
+def rsi_ref(close, n=14):
+    change = np.diff(close)
+    ag = smoothed(np.where(change > 0, change, 0.0), n, 1.0 / n)
+    al = smoothed(np.where(change < 0, -change, 0.0), n, 1.0 / n)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rsi = 100.0 - 100.0 / (1.0 + ag / al)
+    rsi = np.where(al == 0, np.where(ag > 0, 100.0, 50.0), rsi)
+    rsi[np.isnan(ag)] = np.nan
+    return np.concatenate(([np.nan], rsi))
+
+
+def macd_ref(close, fast=12, slow=26, signal=9):
+    line = ema_ref(close, fast) - ema_ref(close, slow)
+    sig = np.full(len(close), np.nan)
+    sig[slow - 1:] = ema_ref(line[slow - 1:], signal)
+    return line, sig, line - sig
+
+
+def bb_ref(close, n=20, k=2.0):
+    mid = np.full(len(close), np.nan)
+    std = np.full(len(close), np.nan)
+    if len(close) >= n:
+        windows = np.lib.stride_tricks.sliding_window_view(close, n)
+        mid[n - 1:] = windows.mean(axis=1)
+        std[n - 1:] = windows.std(axis=1)
+    return mid, mid + k * std, mid - k * std
+
+
+def atr_ref(high, low, close, n=14):
+    pc = np.concatenate(([np.nan], close[:-1]))
+    tr = np.fmax(high - low, np.fmax(np.abs(high - pc), np.abs(low - pc)))
+    return smoothed(tr, n, 1.0 / n)
+
+
+def reference(high, low, close) -> np.ndarray:
+    """Columns of SPEC for every bar, NaN during warm-up"""
+    return np.column_stack([
+        ema_ref(close, 20),
+        rsi_ref(close, 14),
+        *macd_ref(close, 12, 26, 9),
+        *bb_ref(close, 20, 2.0),
+        atr_ref(high, low, close, 14),
+    ])
+
+
+def as_array(rows) -> np.ndarray:
+    """Engine / indicator output ("" or None during warm-up) as floats"""
+    return np.array(
+        [[np.nan if v in ("", None) else v for v in row] for row in rows],
+        dtype=float
+    )
+
+
+# ============================
+# Fixtures
+# ============================
+
+@pytest.fixture
+def series():
+    rng = np.random.default_rng(7)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, N)))
+    # a flat stretch: zero changes exercise the RSI al == 0 branch
+    close[40:60] = close[40]
+    spread = np.abs(rng.normal(0, 0.005, N)) * close
+    high = close + spread * rng.uniform(0, 1, N)
+    low = close - spread * rng.uniform(0, 1, N)
+    return high, low, close
+
+
+def bar(t, high, low, close, closed=True):
+    return {
+        "OpenTime": t * 60_000,
+        "OpenDateTimeIST": float(t),
+        "High": float(high),
+        "Low": float(low),
+        "Close": float(close),
+        "IsClosed": closed,
+    }
+
+
+# ============================
+# Single Indicators
+# ============================
+
+@pytest.mark.parametrize("make, ref", [
+    (lambda: EMA(20), lambda h, l, c: ema_ref(c, 20)[:, None]),
+    (lambda: RSI(14), lambda h, l, c: rsi_ref(c, 14)[:, None]),
+    (lambda: MACD(12, 26, 9), lambda h, l, c: np.column_stack(macd_ref(c))),
+    (lambda: BollingerBands(20, 2.0), lambda h, l, c: np.column_stack(bb_ref(c))),
+    (lambda: ATR(14), lambda h, l, c: atr_ref(h, l, c, 14)[:, None]),
+])
+def test_indicator_matches_numpy(series, make, ref):
+    high, low, close = series
+    ind = make()
+    out = []
+    for i in range(N):
+        b = bar(i, high[i], low[i], close[i])
+        out.append(ind.value(b))
+        ind.commit(b)
+
+    np.testing.assert_allclose(as_array(out), ref(high, low, close), **TOL)
+
+
+# ============================
+# Engine
+# ============================
+
+def test_engine_bulk_matches_numpy(series):
+    high, low, close = series
+    engine = IndicatorEngine(SPEC, N)
+    engine.sync([bar(i, high[i], low[i], close[i]) for i in range(N)])
+
+    rows = list(engine.rows)
+    assert engine.header[1:] == [c for ind in parse_spec(SPEC) for c in ind.columns]
+    assert [r[0] for r in rows] == list(range(N))
+    np.testing.assert_allclose(as_array([r[1:] for r in rows]), reference(high, low, close), **TOL)
+
+
+def test_engine_live_revisions_match_numpy(series):
+    """Each candle is ticked twice while live, then closed"""
+    high, low, close = series
+    rng = np.random.default_rng(11)
+    engine = IndicatorEngine(SPEC, N)
+    candles = []
+
+    for i in range(N):
+        for tick in range(2):
+            c = close[i] * (1 + rng.normal(0, 0.003))
+            h, l = max(high[i], c), min(low[i], c)
+            live = bar(i, h, l, c, closed=False)
+            if tick:
+                candles[-1] = live
+            else:
+                candles.append(live)
+            engine.sync(candles)
+
+            # the live row is valued as if the tick were the close
+            want = reference(
+                np.append(high[:i], h), np.append(low[:i], l), np.append(close[:i], c)
+            )[-1]
+            np.testing.assert_allclose(as_array([engine.rows[-1][1:]])[0], want, **TOL)
+            assert len(engine.rows) == i + 1
+
+        candles[-1] = bar(i, high[i], low[i], close[i])
+        engine.sync(candles)
+
+    np.testing.assert_allclose(
+        as_array([r[1:] for r in engine.rows]), reference(high, low, close), **TOL
+    )
+
+
+def test_engine_keeps_limit_rows(series):
+    high, low, close = series
+    engine = IndicatorEngine("EMA(5)", 50)
+    engine.sync([bar(i, high[i], low[i], close[i]) for i in range(N)])
+
+    assert len(engine.rows) == 50
+    np.testing.assert_allclose(
+        as_array([r[1:] for r in engine.rows])[:, 0], ema_ref(close, 5)[-50:], **TOL
+    )
+
+
+# ============================
+# Spec Parsing
+# ============================
+
+def test_parse_spec_defaults_and_arguments():
+    rsi, bb = parse_spec("RSI, BB(20, 2.5)")
+    assert (rsi.n, bb.n, bb.k) == (14, 20, 2.5)
+    assert isinstance(bb.n, int)
+
+
+@pytest.mark.parametrize("spec", [
+    "EMA(20.5)",
+    "EMA(20.0)",
+    "RSI(0)",
+    "MACD(12,26.5,9)",
+    "BB(x)",
+    "FOO(3)",
+    "EMA(20",
+])
+def test_parse_spec_rejects(spec):
+    with pytest.raises(ValueError):
+        parse_spec(spec)
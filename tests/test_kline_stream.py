@@ -0,0 +1,88 @@
+"""
+load_klines against the local Binance stand-in (Benchmarks/ReplayServer):
+stored candles are reused and the missing spans cost a few full pages,
+not one request per hole.
+"""
+
+import asyncio
+
+import KlineStream
+from KlineStream import MAX_REST_LIMIT, interval_ms, load_klines, now_ms
+from MarketStore import market
+from ReplayServer import ReplayServer
+from RestClient import RestClient
+
+
+def run(monkeypatch, test):
+    """Run test(srv) with KlineStream's REST calls going to a fresh server"""
+    async def main():
+        srv = ReplayServer(n_symbols=10)
+        _, rest_url = await srv.start()
+        rest = RestClient(rest_url)
+        monkeypatch.setattr(KlineStream, "rest", rest)
+        try:
+            await test(srv)
+        finally:
+            await rest.close()
+            await srv.stop()
+    asyncio.run(main())
+
+
+async def store(srv, symbol, interval, open_times):
+    step = interval_ms(interval)
+    now = now_ms()
+    candles = [
+        KlineStream.normalize_rest_kline(srv.market.kline(symbol, interval, t, now), now)
+        for t in open_times if t + step <= now
+    ]
+    await market.call(market.put_klines, symbol, interval, candles)
+
+
+def contiguous(candles, step, limit):
+    times = [d["OpenTime"] for d in candles]
+    assert len(times) == limit
+    assert times == list(range(times[0], times[0] + limit * step, step))
+    assert times[-1] == now_ms() // step * step
+
+
+def test_sparse_store_costs_a_few_pages(monkeypatch):
+    async def test(srv):
+        step = interval_ms("1d")
+        live = now_ms() // step * step
+        # scattered single-day lookups: every 3rd day over 900 days
+        await store(srv, "SPARSEUSDT", "1d", range(live - 900 * step, live, 3 * step))
+
+        candles = await load_klines("SPARSEUSDT", "1d", 1000)
+        contiguous(candles, step, 1000)
+        # the 99 days before the first stored one, then the rest in one page
+        assert srv.rest_calls["klines"] == 2
+
+    run(monkeypatch, test)
+
+
+def test_stored_tail_fetches_only_what_is_missing(monkeypatch):
+    async def test(srv):
+        step = interval_ms("1m")
+        live = now_ms() // step * step
+        await store(srv, "TAILUSDT", "1m", range(live - 600 * step, live - 5 * step, step))
+
+        candles = await load_klines("TAILUSDT", "1m", 500)
+        contiguous(candles, step, 500)
+        assert srv.rest_calls["klines"] == 1
+
+    run(monkeypatch, test)
+
+
+def test_long_window_is_paged(monkeypatch):
+    async def test(srv):
+        step = interval_ms("1h")
+        live = now_ms() // step * step
+        await store(srv, "LONGUSDT", "1h", [live - 10 * step])
+
+        limit = 2 * MAX_REST_LIMIT + 500
+        candles = await load_klines("LONGUSDT", "1h", limit)
+        contiguous(candles, step, limit)
+        # 2,490 hours before the stored one in 3 pages, 9 after it in one
+        assert srv.rest_calls["klines"] == 4
+
+    run(monkeypatch, test)
@@ -0,0 +1,177 @@
+"""
+OrderBook sequencing (Binance's U / u rules for a local book) against a
+brute-force dict book, and the gap resync of OrderBookStream against
+the local Binance stand-in's depth stub (Benchmarks/ReplayServer).
+"""
+
+import asyncio
+import random
+
+import pytest
+
+import OrderBook as ob
+from OrderBook import OrderBook, OrderBookStream, sync_book
+from ReplayServer import ReplayServer
+from RestClient import RestClient
+from StreamHub import StreamHub
+
+
+def snapshot(last_id, bids, asks):
+    return {
+        "lastUpdateId": last_id,
+        "bids": [[str(p), str(q)] for p, q in bids.items()],
+        "asks": [[str(p), str(q)] for p, q in asks.items()],
+    }
+
+
+def event(first, last, b=(), a=()):
+    return {
+        "e": "depthUpdate", "E": 0, "U": first, "u": last,
+        "b": [[str(p), str(q)] for p, q in b],
+        "a": [[str(p), str(q)] for p, q in a],
+    }
+
+
+def levels(side: dict, descending: bool) -> list:
+    return sorted(side.items(), reverse=descending)
+
+
+def same_book(book, bids, asks):
+    assert book.bids.top(len(bids)) == levels(bids, True)
+    assert book.asks.top(len(asks)) == levels(asks, False)
+    assert len(book.bids) == len(bids)
+    assert len(book.asks) == len(asks)
+
+
+@pytest.fixture
+def book():
+    b = OrderBook()
+    b.load_snapshot(snapshot(100, {99.0: 1.0, 98.0: 2.0}, {101.0: 1.5, 102.0: 3.0}))
+    return b
+
+
+def test_nothing_applies_before_a_snapshot():
+    assert not OrderBook().apply(event(1, 2, b=[(99.0, 1.0)]))
+
+
+def test_events_already_in_the_snapshot_are_dropped(book):
+    # u <= lastUpdateId: the snapshot already has it
+    for first, last in ((90, 95), (95, 100), (100, 100)):
+        assert book.apply(event(first, last, b=[(99.0, 0.0)], a=[(100.5, 9.0)]))
+    assert book.last_update_id == 100
+    same_book(book, {99.0: 1.0, 98.0: 2.0}, {101.0: 1.5, 102.0: 3.0})
+
+
+@pytest.mark.parametrize("first, last", [(95, 101), (101, 101), (100, 104), (101, 110)])
+def test_first_event_straddles_last_update_id(book, first, last):
+    # U <= lastUpdateId + 1 <= u
+    assert book.apply(event(first, last, b=[(99.0, 0.0), (99.5, 4.0)]))
+    assert book.last_update_id == last
+    same_book(book, {99.5: 4.0, 98.0: 2.0}, {101.0: 1.5, 102.0: 3.0})
+
+
+@pytest.mark.parametrize("first, last", [(102, 102), (102, 110), (150, 160)])
+def test_first_event_after_a_gap_fails(book, first, last):
+    assert not book.apply(event(first, last, b=[(99.0, 0.0)]))
+    assert book.last_update_id == 100
+    same_book(book, {99.0: 1.0, 98.0: 2.0}, {101.0: 1.5, 102.0: 3.0})
+
+
+def test_gap_between_events_fails(book):
+    assert book.apply(event(99, 103, a=[(101.0, 0.0)]))
+    assert not book.apply(event(105, 107, a=[(101.5, 1.0)]))
+    assert book.last_update_id == 103
+    same_book(book, {99.0: 1.0, 98.0: 2.0}, {102.0: 3.0})
+
+
+def test_random_diffs_match_a_dict_book():
+    rng = random.Random(11)
+    bids = {100.0 - i: 1.0 + i for i in range(1, 30)}
+    asks = {100.0 + i: 1.0 + i for i in range(1, 30)}
+    book = OrderBook()
+    book.load_snapshot(snapshot(1000, bids, asks))
+
+    last = 1000
+    for _ in range(2000):
+        first = last + 1 - rng.randint(0, 2)   # overlaps are allowed
+        last = last + rng.randint(1, 3)
+        changes = {"b": [], "a": []}
+        for _ in range(rng.randint(1, 8)):
+            side, ref, sign = rng.choice((("b", bids, -1), ("a", asks, 1)))
+            p = 100.0 + sign * rng.randint(1, 40)
+            q = 0.0 if rng.random() < 0.3 else round(rng.uniform(0.1, 5), 3)
+            changes[side].append((p, q))
+            if q:
+                ref[p] = q
+            else:
+                ref.pop(p, None)
+        assert book.apply(event(first, last, changes["b"], changes["a"]))
+
+    assert book.last_update_id == last
+    same_book(book, bids, asks)
+
+
+def test_sync_book_waits_for_a_snapshot_that_covers_the_event(monkeypatch):
+    snaps = [
+        snapshot(100, {99.0: 1.0}, {101.0: 1.0}),    # older than the event
+        snapshot(120, {99.0: 2.0}, {101.0: 1.0}),
+    ]
+    calls = []
+
+    async def fetch(symbol, limit=ob.DEPTH_LIMIT, priority=None):
+        calls.append(symbol)
+        return snaps[len(calls) - 1]
+
+    monkeypatch.setattr(ob, "fetch_depth_snapshot", fetch)
+    monkeypatch.setattr(ob, "RESYNC_DELAY", 0)
+
+    book = OrderBook()
+    pending = event(115, 125, b=[(99.0, 3.0)])
+    asyncio.run(sync_book(book, "BTCUSDT", pending))
+
+    assert len(calls) == 2
+    assert book.last_update_id == 125
+    same_book(book, {99.0: 3.0}, {101.0: 1.0})
+
+
+def test_stream_resyncs_after_lost_updates(monkeypatch):
+    async def main():
+        srv = ReplayServer(rate=50, n_symbols=10, depth_levels=5)
+        ws_url, rest_url = await srv.start()
+        rest = RestClient(rest_url)
+        monkeypatch.setattr(ob, "hub", StreamHub(ws_url))
+        monkeypatch.setattr(ob, "rest", rest)
+
+        stream = OrderBookStream("BTCUSDT", levels=5, depth_bps=10, max_hz=0)
+        states = []
+        caught_up = []
+        try:
+            async for table in stream:
+                status = table[-1]
+                states.append((status[1], status[5]))
+                server = srv.books["BTCUSDT"]
+
+                if len(states) == 10:
+                    # the server skips update IDs: the next diff does not fit
+                    server.update_id += 5
+
+                # resynced and level with the server: same top of book
+                if status[5] == 1 and status[3] == server.update_id:
+                    snap = server.snapshot(5)
+                    for side, cols in (("bids", slice(1, 3)), ("asks", slice(5, 7))):
+                        theirs = [[float(p), float(q)] for p, q in snap[side]]
+                        assert [row[cols] for row in table[1:6]] == theirs
+                    caught_up.append(status[3])
+                    if len(caught_up) == 3:
+                        break
+                assert len(states) < 500
+        finally:
+            await stream.aclose()
+            await rest.close()
+            await srv.stop()
+
+        assert ("STALE", "") in states
+        assert states[-1] == ("LIVE", 1)
+        assert srv.rest_calls["depth"] == 2
+
+    asyncio.run(main())
@@ -0,0 +1,173 @@
+import numpy as np
+import pytest
+
+from aggTrade import TradeWindow, normalize_aggtrade
+from OrderFlow import OrderFlowState, flow_table, nice_step
+
+N = 4000
+MINUTES = 0.5
+BUCKET = 0.05
+LARGE = 150.0
+# running add / subtract totals vs sums over the window
+TOL = dict(rel=1e-9, abs=1e-9)
+
+
+# ============================
+# Brute-force Reference
+# ============================
+
+def window_totals(trades, idx, bucket=BUCKET, large=LARGE) -> dict:
+    """Every OrderFlowState total, recomputed from the trades in idx"""
+    p, q, sell = trades["p"][idx], trades["q"][idx], trades["m"][idx]
+    quote = p * q
+    keys = (p // bucket).astype(int)
+    profile = {}
+    for k in np.unique(keys):
+        at = keys == k
+        profile[int(k)] = (q[at & ~sell].sum(), q[at & sell].sum(), int(at.sum()))
+    return {
+        "trades": len(idx),
+        "buy_volume": q[~sell].sum(),
+        "sell_volume": q[sell].sum(),
+        "buy_quote": quote[~sell].sum(),
+        "sell_quote": quote[sell].sum(),
+        "large_buys": int((~sell & (quote >= large)).sum()),
+        "large_sells": int((sell & (quote >= large)).sum()),
+        "profile": profile,
+    }
+
+
+def random_trades(seed: int = 3) -> dict:
+    rng = np.random.default_rng(seed)
+    # bursts and pauses, so the window grows and shrinks
+    gaps = np.where(rng.random(N) < 0.02, rng.integers(5_000, 40_000, N), rng.integers(0, 40, N))
+    return {
+        "T": 1_700_000_000_000 + np.cumsum(gaps),
+        "p": np.round(100 + np.cumsum(rng.normal(0, 0.02, N)), 2),
+        "q": np.round(rng.exponential(0.6, N) + 0.001, 3),
+        "m": rng.random(N) < 0.5,
+        "a": np.arange(N),
+    }
+
+
+def records(trades) -> list:
+    return [
+        normalize_aggtrade({
+            "a": int(a), "p": f"{p:.2f}", "q": f"{q:.3f}", "f": int(a), "l": int(a),
+            "T": int(t), "m": bool(m), "M": True,
+        })
+        for a, p, q, t, m in zip(trades["a"], trades["p"], trades["q"], trades["T"], trades["m"])
+    ]
+
+
+def assert_state(flow, want):
+    assert flow.trades == want["trades"]
+    assert flow.large_buys == want["large_buys"]
+    assert flow.large_sells == want["large_sells"]
+    for name in ("buy_volume", "sell_volume", "buy_quote", "sell_quote"):
+        assert getattr(flow, name) == pytest.approx(want[name], **TOL), name
+
+    profile = want["profile"]
+    assert sorted(flow.profile) == sorted(profile)
+    for k, (buy, sell, n) in profile.items():
+        b = flow.profile[k]
+        assert b.trades == n
+        assert (b.buy, b.sell) == pytest.approx((buy, sell), **TOL)
+
+
+# ============================
+# Tests
+# ============================
+
+@pytest.fixture(scope="module")
+def trades():
+    return random_trades()
+
+
+def test_sliding_window_matches_brute_force(trades):
+    window = TradeWindow(MINUTES, rows=False)
+    flow = OrderFlowState(BUCKET, LARGE)
+    first = 0
+    sizes = set()
+
+    for i, d in enumerate(records(trades)):
+        evicted = window.push(d)
+        flow.add(d)
+        for e in evicted:
+            flow.remove(e)
+        first += len(evicted)
+        sizes.add(len(window))
+
+        # the window is exactly the trades within MINUTES of the latest
+        assert window.trades[0]["AggTradeID"] == first
+        assert trades["T"][i] - trades["T"][first] <= MINUTES * 60_000
+
+        if i % 50 == 0 or evicted and len(window) == 1:
+            assert_state(flow, window_totals(trades, np.arange(first, i + 1)))
+
+        # the CVD is never evicted: buy - sell of every trade so far
+        q, sell = trades["q"][:i + 1], trades["m"][:i + 1]
+        assert flow.cvd == pytest.approx(q[~sell].sum() - q[sell].sum(), **TOL)
+
+    # the window both emptied down to one trade and filled up again
+    assert 1 in sizes and max(sizes) > 200
+    assert_state(flow, window_totals(trades, np.arange(first, N)))
+
+
+def test_derived_values_match_brute_force(trades):
+    flow = OrderFlowState(BUCKET, LARGE)
+    idx = np.arange(1000, 2500)
+    for d in records(trades)[1000:2500]:
+        flow.add(d)
+
+    p, q, sell = trades["p"][idx], trades["q"][idx], trades["m"][idx]
+    buy_v, sell_v = q[~sell].sum(), q[sell].sum()
+    assert flow.volume == pytest.approx(q.sum(), **TOL)
+    assert flow.delta == pytest.approx(buy_v - sell_v, **TOL)
+    assert flow.imbalance == pytest.approx((buy_v - sell_v) / q.sum(), **TOL)
+    assert flow.vwap == pytest.approx((p * q).sum() / q.sum(), **TOL)
+
+    # volume profile: the busiest buckets, highest price first
+    profile = window_totals(trades, idx)["profile"]
+    busiest = sorted(profile, key=lambda k: profile[k][0] + profile[k][1], reverse=True)
+    assert flow.poc() == pytest.approx(busiest[0] * BUCKET)
+
+    rows = flow.profile_rows(10)
+    assert [r[0] for r in rows] == pytest.approx(sorted((k * BUCKET for k in busiest[:10]), reverse=True))
+    for level, buy, sell_q, total, delta in rows:
+        b, s, _ = profile[round(level / BUCKET)]
+        assert (buy, sell_q, total, delta) == pytest.approx((b, s, b + s, b - s), **TOL)
+
+
+def test_emptied_window_restarts_from_zero(trades):
+    flow = OrderFlowState(BUCKET, LARGE)
+    batch = records(trades)[:300]
+    for d in batch:
+        flow.add(d)
+    cvd = flow.cvd
+    for d in batch:
+        flow.remove(d)
+
+    # no float residue left behind, the CVD carries on
+    assert flow.trades == 0
+    assert flow.volume == 0.0 and flow.quote_volume == 0.0
+    assert flow.large_buys == flow.large_sells == 0
+    assert flow.profile == {}
+    assert flow.cvd == cvd
+    assert flow.vwap is None and flow.imbalance is None and flow.poc() is None
+
+
+def test_automatic_bucket_size():
+    assert nice_step(100.0) == 0.05
+    assert nice_step(65_000.0) == 20.0
+    assert nice_step(3_000.0) == 1.0
+    assert nice_step(0.0) == 1.0
+
+    flow = OrderFlowState()
+    flow.add(normalize_aggtrade({
+        "a": 1, "p": "65000.00", "q": "0.5", "f": 1, "l": 1, "T": 0, "m": False, "M": True,
+    }))
+    assert flow.bucket_size == 20.0
+    table = flow_table(flow, MINUTES, 5, "LIVE")
+    assert table[-1] == ["STREAM_STATUS", "LIVE", "", "", ""]
+    assert table[-2] == [65000.0, 0.5, 0.0, 0.5, 0.5]
@@ -0,0 +1,182 @@
+"""
+StreamHub against the local Binance stand-in (Benchmarks/ReplayServer):
+reference counting, batched and rate-limited SUBSCRIBE / UNSUBSCRIBE,
+closing the socket when no stream is left, StreamDisconnected on a
+dropped connection, and StreamLink's reconnect handling.
+"""
+
+import asyncio
+import time
+
+import pytest
+
+from Metrics import metrics
+from ReplayServer import ReplayServer
+from StreamHub import CONTROL_MAX_HZ, StreamDisconnected, StreamHub
+
+
+async def until(cond, timeout: float = 5.0):
+    deadline = time.monotonic() + timeout
+    while not cond():
+        if time.monotonic() > deadline:
+            raise AssertionError("condition not met in time")
+        await asyncio.sleep(0.01)
+
+
+def run(test):
+    """Run test(srv, hub) against a fresh server and hub"""
+    async def main():
+        srv = ReplayServer(rate=50, n_symbols=50)
+        ws_url, _ = await srv.start()
+        hub = StreamHub(ws_url)
+        try:
+            await test(srv, hub)
+            await until(lambda: hub._task is None or hub._task.done())
+        finally:
+            await srv.stop()
+    asyncio.run(main())
+
+
+def sent(srv, method: str) -> list:
+    return [params for _, m, params in srv.control if m == method]
+
+
+def test_refcount_and_unsubscribe_on_last_leave():
+    async def test(srv, hub):
+        async with hub.subscribe("ethusdt@ticker") as eth:
+            a = await hub.subscribe("btcusdt@ticker").__aenter__()
+            b = await hub.subscribe("btcusdt@ticker").__aenter__()
+            assert hub.refcount("btcusdt@ticker") == 2
+            assert hub.refcount("ethusdt@ticker") == 1
+
+            # one connection, both subscribers of a stream get its frames
+            assert (await a.__anext__())["s"] == "BTCUSDT"
+            assert (await b.__anext__())["s"] == "BTCUSDT"
+            assert (await eth.__anext__())["s"] == "ETHUSDT"
+            assert srv.connections == 1
+
+            await a.__aexit__(None, None, None)
+            assert hub.refcount("btcusdt@ticker") == 1
+            await asyncio.sleep(2 / CONTROL_MAX_HZ)
+            assert sent(srv, "UNSUBSCRIBE") == []
+
+            await b.__aexit__(None, None, None)
+            assert hub.refcount("btcusdt@ticker") == 0
+            assert hub.streams == ["ethusdt@ticker"]
+            await until(lambda: sent(srv, "UNSUBSCRIBE") == [["btcusdt@ticker"]])
+            assert hub.connected
+
+    run(test)
+
+
+def test_socket_closes_when_no_streams_remain():
+    async def test(srv, hub):
+        async with hub.subscribe("btcusdt@ticker") as sub:
+            await sub.__anext__()
+            assert hub.connected
+
+        await until(lambda: srv.connections == 0)
+        assert not hub.connected
+        assert hub.streams == []
+        # the close replaces the UNSUBSCRIBE
+        assert srv.control == []
+
+    run(test)
+
+
+def test_changes_are_batched_and_rate_limited():
+    async def test(srv, hub):
+        streams = [f"sym{i:06d}usdt@ticker" for i in range(30)]
+        async with hub.subscribe("btcusdt@ticker") as first:
+            await first.__anext__()
+
+            subs = [hub.subscribe(s) for s in streams]
+            for i, sub in enumerate(subs):
+                await sub.__aenter__()
+                if i % 3 == 0:
+                    await asyncio.sleep(0.01)
+
+            # subscribed and gone again before it was sent: nothing goes out
+            flicker = hub.subscribe("ethusdt@ticker")
+            await flicker.__aenter__()
+            await flicker.__aexit__(None, None, None)
+
+            await until(lambda: sorted(s for p in sent(srv, "SUBSCRIBE") for s in p) == streams)
+            for sub in subs[:10]:
+                await sub.__aexit__(None, None, None)
+            await until(lambda: sorted(s for p in sent(srv, "UNSUBSCRIBE") for s in p) == streams[:10])
+
+            assert all("ethusdt@ticker" not in p for _, _, p in srv.control)
+            assert len(srv.control) < 20
+            times = [t for t, _, _ in srv.control]
+            for t0, t1 in zip(times, times[5:]):
+                assert t1 - t0 > 1.0
+            for t0, t1 in zip(times, times[1:]):
+                assert t1 - t0 > 0.8 / CONTROL_MAX_HZ
+
+            for sub in subs[10:]:
+                await sub.__aexit__(None, None, None)
+
+    run(test)
+
+
+def test_disconnect_fans_out_to_every_subscriber():
+    async def test(srv, hub):
+        streams = ["btcusdt@ticker", "btcusdt@ticker", "ethusdt@ticker"]
+        subs = [hub.subscribe(s) for s in streams]
+        for sub in subs:
+            await sub.__aenter__()
+        for sub in subs:
+            await sub.__anext__()
+
+        await srv.drop()
+
+        for sub in subs:
+            with pytest.raises(StreamDisconnected):
+                while True:
+                    await asyncio.wait_for(sub.__anext__(), 5)
+        assert hub.refcount("btcusdt@ticker") == 2
+
+        for sub in subs:
+            await sub.__aexit__(None, None, None)
+        assert hub.streams == []
+
+    run(test)
+
+
+def test_link_recovers_and_counts_its_own_errors():
+    async def test(srv, hub):
+        link = hub.link("btcusdt@ticker")
+        link.backoff.base = 0.05
+        stats = metrics.stream("btcusdt@ticker")
+        reconnects = stats.reconnects
+
+        # a drop: StreamDisconnected ends the attempt, counted by the hub
+        async with link:
+            await link.__anext__()
+            await srv.drop()
+            async for _ in link:
+                pass
+        assert isinstance(link.error, StreamDisconnected)
+        assert stats.reconnects == reconnects + 1
+
+        # the next attempt waits first, and is back once a frame arrives
+        async with link:
+            assert link.backoff.failures == 1
+            await link.__anext__()
+            assert link.backoff.failures == 0
+
+            # an error of the stream function itself ends the attempt too
+            raise ValueError("REST load failed")
+        assert isinstance(link.error, ValueError)
+        assert stats.reconnects == reconnects + 2
+        assert "REST load failed" in stats.last_error
+        assert hub.refcount("btcusdt@ticker") == 0
+
+        # the formula going away is not swallowed
+        with pytest.raises(asyncio.CancelledError):
+            async with link:
+                raise asyncio.CancelledError
+        assert hub.streams == []
+
+    run(test)
@@ -0,0 +1,160 @@
+import numpy as np
+import pytest
+
+from aggTrade import normalize_aggtrade
+from ExcelTime import excel_time
+from TradeBars import HEADER, BarBuilder, status_row
+
+N = 3000
+TOL = dict(rtol=1e-9, atol=1e-9)
+
+SIZES = [
+    ("time", 1.0),
+    ("time", 0.25),
+    ("tick", 1),
+    ("tick", 37),
+    ("volume", 10.0),
+    ("dollar", 50_000.0),
+]
+
+
+# ============================
+# Brute-force Reference
+# ============================
+
+def bar_groups(trades, bar_type, size) -> list:
+    """Index arrays of the trades in each bar, in order"""
+    t = trades["T"]
+    n = len(t)
+    if bar_type == "time":
+        size_ms = int(round(size * 1000))
+        _, starts = np.unique(t // size_ms, return_index=True)
+        return np.split(np.arange(n), starts[1:])
+    if bar_type == "tick":
+        return np.split(np.arange(n), np.arange(size, n, size))
+
+    # volume / dollar: a bar closes on the trade that reaches `size`
+    amount = trades["q"] if bar_type == "volume" else trades["p"] * trades["q"]
+    groups, first, held = [], 0, 0.0
+    for i in range(n):
+        held += amount[i]
+        if held >= size:
+            groups.append(np.arange(first, i + 1))
+            first, held = i + 1, 0.0
+    if first < n:
+        groups.append(np.arange(first, n))
+    return groups
+
+
+def reference(trades, bar_type, size) -> list:
+    """Excel rows of every bar, the last one open unless it is complete"""
+    rows = []
+    groups = bar_groups(trades, bar_type, size)
+    for idx in groups:
+        p, q, t = trades["p"][idx], trades["q"][idx], trades["T"][idx]
+        sell = trades["m"][idx]
+        if bar_type == "time":
+            size_ms = int(round(size * 1000))
+            start = t[0] - t[0] % size_ms
+            end = start + size_ms - 1
+        else:
+            start, end = t[0], t[-1]
+        volume = q.sum()
+        quote = (p * q).sum()
+        rows.append([
+            excel_time(int(start)), excel_time(int(end)),
+            p[0], p.max(), p.min(), p[-1],
+            volume, quote, q[~sell].sum(), q[sell].sum(),
+            quote / volume, len(idx), int(trades["a"][idx[0]]), int(trades["a"][idx[-1]]),
+            True,
+        ])
+
+    last = rows[-1]
+    if bar_type == "time":
+        last[-1] = False
+    elif bar_type == "tick":
+        last[-1] = last[11] >= size
+    else:
+        last[-1] = (last[6] if bar_type == "volume" else last[7]) >= size
+    return rows
+
+
+def random_trades(seed: int = 5) -> dict:
+    rng = np.random.default_rng(seed)
+    # bursts and pauses, so some time buckets stay empty
+    gaps = np.where(rng.random(N) < 0.05, rng.integers(1000, 4000, N), rng.integers(0, 60, N))
+    return {
+        "T": 1_700_000_000_000 + np.cumsum(gaps),
+        "p": np.round(100 + np.cumsum(rng.normal(0, 0.05, N)), 2),
+        "q": np.round(rng.exponential(0.5, N) + 0.001, 3),
+        "m": rng.random(N) < 0.5,
+        "a": np.arange(10_000, 10_000 + N),
+    }
+
+
+def records(trades) -> list:
+    return [
+        normalize_aggtrade({
+            "a": int(a), "p": f"{p:.2f}", "q": f"{q:.3f}", "f": int(a), "l": int(a),
+            "T": int(t), "m": bool(m), "M": True,
+        })
+        for a, p, q, t, m in zip(trades["a"], trades["p"], trades["q"], trades["T"], trades["m"])
+    ]
+
+
+def assert_rows(got, want):
+    assert len(got) == len(want)
+    for g, w in zip(got, want):
+        assert g[:2] == pytest.approx(w[:2], abs=1e-9)
+        np.testing.assert_allclose(np.array(g[2:11], float), np.array(w[2:11], float), **TOL)
+        assert g[11:] == w[11:]
+
+
+# ============================
+# Tests
+# ============================
+
+@pytest.fixture(scope="module")
+def trades():
+    return random_trades()
+
+
+@pytest.mark.parametrize("bar_type, size", SIZES)
+def test_bars_match_brute_force(trades, bar_type, size):
+    builder = BarBuilder(bar_type, size, limit=N)
+    builder.extend(records(trades))
+    table = builder.table(status_row("LIVE"))
+
+    want = reference(trades, bar_type, size)
+    assert table[0] == HEADER
+    assert table[-1] == status_row("LIVE")
+
+    # every bar but the last is closed; the last is open unless it filled up
+    assert_rows(table[1:-1], want)
+
+
+def test_trades_are_never_split(trades):
+    builder = BarBuilder("volume", 10.0, limit=N)
+    builder.extend(records(trades))
+    rows = builder.table(status_row("LIVE"))[1:-1]
+
+    ids = [(r[12], r[13]) for r in rows]
+    assert ids[0][0] == trades["a"][0]
+    assert ids[-1][1] == trades["a"][-1]
+    assert all(b[0] == a[1] + 1 for a, b in zip(ids, ids[1:]))
+    assert sum(r[11] for r in rows) == N
+
+
+def test_limit_keeps_the_newest_closed_bars(trades):
+    builder = BarBuilder("tick", 10, limit=25)
+    builder.extend(records(trades))
+    rows = builder.table(status_row("LIVE"))[1:-1]
+
+    want = reference(trades, "tick", 10)
+    assert_rows(rows, want[-25:])
+
+
+@pytest.mark.parametrize("bar_type, size", [("range", 1.0), ("time", 0), ("tick", -5)])
+def test_bad_arguments(bar_type, size):
+    with pytest.raises(ValueError):
+        BarBuilder(bar_type, size)